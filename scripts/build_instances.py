@@ -1,11 +1,14 @@
 #!/usr/bin/env python3
+import argparse
 import csv
 import json
 import os
+import sys
 from collections import Counter, defaultdict
 from datetime import datetime
+from itertools import product
 from statistics import mean
-from typing import Dict, Iterable, List, Tuple
+from typing import Callable, Dict, Iterable, Iterator, List, Tuple
 
 try:
     import openpyxl  # type: ignore
@@ -15,6 +18,10 @@ except Exception:  # pragma: no cover
 ROOT_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
 RAW_DIR = os.path.join(ROOT_DIR, "data", "raw")
 OUT_DIR = os.path.join(ROOT_DIR, "data", "instances")
+STORE_PATH = os.path.join(ROOT_DIR, "data", "instances.sqlite")
+sys.path.insert(0, os.path.join(ROOT_DIR, "src"))
+
+from instance_store import InstanceStore
 
 FAST_KEYWORDS = [
     "espresso", "coffee", "americano", "drip", "filter", "brew", "black", "short",
@@ -59,6 +66,19 @@ def peak_hour_and_rate(hour_counts: Counter, days: int) -> Tuple[int, float]:
     return peak_hour, rate_per_hour
 
 
+def hourly_profile(hour_counts: Counter) -> Tuple[int, List[float]]:
+    """Opening hour and the rate of each hour from it to the last hour with sales, relative to the peak.
+
+    Multiplied by the peak-hour rate (``peak_hour_and_rate``) the entries are
+    the average hourly arrival rates of a day.
+    """
+    if not hour_counts:
+        return 9, [1.0]
+    peak = max(hour_counts.values())
+    first, last = min(hour_counts), max(hour_counts)
+    return first, [hour_counts.get(h, 0) / peak for h in range(first, last + 1)]
+
+
 def compute_mix(type_counts: Counter) -> Dict[str, float]:
     total = sum(type_counts.values())
     if total == 0:
@@ -87,11 +107,14 @@ def parse_hf() -> Dict:
             type_counts[t] += 1
     hour_counts = hourly_counts(datetimes)
     peak_hour, rate = peak_hour_and_rate(hour_counts, len(dates))
+    open_hour, profile = hourly_profile(hour_counts)
     return {
         "source": "huggingface_coffeesales",
         "peak_hour": peak_hour,
         "total_rate_per_hour": rate,
         "mix": compute_mix(type_counts),
+        "open_hour": open_hour,
+        "rate_profile": profile,
     }
 
 
@@ -116,11 +139,14 @@ def parse_kaggle() -> Dict:
             type_counts[t] += 1
     hour_counts = hourly_counts(datetimes)
     peak_hour, rate = peak_hour_and_rate(hour_counts, len(dates))
+    open_hour, profile = hourly_profile(hour_counts)
     return {
         "source": "kaggle_coffee_sales_dataset",
         "peak_hour": peak_hour,
         "total_rate_per_hour": rate,
         "mix": compute_mix(type_counts),
+        "open_hour": open_hour,
+        "rate_profile": profile,
     }
 
 
@@ -199,90 +225,177 @@ def parse_maven() -> Dict:
 
     hour_counts = hourly_counts(datetimes)
     peak_hour, rate = peak_hour_and_rate(hour_counts, len(dates))
+    open_hour, profile = hourly_profile(hour_counts)
     return {
         "source": "maven_coffee_shop_sales",
         "peak_hour": peak_hour,
         "total_rate_per_hour": rate,
         "mix": compute_mix(type_counts),
+        "open_hour": open_hour,
+        "rate_profile": profile,
     }
 
 
-def build_instances(source_info: Dict, instance_prefix: str) -> List[Dict]:
-    if not source_info or source_info.get("total_rate_per_hour", 0) == 0:
-        return []
-    base_rate = source_info["total_rate_per_hour"]
-    mix = source_info["mix"]
-
-    scenarios = []
-    scales = [0.7, 0.85, 1.0, 1.15, 1.3]
-    staff_options = [
+# Sweep axes; build_instances takes their full Cartesian product per data source.
+DEFAULT_AXES: Dict[str, List] = {
+    "scales": [0.7, 0.85, 1.0, 1.15, 1.3],
+    "staff_options": [
         {"order_attendants": 1, "baristas": 2, "pickup_attendants": 1},
         {"order_attendants": 2, "baristas": 2, "pickup_attendants": 1},
         {"order_attendants": 1, "baristas": 3, "pickup_attendants": 1},
         {"order_attendants": 1, "baristas": 2, "pickup_attendants": 2},
-    ]
-    patience_options = [
+    ],
+    "patience_options": [
         {"fast": 2.5, "medium": 5.0, "slow": 8.0},
         {"fast": 3.0, "medium": 6.0, "slow": 10.0},
         {"fast": 4.0, "medium": 8.0, "slow": 12.0},
-    ]
-    prep_alpha_options = [0.05, 0.10, 0.15]
-
-    idx = 1
-    for scale in scales:
-        for staff in staff_options:
-            for patience in patience_options:
-                for alpha in prep_alpha_options:
-                    arrival_rates = {
-                        k: base_rate * scale * mix[k] for k in ("fast", "medium", "slow")
-                    }
-                    scenario = {
-                        "name": f"{instance_prefix}_{idx:03d}",
-                        "source": source_info["source"],
-                        "peak_hour": source_info.get("peak_hour", 9),
-                        "arrival_rates_per_hour": arrival_rates,
-                        "order_time_mean": {"fast": 0.8, "medium": 1.2, "slow": 1.8},
-                        "prep_time_mean": {"fast": 1.0, "medium": 2.5, "slow": 4.0},
-                        "patience_mean": patience,
-                        "staffing": staff,
-                        "prep_queue_alpha": alpha,
-                        "hours": 4.0,
-                        "warmup_hours": 0.5,
-                    }
-                    scenarios.append(scenario)
-                    idx += 1
-    return scenarios
-
-
-def main() -> None:
-    os.makedirs(OUT_DIR, exist_ok=True)
+    ],
+    "prep_alpha_options": [0.05, 0.10, 0.15],
+}
+
+
+def iter_scenarios(
+    source_info: Dict, instance_prefix: str, axes: Dict[str, List] = None, day: bool = False
+) -> Iterator[Dict]:
+    """Yield the scenarios of one data source one at a time.
+
+    ``axes`` overrides entries of ``DEFAULT_AXES``. Any other key is an extra
+    axis over a top-level instance field (e.g. ``hours`` or
+    ``prep_time_mean``): scalar values replace the field and dict values are
+    merged into it. Extra axes vary fastest, so without them the order and
+    names match ``build_instances``.
+
+    With ``day`` each scenario is a whole business day instead of the peak
+    hour: the peak-hour rates are modulated by the source's ``rate_profile``
+    from ``open_hour`` on, the run lasts one hour per profile entry and,
+    since the cafe opens empty, there is no warm-up.
+    """
+    if not source_info or source_info.get("total_rate_per_hour", 0) == 0:
+        return
+    if day and not source_info.get("rate_profile"):
+        raise ValueError(f"{source_info.get('source')} has no rate_profile for day scenarios")
+    if day:
+        instance_prefix = f"{instance_prefix}_day"
+    base_rate = source_info["total_rate_per_hour"]
+    mix = source_info["mix"]
+    axes = {**DEFAULT_AXES, **(axes or {})}
+    extra = [(field, values) for field, values in axes.items() if field not in DEFAULT_AXES]
+
+    combos = product(
+        axes["scales"], axes["staff_options"], axes["patience_options"], axes["prep_alpha_options"],
+        *(values for _, values in extra),
+    )
+    for idx, (scale, staff, patience, alpha, *extra_values) in enumerate(combos, start=1):
+        arrival_rates = {
+            k: base_rate * scale * mix[k] for k in ("fast", "medium", "slow")
+        }
+        scenario = {
+            "name": f"{instance_prefix}_{idx:03d}",
+            "source": source_info["source"],
+            "peak_hour": source_info.get("peak_hour", 9),
+            "arrival_rates_per_hour": arrival_rates,
+            "order_time_mean": {"fast": 0.8, "medium": 1.2, "slow": 1.8},
+            "prep_time_mean": {"fast": 1.0, "medium": 2.5, "slow": 4.0},
+            "patience_mean": patience,
+            "staffing": staff,
+            "prep_queue_alpha": alpha,
+            "hours": 4.0,
+            "warmup_hours": 0.5,
+        }
+        if day:
+            profile = source_info["rate_profile"]
+            scenario.update({
+                "hours": float(len(profile)),
+                "warmup_hours": 0.0,
+                "open_hour": source_info.get("open_hour", 0),
+                "rate_profile": list(profile),
+            })
+        for (field, _), value in zip(extra, extra_values):
+            if isinstance(value, dict) and isinstance(scenario.get(field), dict):
+                scenario[field] = {**scenario[field], **value}
+            else:
+                scenario[field] = value
+        yield scenario
 
-    sources = []
-    sources.append(parse_maven())
-    sources.append(parse_hf())
-    sources.append(parse_kaggle())
 
-    all_instances = []
-    for src in sources:
+def build_instances(source_info: Dict, instance_prefix: str) -> List[Dict]:
+    return list(iter_scenarios(source_info, instance_prefix))
+
+
+DATASET_PARSERS: Dict[str, Callable[[], Dict]] = {
+    "maven_coffee_shop_sales": parse_maven,
+    "huggingface_coffeesales": parse_hf,
+    "kaggle_coffee_sales_dataset": parse_kaggle,
+}
+
+
+def iter_sweep(spec: Dict = None) -> Iterator[Dict]:
+    """Yield every scenario of a sweep spec, generated on demand.
+
+    ``spec`` has optional ``sources`` and ``axes`` keys. A source is either a
+    dataset name from ``DATASET_PARSERS`` or an explicit source dict with
+    ``source``, ``total_rate_per_hour``, ``mix`` and optionally
+    ``peak_hour`` (plus ``open_hour`` and ``rate_profile`` for day
+    scenarios); by default all three datasets are used. ``axes`` and ``day``
+    are passed to ``iter_scenarios``.
+    """
+    spec = spec or {}
+    for src in spec.get("sources", list(DATASET_PARSERS)):
+        if isinstance(src, str):
+            src = DATASET_PARSERS[src]()
         if not src:
             continue
         if src.get("error"):
             print(f"Skipping {src.get('source')} - {src.get('error')}")
             continue
         prefix = src["source"].replace("-", "_")
-        all_instances.extend(build_instances(src, prefix))
+        yield from iter_scenarios(src, prefix, spec.get("axes"), spec.get("day", False))
+
 
-    for inst in all_instances:
-        path = os.path.join(OUT_DIR, f"{inst['name']}.json")
+def write_json(instances: List[Dict], out_dir: str) -> None:
+    os.makedirs(out_dir, exist_ok=True)
+    for inst in instances:
+        path = os.path.join(out_dir, f"{inst['name']}.json")
         with open(path, "w", encoding="utf-8") as f:
             json.dump(inst, f, indent=2)
         print(f"Wrote {path}")
 
-    summary_path = os.path.join(OUT_DIR, "summary.json")
+    summary_path = os.path.join(out_dir, "summary.json")
     with open(summary_path, "w", encoding="utf-8") as f:
-        json.dump(all_instances, f, indent=2)
+        json.dump(instances, f, indent=2)
     print(f"Wrote {summary_path}")
 
 
+def main() -> None:
+    parser = argparse.ArgumentParser(description="Build simulation instances from the raw datasets")
+    parser.add_argument("--store", default=STORE_PATH, help="SQLite instance store to (re)write")
+    parser.add_argument("--no-json", action="store_true",
+                        help="Only write the store, not the per-instance JSON files and summary.json "
+                             "(run_batch.py reads the JSON directory by default)")
+    parser.add_argument("--output-dir", default=OUT_DIR, help="Directory for the JSON files")
+    parser.add_argument("--sweep", default="", help="JSON sweep spec (sources and axes, see iter_sweep)")
+    parser.add_argument("--day", action="store_true",
+                        help="Whole-day scenarios with the hourly rate profile instead of peak-hour ones")
+    args = parser.parse_args()
+
+    spec = None
+    if args.sweep:
+        with open(args.sweep, "r", encoding="utf-8") as f:
+            spec = json.load(f)
+    if args.day:
+        spec = {**(spec or {}), "day": True}
+    instances = iter_sweep(spec)
+    if not args.no_json:
+        instances = list(instances)
+
+    os.makedirs(os.path.dirname(os.path.abspath(args.store)), exist_ok=True)
+    with InstanceStore(args.store) as store:
+        count = store.write(instances)
+    print(f"Wrote {count} instances to {args.store}")
+
+    if not args.no_json:
+        write_json(instances, args.output_dir)
+
+
 if __name__ == "__main__":
     main()
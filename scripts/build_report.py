@@ -1,36 +1,24 @@
 #!/usr/bin/env python3
-import csv
 import os
 import platform
 import subprocess
+import sys
 from pathlib import Path
 from datetime import datetime
-from statistics import mean
-from collections import defaultdict
 
 ROOT_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
 OUTPUT_DIR = os.path.join(ROOT_DIR, "output")
 REPORTS_DIR = os.path.join(ROOT_DIR, "reports")
 METRICS_PATH = os.path.join(OUTPUT_DIR, "metrics.csv")
 TOP10_PATH = os.path.join(OUTPUT_DIR, "top10.csv")
+DB_PATH = os.path.join(OUTPUT_DIR, "results.sqlite")
+sys.path.insert(0, os.path.join(ROOT_DIR, "src"))
 
-
-def f(row, k):
-    return float(row.get(k, 0))
-
-
-def read_csv(path):
-    if not os.path.exists(path):
-        return []
-    with open(path, newline="", encoding="utf-8") as f:
-        return list(csv.DictReader(f))
+from ranking import top_k
+from results_db import open_results
 
 
 def build_report_tex():
-    rows = read_csv(METRICS_PATH)
-
-    def f(row, k):
-        return float(row.get(k, 0))
 
     def tex_escape(text: str) -> str:
         return (
@@ -52,34 +40,24 @@ def build_report_tex():
         "kaggle_coffee_sales_dataset": "Kaggle (Coffee Sales Dataset)",
     }
 
-    by_source = defaultdict(list)
-    for r in rows:
-        by_source[r["source"]].append(r)
-
+    aggregate_metrics = {
+        "avg_abandon": "abandonment_rate",
+        "avg_order_wait": "avg_order_wait",
+        "avg_prep_wait": "avg_prep_wait",
+        "avg_pickup_wait": "avg_pickup_wait",
+        "avg_system_time": "avg_system_time",
+        "avg_prep_util": "prep_utilization",
+    }
     summary = {}
-    for src, rs in by_source.items():
-        summary[src] = {
-            "n": len(rs),
-            "avg_abandon": mean(f(r, "abandonment_rate") for r in rs),
-            "avg_order_wait": mean(f(r, "avg_order_wait") for r in rs),
-            "avg_prep_wait": mean(f(r, "avg_prep_wait") for r in rs),
-            "avg_pickup_wait": mean(f(r, "avg_pickup_wait") for r in rs),
-            "avg_system_time": mean(f(r, "avg_system_time") for r in rs),
-            "avg_prep_util": mean(f(r, "prep_utilization") for r in rs),
-        }
-
-    def score(row):
-        abandonment = f(row, "abandonment_rate")
-        system_time = f(row, "avg_system_time")
-        order_wait = f(row, "avg_order_wait")
-        prep_wait = f(row, "avg_prep_wait")
-        pickup_wait = f(row, "avg_pickup_wait")
-        return abandonment * 100.0 + system_time * 2.0 + order_wait + prep_wait + pickup_wait * 0.5
-
-    # Top-10 focused on Maven (peak-like demand)
-    maven_rows = [r for r in rows if r.get("source") == "maven_coffee_shop_sales"]
-    maven_rows = sorted(maven_rows, key=score)
-    top10 = maven_rows[:10]
+    top10 = []
+    if os.path.exists(METRICS_PATH) or os.path.exists(DB_PATH):
+        with open_results(DB_PATH, METRICS_PATH) as db:
+            if db.columns:
+                for agg in db.aggregates(list(aggregate_metrics.values())):
+                    summary[agg["source"]] = {"n": agg["n"]}
+                    summary[agg["source"]].update({key: agg[m] for key, m in aggregate_metrics.items()})
+                # Top-10 focused on Maven (peak-like demand)
+                top10 = top_k(db.iter_rows(source="maven_coffee_shop_sales"), 10)
 
     os.makedirs(REPORTS_DIR, exist_ok=True)
     tex_path = os.path.join(REPORTS_DIR, "cafe_sim_report.tex")
@@ -0,0 +1,125 @@
+#!/usr/bin/env python3
+import argparse
+import csv
+import json
+import os
+import sys
+from pathlib import Path
+from typing import Dict, List
+
+ROOT_DIR = Path(__file__).resolve().parents[1]
+sys.path.insert(0, str(ROOT_DIR / "src"))
+
+from build_instances import DEFAULT_AXES
+from instance_store import InstanceStore
+from replications import ReplicationPlan, paired_difference, replicate, unpaired_half_width
+from result_cache import ResultCache
+from run_batch import build_model, load_instance
+
+
+def staffing_label(staffing: Dict, alpha: float) -> str:
+    return (f"o{staffing.get('order_attendants', 1)}-b{staffing.get('baristas', 2)}"
+            f"-p{staffing.get('pickup_attendants', 1)}-a{alpha:g}")
+
+
+def compare(
+    inst: Dict,
+    alternatives: List[Dict],
+    plan: ReplicationPlan,
+    seed: int,
+    metrics: List[str],
+    overrides: Dict,
+    cache: ResultCache = None,
+) -> List[Dict]:
+    """Run every alternative with the same seeds and compare each with the first one.
+
+    An alternative is ``{"staffing": {...}, "prep_queue_alpha": ...}``; missing
+    keys keep the instance's values. Returns one row per (alternative, metric).
+    """
+    samples = []
+    labels = []
+    for alt in alternatives:
+        variant = {**inst, **alt, "staffing": {**inst.get("staffing", {}), **alt.get("staffing", {})}}
+        config, customer_types = build_model(variant, overrides)
+        samples.append(replicate(config, customer_types, seed, plan, cache).samples)
+        labels.append(staffing_label(variant.get("staffing", {}), config.prep_queue_alpha))
+
+    rows = []
+    for label, result in zip(labels[1:], samples[1:]):
+        for metric in metrics:
+            mean, std, half_width = paired_difference(samples[0][metric], result[metric], plan.confidence)
+            independent = unpaired_half_width(samples[0][metric], result[metric], plan.confidence)
+            rows.append({
+                "baseline": labels[0],
+                "alternative": label,
+                "metric": metric,
+                "mean_difference": mean,
+                "std_difference": std,
+                "ci_half_width": half_width,
+                "ci_low": mean - half_width,
+                "ci_high": mean + half_width,
+                "significant": abs(mean) > half_width,
+                "unpaired_ci_half_width": independent,
+                # Replications an unpaired comparison would need for the same precision, as a multiple.
+                "variance_reduction": (independent / half_width) ** 2 if half_width > 0 else float("inf"),
+                "replications": len(result[metric]),
+            })
+    return rows
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description="Compare staffing alternatives with paired-difference CIs")
+    parser.add_argument("--instance", required=True,
+                        help="Instance JSON file, or instance name with --instance-store")
+    parser.add_argument("--instance-store", default="", help="SQLite instance store")
+    parser.add_argument("--alternatives", default="",
+                        help="JSON file with a list of {staffing, prep_queue_alpha} dicts; the first is the "
+                             "baseline (default: the staff_options of build_instances)")
+    parser.add_argument("--replications", type=int, default=20)
+    parser.add_argument("--seed", type=int, default=42)
+    parser.add_argument("--metrics", default="avg_system_time,abandonment_rate,avg_prep_wait")
+    parser.add_argument("--engine", choices=["simpy", "native"], default="native")
+    parser.add_argument("--no-crn", action="store_true",
+                        help="Draw service times in event order (independent streams per alternative)")
+    parser.add_argument("--output", default="output/staffing_comparison.csv")
+    parser.add_argument("--no-cache", action="store_true")
+    args = parser.parse_args()
+
+    if args.instance_store:
+        with InstanceStore(args.instance_store) as store:
+            inst = store.get(args.instance)
+        if inst is None:
+            raise SystemExit(f"Instance {args.instance!r} not found in {args.instance_store}")
+    else:
+        inst = load_instance(args.instance)
+
+    if args.alternatives:
+        with open(args.alternatives, "r", encoding="utf-8") as f:
+            alternatives = json.load(f)
+    else:
+        alternatives = [{"staffing": staff} for staff in DEFAULT_AXES["staff_options"]]
+
+    plan = ReplicationPlan(replications=args.replications)
+    overrides = {"engine": args.engine, "common_random_numbers": not args.no_crn}
+    cache = None if args.no_cache else ResultCache(str(ROOT_DIR / ".cache" / "results"))
+    metrics = [m.strip() for m in args.metrics.split(",") if m.strip()]
+    rows = compare(inst, alternatives, plan, args.seed, metrics, overrides, cache)
+    if not rows:
+        print("Need at least two alternatives")
+        return
+
+    for row in rows:
+        flag = "*" if row["significant"] else " "
+        print(f"{row['alternative']:>16} {row['metric']:<18} {row['mean_difference']:+10.4f} "
+              f"± {row['ci_half_width']:.4f} {flag} (unpaired ± {row['unpaired_ci_half_width']:.4f})")
+
+    os.makedirs(os.path.dirname(args.output) or ".", exist_ok=True)
+    with open(args.output, "w", newline="", encoding="utf-8") as f:
+        writer = csv.DictWriter(f, fieldnames=list(rows[0].keys()))
+        writer.writeheader()
+        writer.writerows(rows)
+    print(f"Wrote {args.output}")
+
+
+if __name__ == "__main__":
+    main()
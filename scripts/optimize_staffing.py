@@ -0,0 +1,167 @@
+#!/usr/bin/env python3
+import argparse
+import csv
+import itertools
+import os
+import statistics
+import sys
+from pathlib import Path
+from typing import Dict, List
+
+ROOT_DIR = Path(__file__).resolve().parents[1]
+sys.path.insert(0, str(ROOT_DIR / "src"))
+
+from cafe_sim import canonical_model
+from instance_store import InstanceStore
+from ranking import parse_weights, score
+from replications import cached_replication
+from result_cache import ResultCache
+from run_batch import build_model, load_instance
+from selection import kn_select
+
+ROLES = ("order_attendants", "baristas", "pickup_attendants")
+DEFAULT_STAFF_COST = "order_attendants=5,baristas=5,pickup_attendants=5"
+
+
+def parse_range(text: str) -> List[int]:
+    """``"1-3"`` -> ``[1, 2, 3]``; ``"2"`` -> ``[2]``; ``"1,3"`` -> ``[1, 3]``."""
+    values: List[int] = []
+    for part in text.split(","):
+        low, _, high = part.partition("-")
+        values.extend(range(int(low), int(high or low) + 1))
+    return values
+
+
+def parse_staff_cost(text: str) -> Dict[str, float]:
+    """``"baristas=5,order_attendants=4"`` -> cost per person by role; empty text means no staff cost."""
+    costs: Dict[str, float] = {}
+    for item in filter(None, (part.strip() for part in text.split(","))):
+        role, _, cost = item.partition("=")
+        role = role.strip()
+        if role not in ROLES:
+            raise ValueError(f"Unknown staffing role {role!r}; choose from {', '.join(ROLES)}")
+        costs[role] = float(cost)
+    return costs
+
+
+def staffing_grid(ranges: Dict[str, List[int]]) -> List[Dict[str, int]]:
+    return [dict(zip(ROLES, counts)) for counts in itertools.product(*(ranges[role] for role in ROLES))]
+
+
+def staffing_cost(staffing: Dict[str, int], costs: Dict[str, float]) -> float:
+    return sum(costs.get(role, 0.0) * staffing[role] for role in ROLES)
+
+
+def optimize(
+    inst: Dict,
+    grid: List[Dict[str, int]],
+    costs: Dict[str, float],
+    weights: Dict[str, float],
+    delta: float,
+    alpha: float = 0.05,
+    n0: int = 10,
+    max_replications: int = 100,
+    seed: int = 42,
+    overrides: Dict = None,
+    cache: ResultCache = None,
+) -> List[Dict]:
+    """Select the staffing with the lowest expected ``score + staffing_cost``.
+
+    Replication ``r`` of every configuration uses the same seed and index, so
+    with ``common_random_numbers`` in ``overrides`` all configurations see the
+    same customers. Returns one row per configuration, grid order.
+    """
+    models = []
+    for staffing in grid:
+        variant = {**inst, "staffing": {**inst.get("staffing", {}), **staffing}}
+        models.append(canonical_model(*build_model(variant, overrides)))
+    summaries: List[List[Dict[str, float]]] = [[] for _ in grid]
+
+    def sample(i: int, r: int) -> float:
+        config, customer_types = models[i]
+        summary = cached_replication(config, customer_types, seed, r, cache)
+        summaries[i].append(summary)
+        return score(summary, weights) + staffing_cost(grid[i], costs)
+
+    selection = kn_select(sample, len(grid), delta, alpha, n0, max_replications)
+    rows = []
+    for i, staffing in enumerate(grid):
+        row: Dict = dict(staffing)
+        row["staffing_cost"] = staffing_cost(staffing, costs)
+        row["objective"] = selection.means[i]
+        for metric in weights:
+            row[metric] = statistics.fmean(s[metric] for s in summaries[i])
+        row["replications"] = selection.replications[i]
+        row["eliminated_at"] = selection.eliminated_at[i] if selection.eliminated_at[i] is not None else ""
+        row["selected"] = i == selection.best
+        rows.append(row)
+    return rows
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(
+        description="Find the cheapest adequate staffing with Kim-Nelson ranking and selection"
+    )
+    parser.add_argument("--instance", required=True,
+                        help="Instance JSON file, or instance name with --instance-store")
+    parser.add_argument("--instance-store", default="", help="SQLite instance store")
+    parser.add_argument("--order-attendants", default="1-3", help="Values to search, e.g. 1-3 or 1,2,4")
+    parser.add_argument("--baristas", default="1-5")
+    parser.add_argument("--pickup-attendants", default="1-2")
+    parser.add_argument("--staff-cost", default=DEFAULT_STAFF_COST,
+                        help="role=cost per person, in the same units as the ranking score (empty: no staff cost)")
+    parser.add_argument("--weights", default="", help="Score weights as metric=weight,... (default: ranking)")
+    parser.add_argument("--delta", type=float, default=1.0,
+                        help="Indifference zone: objective differences below this do not matter")
+    parser.add_argument("--alpha", type=float, default=0.05, help="1 - probability of correct selection")
+    parser.add_argument("--n0", type=int, default=10, help="First-stage replications per configuration")
+    parser.add_argument("--max-replications", type=int, default=100)
+    parser.add_argument("--seed", type=int, default=42)
+    parser.add_argument("--engine", choices=["simpy", "native"], default="native")
+    parser.add_argument("--no-crn", action="store_true", help="Do not share random numbers across configurations")
+    parser.add_argument("--output", default="output/staffing_selection.csv")
+    parser.add_argument("--no-cache", action="store_true")
+    args = parser.parse_args()
+    try:
+        costs = parse_staff_cost(args.staff_cost)
+    except ValueError as exc:
+        parser.error(str(exc))
+
+    if args.instance_store:
+        with InstanceStore(args.instance_store) as store:
+            inst = store.get(args.instance)
+        if inst is None:
+            raise SystemExit(f"Instance {args.instance!r} not found in {args.instance_store}")
+    else:
+        inst = load_instance(args.instance)
+
+    grid = staffing_grid({
+        "order_attendants": parse_range(args.order_attendants),
+        "baristas": parse_range(args.baristas),
+        "pickup_attendants": parse_range(args.pickup_attendants),
+    })
+    overrides = {"engine": args.engine, "common_random_numbers": not args.no_crn}
+    cache = None if args.no_cache else ResultCache(str(ROOT_DIR / ".cache" / "results"))
+    rows = optimize(
+        inst, grid, costs, parse_weights(args.weights), args.delta, args.alpha,
+        args.n0, args.max_replications, args.seed, overrides, cache,
+    )
+
+    best = next(row for row in rows if row["selected"])
+    spent = sum(row["replications"] for row in rows)
+    budget = len(grid) * args.max_replications
+    print(f"Best staffing: o{best['order_attendants']}-b{best['baristas']}-p{best['pickup_attendants']} "
+          f"(objective {best['objective']:.3f}, staffing cost {best['staffing_cost']:g})")
+    print(f"{len(grid)} configurations, {spent} replications "
+          f"({spent / budget:.0%} of a {args.max_replications}-replication grid search)")
+
+    os.makedirs(os.path.dirname(args.output) or ".", exist_ok=True)
+    with open(args.output, "w", newline="", encoding="utf-8") as f:
+        writer = csv.DictWriter(f, fieldnames=list(rows[0].keys()))
+        writer.writeheader()
+        writer.writerows(rows)
+    print(f"Wrote {args.output}")
+
+
+if __name__ == "__main__":
+    main()
@@ -1,16 +1,18 @@
 #!/usr/bin/env python3
 import argparse
-import csv
 import os
-from typing import Dict, List
+import sys
+from typing import Dict
 
 import matplotlib.pyplot as plt
 import numpy as np
 
+ROOT_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, os.path.join(ROOT_DIR, "src"))
 
-def read_csv(path: str) -> List[Dict[str, str]]:
-    with open(path, newline="", encoding="utf-8") as f:
-        return list(csv.DictReader(f))
+from results_db import ResultsDB, open_results
+
+PLOTTED_METRICS = ["abandonment_rate", "avg_order_wait", "avg_prep_wait", "avg_pickup_wait", "prep_utilization"]
 
 
 def plot_box(ax, data, labels, title, ylabel, log=False):
@@ -34,21 +36,21 @@ def plot_summary(ax, labels, means, p95s, title, ylabel):
     ax.legend()
 
 
-def filter_rows(rows: List[Dict[str, str]], source: str) -> List[Dict[str, str]]:
-    if not source:
-        return rows
-    return [r for r in rows if r.get("source", "") == source]
+def load_metrics(db: ResultsDB, source: str) -> Dict[str, np.ndarray]:
+    """Plotted metric columns of one source as float arrays."""
+    rows = db.rows(source=source, columns=PLOTTED_METRICS)
+    return {m: np.array([row[m] for row in rows], dtype=float) for m in PLOTTED_METRICS}
 
 
-def make_plots(rows: List[Dict[str, str]], output_dir: str, prefix: str) -> None:
-    if not rows:
+def make_plots(metrics: Dict[str, np.ndarray], output_dir: str, prefix: str) -> None:
+    if not len(metrics["abandonment_rate"]):
         return
 
-    abandon = np.array([float(row["abandonment_rate"]) for row in rows])
-    order_wait = np.array([float(row["avg_order_wait"]) for row in rows])
-    prep_wait = np.array([float(row["avg_prep_wait"]) for row in rows])
-    pickup_wait = np.array([float(row["avg_pickup_wait"]) for row in rows])
-    util_prep = np.array([float(row["prep_utilization"]) for row in rows])
+    abandon = metrics["abandonment_rate"]
+    order_wait = metrics["avg_order_wait"]
+    prep_wait = metrics["avg_prep_wait"]
+    pickup_wait = metrics["avg_pickup_wait"]
+    util_prep = metrics["prep_utilization"]
 
     # Distributions
     fig, axes = plt.subplots(2, 1, figsize=(8, 8))
@@ -101,26 +103,26 @@ def main() -> None:
     parser.add_argument("--input", default="output/metrics.csv")
     parser.add_argument("--output-dir", default="output")
     parser.add_argument("--source", default="", help="Filter by source (maven_coffee_shop_sales, huggingface_coffeesales, kaggle_coffee_sales_dataset)")
+    parser.add_argument("--db", default="output/results.sqlite",
+                        help="Results database (rebuilt from --input when the CSV differs from the one it "
+                             "was built from)")
     args = parser.parse_args()
 
-    rows = read_csv(args.input)
-    if not rows:
-        print("No data to plot")
-        return
+    with open_results(args.db, args.input) as db:
+        if not db.columns:
+            print("No data to plot")
+            return
 
-    os.makedirs(args.output_dir, exist_ok=True)
+        os.makedirs(args.output_dir, exist_ok=True)
 
-    if args.source:
-        filtered = filter_rows(rows, args.source)
-        make_plots(filtered, args.output_dir, args.source)
-        print(f"Plots written to {args.output_dir} for source={args.source}")
-        return
+        if args.source:
+            make_plots(load_metrics(db, args.source), args.output_dir, args.source)
+            print(f"Plots written to {args.output_dir} for source={args.source}")
+            return
 
-    sources = sorted({row.get("source", "") for row in rows})
-    for src in sources:
-        filtered = filter_rows(rows, src)
-        if src:
-            make_plots(filtered, args.output_dir, src)
+        for src in db.sources():
+            if src:
+                make_plots(load_metrics(db, src), args.output_dir, src)
     print(f"Plots written to {args.output_dir} (per dataset)")
 
 
@@ -2,28 +2,13 @@
 import argparse
 import csv
 import os
-from typing import Dict, List, Tuple
+import sys
 
+ROOT_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, os.path.join(ROOT_DIR, "src"))
 
-def read_csv(path: str) -> List[Dict[str, str]]:
-    with open(path, newline="", encoding="utf-8") as f:
-        return list(csv.DictReader(f))
-
-
-def score(row: Dict[str, str]) -> float:
-    # Lower is better. Weights emphasize abandonment and system time.
-    abandonment = float(row.get("abandonment_rate", 0))
-    system_time = float(row.get("avg_system_time", 0))
-    order_wait = float(row.get("avg_order_wait", 0))
-    prep_wait = float(row.get("avg_prep_wait", 0))
-    pickup_wait = float(row.get("avg_pickup_wait", 0))
-    return (
-        abandonment * 100.0
-        + system_time * 2.0
-        + order_wait * 1.0
-        + prep_wait * 1.0
-        + pickup_wait * 0.5
-    )
+from ranking import GROUPINGS, parse_weights, top_k, top_k_by_group
+from results_db import open_results
 
 
 def main() -> None:
@@ -31,20 +16,30 @@ def main() -> None:
     parser.add_argument("--input", default="output/metrics.csv")
     parser.add_argument("--output", default="output/top10.csv")
     parser.add_argument("--source", default="", help="Optional source filter")
+    parser.add_argument("--db", default="output/results.sqlite",
+                        help="Results database (rebuilt from --input when the CSV differs from the one it "
+                             "was built from)")
+    parser.add_argument("--k", type=int, default=10, help="Rows to keep (per group with --group-by)")
+    parser.add_argument("--weights", default="",
+                        help="Score weights as metric=weight,... (default: the standard score)")
+    parser.add_argument("--group-by", default="",
+                        help=f"Top-k per group: {', '.join(GROUPINGS)} or comma-separated columns")
     args = parser.parse_args()
 
-    rows = read_csv(args.input)
-    if args.source:
-        rows = [r for r in rows if r.get("source", "") == args.source]
-
-    if not rows:
+    weights = parse_weights(args.weights)
+    with open_results(args.db, args.input) as db:
+        rows = db.iter_rows(source=args.source) if db.columns else iter(())
+        if args.group_by:
+            group_by = GROUPINGS.get(args.group_by) or tuple(c.strip() for c in args.group_by.split(","))
+            groups = top_k_by_group(rows, group_by, args.k, weights)
+            top10 = [row for best in groups.values() for row in best]
+        else:
+            top10 = top_k(rows, args.k, weights)
+
+    if not top10:
         print("No data available")
         return
 
-    scored = [(score(r), r) for r in rows]
-    scored.sort(key=lambda x: x[0])
-    top10 = [r for _, r in scored[:10]]
-
     os.makedirs(os.path.dirname(args.output), exist_ok=True)
     fieldnames = list(top10[0].keys())
     with open(args.output, "w", newline="", encoding="utf-8") as f:
@@ -1,11 +1,16 @@
 #!/usr/bin/env python3
 import argparse
 import csv
+import hashlib
 import json
 import os
+import time
+from collections import OrderedDict, deque
+from concurrent.futures import ProcessPoolExecutor
+from dataclasses import asdict, dataclass, field, replace
 from datetime import datetime
 from pathlib import Path
-from typing import Dict, List
+from typing import Dict, Iterable, Iterator, List, Optional, Set, Tuple
 
 import sys
 
@@ -13,7 +18,18 @@ ROOT_DIR = Path(__file__).resolve().parents[1]
 SRC_DIR = ROOT_DIR / "src"
 sys.path.insert(0, str(SRC_DIR))
 
-from cafe_sim import CafeSimulation, CustomerType, SimConfig, summarize_metrics
+from analytic import estimate, screen
+from cafe_sim import (
+    WARMUP_DETECTION_COLUMNS,
+    CustomerType,
+    Metrics,
+    SimConfig,
+    canonical_model,
+    summarize_metrics,
+)
+from instance_store import InstanceStore
+from replications import ReplicationPlan, cached_replication, check_metrics, replicate, row_columns
+from result_cache import ResultCache
 
 
 def load_instance(path: str) -> Dict:
@@ -21,9 +37,18 @@ def load_instance(path: str) -> Dict:
         return json.load(f)
 
 
-def run_instance(instance_path: str, seed: int) -> Dict:
-    inst = load_instance(instance_path)
+@dataclass
+class RunOptions:
+    plan: ReplicationPlan = field(default_factory=ReplicationPlan)
+    config_overrides: Dict = field(default_factory=dict)  # SimConfig fields applied to every instance
+    cache: Optional[ResultCache] = None
+    prescreen: str = "off"  # "skip" or "cap" scenarios the analytic screen finds overloaded or idle
+    overload_threshold: float = 1.2
+    idle_threshold: float = 0.3
+    screened_replications: int = 1  # replications of a screened scenario with prescreen="cap"
 
+
+def build_model(inst: Dict, overrides: Dict = None) -> Tuple[SimConfig, List[CustomerType]]:
     config = SimConfig(
         hours=inst.get("hours", 4.0),
         warmup_hours=inst.get("warmup_hours", 0.5),
@@ -31,7 +56,10 @@ def run_instance(instance_path: str, seed: int) -> Dict:
         baristas=inst.get("staffing", {}).get("baristas", 2),
         pickup_attendants=inst.get("staffing", {}).get("pickup_attendants", 1),
         prep_queue_alpha=inst.get("prep_queue_alpha", 0.10),
+        rate_profile=tuple(inst.get("rate_profile") or ()),
     )
+    if overrides:
+        config = replace(config, **overrides)
 
     arrivals = inst.get("arrival_rates_per_hour", {})
     order_means = inst.get("order_time_mean", {})
@@ -46,46 +74,414 @@ def run_instance(instance_path: str, seed: int) -> Dict:
         CustomerType("slow", arrivals.get("slow", 6.0), order_means.get("slow", 1.8),
                      prep_means.get("slow", 4.0), patience_means.get("slow", 10.0)),
     ]
+    return config, customer_types
+
+
+def canonical_key(inst: Dict, overrides: Dict = None) -> str:
+    """Instances with the same key simulate the same canonical model (see ``canonical_model``)."""
+    config, customer_types = canonical_model(*build_model(inst, overrides))
+    payload = {"config": asdict(config), "customer_types": [asdict(ct) for ct in customer_types]}
+    return hashlib.sha256(json.dumps(payload, sort_keys=True).encode("utf-8")).hexdigest()
+
+
+def iter_instances(instances_dir: str = "data/instances", store_path: str = None) -> Iterator[Tuple[str, Dict]]:
+    """Yield ``(label, instance)`` from an instance store or a directory of JSON files, sorted by label.
+
+    The label is the bare instance name in both cases (``<name>.json`` files
+    hold instance ``<name>``), so results from either source can be joined
+    and resumed against each other.
+    """
+    if store_path:
+        with InstanceStore(store_path) as store:
+            for inst in store:
+                yield inst["name"], inst
+        return
+    for path in sorted(Path(instances_dir).glob("*.json")):
+        if path.name != "summary.json":
+            yield path.stem, load_instance(str(path))
 
-    sim = CafeSimulation(config, customer_types, seed=seed)
-    metrics = sim.run()
-    summary = summarize_metrics(metrics, config)
-    summary.update({
-        "instance": os.path.basename(instance_path),
+
+def instance_labels(label: str, inst: Dict) -> Dict:
+    staffing = inst.get("staffing", {})
+    return {
+        "instance": label,
         "source": inst.get("source", ""),
         "peak_hour": inst.get("peak_hour", ""),
-        "seed": seed,
-    })
+        "order_attendants": staffing.get("order_attendants", 1),
+        "baristas": staffing.get("baristas", 2),
+        "pickup_attendants": staffing.get("pickup_attendants", 1),
+        "prep_queue_alpha": inst.get("prep_queue_alpha", 0.10),
+    }
+
+
+def single_run(config: SimConfig, plan: ReplicationPlan) -> bool:
+    """Whether ``plan`` is one plain run (a summary row without replication columns)."""
+    return (
+        plan.replications <= 1
+        and not (plan.sequential or plan.reduces_variance)
+        and config.engine != "vectorized"
+    )
+
+
+def screened_row(config: SimConfig, customer_types: List[CustomerType], plan: ReplicationPlan) -> Dict:
+    """A row with the columns of a simulated one, filled with the analytic estimates."""
+    metrics = list(summarize_metrics(Metrics(streaming=config.streaming_metrics), config))
+    if config.batches > 0:
+        from steady_state import batch_columns
+
+        columns = batch_columns(metrics)
+    else:
+        if config.warmup_detection:
+            metrics += WARMUP_DETECTION_COLUMNS
+        columns = metrics if single_run(config, plan) else row_columns(metrics, plan)
+    row: Dict = dict.fromkeys(columns, "")
+    row.update((k, v) for k, v in estimate(config, customer_types).summary().items() if k in row)
+    if "replications" in row:
+        row["replications"] = 0
+    return row
+
+
+def run_instance(label: str, inst: Dict, seed: int, options: RunOptions = None) -> Dict:
+    options = options or RunOptions()
+    plan = options.plan
+    config, customer_types = canonical_model(*build_model(inst, options.config_overrides))
+
+    verdict = ""
+    if options.prescreen != "off":
+        verdict = screen(estimate(config, customer_types), options.overload_threshold, options.idle_threshold)
+
+    if verdict and options.prescreen == "skip":
+        summary = screened_row(config, customer_types, plan)
+    elif single_run(config, plan):
+        summary = dict(cached_replication(config, customer_types, seed, 0, options.cache))
+    else:
+        if verdict:
+            # Never more than the plan's own count; antithetic plans keep whole pairs.
+            replications = min(plan.replications, options.screened_replications)
+            if plan.antithetic:
+                replications += replications % 2
+            plan = replace(plan, replications=replications, target_half_width=0.0, relative_precision=0.0)
+        summary = replicate(config, customer_types, seed, plan, options.cache).as_row()
+    summary.update(instance_labels(label, inst))
+    summary["seed"] = seed
+    if options.prescreen != "off":
+        action = "skipped" if options.prescreen == "skip" else "capped"
+        summary["screening"] = f"{action}:{verdict}" if verdict else ""
     return summary
 
 
-def write_csv(rows: List[Dict], output_path: str) -> None:
-    if not rows:
+def available_cpus() -> int:
+    """CPUs this process may run on (respects affinity masks such as ``taskset``)."""
+    if hasattr(os, "sched_getaffinity"):
+        return len(os.sched_getaffinity(0))
+    return os.cpu_count() or 1
+
+
+Task = Tuple[str, Dict, int, RunOptions]
+
+
+def _run_task(task: Task) -> Dict:
+    label, inst, seed, options = task
+    return run_instance(label, inst, seed, options)
+
+
+def iter_results(tasks: Iterable[Task], workers: int = 1) -> Iterator[Dict]:
+    """Yield one summary per task, in task order.
+
+    With more than one worker the tasks are sent to a process pool. At most a
+    few tasks per worker are in flight, so results stream back as they finish
+    while the output order stays the same for any number of workers.
+    """
+    if workers <= 1:
+        for task in tasks:
+            yield _run_task(task)
         return
-    fieldnames = list(rows[0].keys())
-    with open(output_path, "w", newline="", encoding="utf-8") as f:
-        writer = csv.DictWriter(f, fieldnames=fieldnames)
-        writer.writeheader()
-        writer.writerows(rows)
+
+    max_pending = workers * 4
+    with ProcessPoolExecutor(max_workers=workers) as pool:
+        pending = deque()
+        for task in tasks:
+            pending.append(pool.submit(_run_task, task))
+            if len(pending) >= max_pending:
+                yield pending.popleft().result()
+        while pending:
+            yield pending.popleft().result()
+
+
+DEDUP_WINDOW = 100_000  # equivalence classes whose rows are remembered for fan-out
+
+
+def iter_rows(
+    instances: Iterable[Tuple[str, Dict]],
+    seed: int,
+    options: RunOptions,
+    workers: int = 1,
+    window: int = DEDUP_WINDOW,
+) -> Iterator[Dict]:
+    """Yield one row per instance, in input order, simulating each equivalence class once.
+
+    Instances are consumed lazily, so generation overlaps with simulation.
+    Members of a class get a copy of the representative's row with their own
+    labels. Only the last ``window`` class rows are kept, so memory stays
+    bounded on arbitrarily long streams; a class that reappears after being
+    forgotten is simulated again (or read back from the result cache).
+    """
+    recent: "OrderedDict[str, Dict]" = OrderedDict()
+    waiting: Dict[str, List[list]] = {}  # class key -> entries waiting for its row
+    entries: deque = deque()  # [labels, row], in input order
+    submitted: deque = deque()  # class keys, in task order
+
+    def tasks() -> Iterator[Task]:
+        for label, inst in instances:
+            key = canonical_key(inst, options.config_overrides)
+            entry = [instance_labels(label, inst), None]
+            entries.append(entry)
+            if key in recent:
+                recent.move_to_end(key)
+                entry[1] = recent[key]
+            elif key in waiting:
+                waiting[key].append(entry)
+            else:
+                waiting[key] = [entry]
+                submitted.append(key)
+                yield label, inst, seed, options
+
+    def ready() -> Iterator[Dict]:
+        while entries and entries[0][1] is not None:
+            labels, row = entries.popleft()
+            yield {**row, **labels}
+
+    for row in iter_results(tasks(), workers):
+        key = submitted.popleft()
+        recent[key] = row
+        if len(recent) > window:
+            recent.popitem(last=False)
+        for entry in waiting.pop(key):
+            entry[1] = row
+        yield from ready()
+    yield from ready()
+
+
+def manifest_path(output_path: str) -> str:
+    return f"{output_path}.manifest.json"
+
+
+def completed_instances(output_path: str) -> Set[str]:
+    """Instance labels already in ``output_path``.
+
+    A trailing partial line (left by a crash mid-write) is truncated away so
+    that appending continues from the last complete row.
+    """
+    if not os.path.exists(output_path):
+        return set()
+    with open(output_path, "rb+") as f:
+        data = f.read()
+        end = data.rfind(b"\n") + 1
+        if end < len(data):
+            f.truncate(end)
+    with open(output_path, newline="", encoding="utf-8") as f:
+        # Older runs labelled directory instances by file name.
+        return {row["instance"].removesuffix(".json") for row in csv.DictReader(f)}
+
+
+class ResultsWriter:
+    """Append rows to a CSV as they complete and keep a progress manifest next to it.
+
+    Every row is flushed immediately, so an interrupted run loses at most the
+    instances still in flight. The manifest records the run settings, which
+    ``--resume`` checks before appending to an existing file.
+    """
+
+    def __init__(self, output_path: str, settings: Dict, resume: bool = False):
+        self.output_path = output_path
+        self.settings = json.loads(json.dumps(settings))  # as it reads back from the manifest
+        self.done: Set[str] = set()  # instances already in the file when resuming
+        self.last_instance = ""
+        self._last_manifest = 0.0
+        self.fieldnames: Optional[List[str]] = None
+        if resume and os.path.exists(output_path):
+            previous = self.read_manifest()
+            if previous is not None and previous.get("settings") != self.settings:
+                raise SystemExit(f"{output_path} was written with different settings; cannot --resume")
+            self.done = completed_instances(output_path)
+            with open(output_path, newline="", encoding="utf-8") as f:
+                self.fieldnames = next(csv.reader(f), None)
+        else:
+            open(output_path, "w").close()
+        self.rows_written = len(self.done)
+        self.file = open(output_path, "a", newline="", encoding="utf-8")
+        self.writer = None
+        if self.fieldnames:
+            self.writer = csv.DictWriter(self.file, fieldnames=self.fieldnames)
+
+    def read_manifest(self) -> Optional[Dict]:
+        try:
+            with open(manifest_path(self.output_path), "r", encoding="utf-8") as f:
+                return json.load(f)
+        except (OSError, ValueError):
+            return None
+
+    def write_manifest(self, status: str) -> None:
+        manifest = {
+            "status": status,
+            "settings": self.settings,
+            "rows_written": self.rows_written,
+            "last_instance": self.last_instance,
+            "updated": datetime.now().isoformat(timespec="seconds"),
+        }
+        path = manifest_path(self.output_path)
+        with open(f"{path}.tmp", "w", encoding="utf-8") as f:
+            json.dump(manifest, f, indent=2)
+        os.replace(f"{path}.tmp", path)
+        self._last_manifest = time.monotonic()
+
+    def write(self, row: Dict) -> None:
+        if self.writer is None:
+            self.fieldnames = list(row.keys())
+            self.writer = csv.DictWriter(self.file, fieldnames=self.fieldnames)
+            self.writer.writeheader()
+        self.writer.writerow(row)
+        self.file.flush()
+        self.rows_written += 1
+        self.last_instance = row.get("instance", "")
+        if time.monotonic() - self._last_manifest >= 1.0:
+            self.write_manifest("running")
+
+    def close(self, status: str = "complete") -> None:
+        self.file.close()
+        self.write_manifest(status)
 
 
 def main() -> None:
     parser = argparse.ArgumentParser(description="Run batch simulations for all instances")
     parser.add_argument("--instances-dir", default="data/instances")
+    parser.add_argument("--instance-store", default="",
+                        help="Read instances from this SQLite store instead of --instances-dir")
+    parser.add_argument("--sweep", default="",
+                        help="Generate instances on the fly from a JSON sweep spec (see build_instances.iter_sweep)")
     parser.add_argument("--output", default="output/metrics.csv")
+    parser.add_argument("--resume", action="store_true",
+                        help="Append to --output, skipping instances it already contains")
     parser.add_argument("--seed", type=int, default=42)
+    parser.add_argument("--workers", type=int, default=1,
+                        help="Number of worker processes (0 = one per CPU)")
+    parser.add_argument("--replications", type=int, default=1,
+                        help="Independent replications per instance (adds _std and _ci_half_width columns)")
+    parser.add_argument("--max-replications", type=int, default=100,
+                        help="Upper bound for sequential stopping")
+    parser.add_argument("--target-half-width", type=float, default=0.0,
+                        help="Sequential mode: stop once the CI half-width is at most this value")
+    parser.add_argument("--relative-precision", type=float, default=0.0,
+                        help="Sequential mode: stop once half-width <= this fraction of the mean")
+    parser.add_argument("--precision-metrics", default="avg_system_time,abandonment_rate",
+                        help="Comma-separated metrics checked by sequential stopping (and adjusted by "
+                             "--control-variates)")
+    parser.add_argument("--antithetic", action="store_true",
+                        help="Run replications in antithetic pairs (simpy/native engines)")
+    parser.add_argument("--control-variates", action="store_true",
+                        help="Adjust the precision metrics by regression on realized vs expected arrivals")
+    parser.add_argument("--streaming-metrics", action="store_true",
+                        help="Constant-memory metric accumulators (P-square percentiles)")
+    parser.add_argument("--engine", choices=["simpy", "native", "vectorized"], default="simpy",
+                        help="SimPy processes, the native heap-based engine, or lockstep NumPy replications")
+    parser.add_argument("--variate-block-size", type=int, default=0,
+                        help="Pre-generate random variates in NumPy blocks of this size (0 = off)")
+    parser.add_argument("--crn", action="store_true",
+                        help="Common random numbers: per-customer draws at arrival from per-type streams")
+    parser.add_argument("--auto-warmup", action="store_true",
+                        help="Detect each run's warm-up with MSER-5 instead of the fixed warmup_hours")
+    parser.add_argument("--steady-state-precision", type=float, default=0.0,
+                        help="With --auto-warmup: end a run early once its mean system time has this "
+                             "relative CI half-width (batch means)")
+    parser.add_argument("--batch-means", type=int, default=0, metavar="BATCHES",
+                        help="One long run per instance (set the instances' hours or a sweep axis) summarized "
+                             "by batch means over this many post-warm-up batches")
+    parser.add_argument("--prescreen", choices=["off", "skip", "cap"], default="off",
+                        help="Analytic queueing screen: skip simulating overloaded/idle scenarios (analytic "
+                             "estimates instead) or cap their replications; marked in a 'screening' column")
+    parser.add_argument("--overload-threshold", type=float, default=1.2,
+                        help="Screen as overloaded when some stage's offered load per server reaches this")
+    parser.add_argument("--idle-threshold", type=float, default=0.3,
+                        help="Screen as idle when every stage's offered load per server is below this")
+    parser.add_argument("--screened-replications", type=int, default=1,
+                        help="Replications of screened scenarios with --prescreen cap (at most --replications)")
+    parser.add_argument("--cache-dir", default=str(ROOT_DIR / ".cache" / "results"),
+                        help="Directory of cached run summaries")
+    parser.add_argument("--cache-max-mb", type=float, default=256.0,
+                        help="Evict least recently used cache entries beyond this size")
+    parser.add_argument("--no-cache", action="store_true",
+                        help="Always simulate; neither read nor write the result cache")
     args = parser.parse_args()
 
-    instances_dir = Path(args.instances_dir)
-    instance_files = sorted(p for p in instances_dir.glob("*.json") if p.name != "summary.json")
-    rows = []
+    plan = ReplicationPlan(
+        replications=args.replications,
+        max_replications=args.max_replications,
+        target_half_width=args.target_half_width,
+        relative_precision=args.relative_precision,
+        metrics=tuple(m.strip() for m in args.precision_metrics.split(",") if m.strip()),
+        antithetic=args.antithetic,
+        control_variates=args.control_variates,
+    )
+    if args.antithetic and args.engine == "vectorized":
+        parser.error("--antithetic needs the simpy or native engine")
+    if args.auto_warmup and args.engine == "vectorized":
+        parser.error("--auto-warmup needs the simpy or native engine")
+    if args.steady_state_precision > 0 and not args.auto_warmup:
+        parser.error("--steady-state-precision needs --auto-warmup")
+    if args.steady_state_precision > 0 and args.control_variates:
+        parser.error("--control-variates needs full-length runs; --steady-state-precision ends them early")
+    if args.batch_means and (args.engine == "vectorized" or plan.sequential or plan.reduces_variance
+                             or args.replications > 1):
+        parser.error("--batch-means is a single run per instance on the simpy or native engine")
+    if plan.sequential or plan.reduces_variance:
+        try:
+            check_metrics(plan, list(summarize_metrics(Metrics(), SimConfig())))
+        except ValueError as exc:
+            parser.error(str(exc))
+    cache = None if args.no_cache else ResultCache(args.cache_dir, int(args.cache_max_mb * 1024 * 1024))
+    options = RunOptions(plan, {
+        "streaming_metrics": args.streaming_metrics,
+        "engine": args.engine,
+        "variate_block_size": args.variate_block_size,
+        "common_random_numbers": args.crn,
+        "warmup_detection": args.auto_warmup,
+        "steady_state_precision": args.steady_state_precision,
+        "batches": args.batch_means,
+    }, cache, args.prescreen, args.overload_threshold, args.idle_threshold, args.screened_replications)
+
+    workers = args.workers if args.workers > 0 else available_cpus()
+    if args.sweep:
+        from build_instances import iter_sweep
 
-    for path in instance_files:
-        rows.append(run_instance(str(path), args.seed))
+        with open(args.sweep, "r", encoding="utf-8") as f:
+            spec = json.load(f)
+        instances = ((inst["name"], inst) for inst in iter_sweep(spec))
+    else:
+        instances = iter_instances(args.instances_dir, args.instance_store or None)
 
-    os.makedirs(os.path.dirname(args.output), exist_ok=True)
-    write_csv(rows, args.output)
-    print(f"Wrote {args.output}")
+    os.makedirs(os.path.dirname(args.output) or ".", exist_ok=True)
+    settings = {
+        "input": args.sweep or args.instance_store or args.instances_dir,
+        "seed": args.seed,
+        "plan": asdict(plan),
+        "config_overrides": options.config_overrides,
+    }
+    if args.prescreen != "off":
+        settings["prescreen"] = [args.prescreen, args.overload_threshold, args.idle_threshold,
+                                 args.screened_replications]
+    writer = ResultsWriter(args.output, settings, resume=args.resume)
+    if writer.done:
+        instances = ((label, inst) for label, inst in instances if label not in writer.done)
+    try:
+        for row in iter_rows(instances, args.seed, options, workers):
+            writer.write(row)
+    except KeyboardInterrupt:
+        writer.close("interrupted")
+        raise SystemExit(f"Interrupted; {writer.rows_written} rows in {args.output} (rerun with --resume)")
+    writer.close()
+    if cache is not None:
+        cache.evict()
+    print(f"Wrote {args.output} ({writer.rows_written} instances, {len(writer.done)} from a previous run)")
 
 
 if __name__ == "__main__":
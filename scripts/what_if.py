@@ -0,0 +1,167 @@
+#!/usr/bin/env python3
+import argparse
+import csv
+import os
+import statistics
+import sys
+from concurrent.futures import ProcessPoolExecutor
+from pathlib import Path
+from typing import Dict, List, Tuple
+
+ROOT_DIR = Path(__file__).resolve().parents[1]
+sys.path.insert(0, str(ROOT_DIR / "src"))
+
+from cafe_sim import CustomerType, SimConfig, summarize_metrics
+from instance_store import InstanceStore
+from native_engine import FORKABLE, NativeCafeSimulation, Snapshot
+from replications import paired_difference, replication_streams
+from run_batch import available_cpus, build_model, load_instance
+
+Changes = Dict[str, float]
+
+
+def parse_alternative(text: str) -> Changes:
+    """``"baristas=3,prep_queue_alpha=0.05"`` -> ``{"baristas": 3, "prep_queue_alpha": 0.05}``."""
+    changes: Changes = {}
+    for part in text.split(","):
+        key, _, value = part.partition("=")
+        key = key.strip()
+        if key not in FORKABLE:
+            raise ValueError(f"Unknown field {key!r}; choose from {', '.join(FORKABLE)}")
+        changes[key] = float(value) if key == "prep_queue_alpha" else int(value)
+    return changes
+
+
+def alternative_label(changes: Changes) -> str:
+    return ",".join(f"{key}={value:g}" for key, value in changes.items()) or "as-is"
+
+
+def parse_time(text: str, start_hour: int) -> float:
+    """Minutes into the run: ``"10:15"`` is a clock time (the run starts at ``start_hour``), else minutes."""
+    if ":" in text:
+        hour, minute = text.split(":")
+        return (int(hour) - start_hour) * 60.0 + int(minute)
+    return float(text)
+
+
+def prefix_snapshot(
+    config: SimConfig, customer_types: List[CustomerType], seed: int, index: int, at: float
+) -> Tuple[Snapshot, Dict[str, int]]:
+    """Simulate replication ``index`` up to ``at`` minutes once; return its snapshot and queue state."""
+    sim = NativeCafeSimulation(config, customer_types, seed, replication_streams(seed, index))
+    sim.advance(at)
+    return sim.snapshot(), sim.queue_state()
+
+
+def run_fork(task: Tuple[Snapshot, Changes]) -> Dict[str, float]:
+    snapshot, changes = task
+    sim = snapshot.fork(**changes)
+    return summarize_metrics(sim.run(), sim.config)
+
+
+def what_if(
+    config: SimConfig,
+    customer_types: List[CustomerType],
+    alternatives: List[Changes],
+    at: float,
+    replications: int = 20,
+    seed: int = 42,
+    workers: int = 1,
+) -> Tuple[List[List[Dict[str, float]]], List[Dict[str, int]]]:
+    """Continue each replication's state at ``at`` under every alternative.
+
+    The prefix up to ``at`` is simulated once per replication; the forks of
+    one snapshot share its random streams, so alternatives are compared on
+    the same future customers. Returns the summaries per alternative (one per
+    replication) and the queue state of each snapshot.
+    """
+    prefixes = [prefix_snapshot(config, customer_types, seed, r, at) for r in range(replications)]
+    tasks = [(snapshot, changes) for changes in alternatives for snapshot, _ in prefixes]
+    if workers > 1:
+        with ProcessPoolExecutor(max_workers=workers) as pool:
+            summaries = list(pool.map(run_fork, tasks, chunksize=max(1, len(tasks) // (workers * 4))))
+    else:
+        summaries = [run_fork(task) for task in tasks]
+    per_alternative = [summaries[i * replications:(i + 1) * replications] for i in range(len(alternatives))]
+    return per_alternative, [state for _, state in prefixes]
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(
+        description="Fork a running simulation at a given time into staffing/alpha alternatives"
+    )
+    parser.add_argument("--instance", required=True,
+                        help="Instance JSON file, or instance name with --instance-store")
+    parser.add_argument("--instance-store", default="", help="SQLite instance store")
+    parser.add_argument("--at", required=True,
+                        help="Fork time: minutes into the run, or HH:MM (the run starts at the instance's "
+                             "open_hour, else its peak_hour)")
+    parser.add_argument("--alternative", action="append", default=[],
+                        help=f"Changes applied at the fork, e.g. baristas=3 or baristas=3,prep_queue_alpha=0.05 "
+                             f"(repeatable; fields: {', '.join(FORKABLE)}); the unchanged run is the baseline")
+    parser.add_argument("--replications", type=int, default=20)
+    parser.add_argument("--seed", type=int, default=42)
+    parser.add_argument("--metrics", default="avg_system_time,abandonment_rate,avg_prep_wait")
+    parser.add_argument("--no-crn", action="store_true",
+                        help="Draw service times in event order instead of per customer at arrival")
+    parser.add_argument("--workers", type=int, default=0, help="Worker processes for the forks (0 = all CPUs)")
+    parser.add_argument("--output", default="output/what_if.csv")
+    args = parser.parse_args()
+
+    if args.instance_store:
+        with InstanceStore(args.instance_store) as store:
+            inst = store.get(args.instance)
+        if inst is None:
+            raise SystemExit(f"Instance {args.instance!r} not found in {args.instance_store}")
+    else:
+        inst = load_instance(args.instance)
+    if args.replications < 2:
+        parser.error("--replications must be at least 2")
+    if not args.alternative:
+        parser.error("give at least one --alternative")
+    try:
+        alternatives = [{}] + [parse_alternative(text) for text in args.alternative]
+    except ValueError as exc:
+        parser.error(str(exc))
+
+    config, customer_types = build_model(inst, {"engine": "native", "common_random_numbers": not args.no_crn})
+    at = parse_time(args.at, inst.get("open_hour", inst.get("peak_hour", 0)))
+    if not 0 <= at < config.hours * 60:
+        parser.error(f"--at must fall within the run (0 to {config.hours * 60:g} minutes)")
+    workers = args.workers if args.workers > 0 else available_cpus()
+    summaries, states = what_if(config, customer_types, alternatives, at, args.replications, args.seed, workers)
+
+    print(f"State at minute {at:g} (mean over {args.replications} replications):")
+    for key in states[0]:
+        print(f"  {key}: {statistics.fmean(state[key] for state in states):.2f}")
+    metrics = [m.strip() for m in args.metrics.split(",") if m.strip()]
+    rows = []
+    for changes, result in zip(alternatives, summaries):
+        for metric in metrics:
+            values = [s[metric] for s in result]
+            difference, _, half_width = paired_difference([s[metric] for s in summaries[0]], values)
+            rows.append({
+                "alternative": alternative_label(changes),
+                "fork_minute": at,
+                "metric": metric,
+                "mean": statistics.fmean(values),
+                "mean_difference": difference,
+                "ci_half_width": half_width,
+                "significant": abs(difference) > half_width,
+                "replications": len(values),
+            })
+    for row in rows:
+        flag = "*" if row["significant"] else " "
+        print(f"{row['alternative']:>24} {row['metric']:<18} {row['mean']:10.4f} "
+              f"{row['mean_difference']:+10.4f} ± {row['ci_half_width']:.4f} {flag}")
+
+    os.makedirs(os.path.dirname(args.output) or ".", exist_ok=True)
+    with open(args.output, "w", newline="", encoding="utf-8") as f:
+        writer = csv.DictWriter(f, fieldnames=list(rows[0].keys()))
+        writer.writeheader()
+        writer.writerows(rows)
+    print(f"Wrote {args.output}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,175 @@
+import math
+from dataclasses import dataclass
+from typing import Dict, List
+
+from cafe_sim import CustomerType, SimConfig, offered_minutes
+
+MAX_STATES = 1_000_000  # truncation guard for the Erlang-A birth-death chain
+
+
+@dataclass
+class StageEstimate:
+    """Steady-state approximation of one station (times in minutes)."""
+
+    servers: int
+    offered_load: float  # arrival rate x mean service time, in Erlangs
+    wait_probability: float
+    mean_wait: float  # over all arrivals, including those who abandon
+    abandonment: float = 0.0
+
+    @property
+    def utilization(self) -> float:
+        """Offered load per server; >= 1 means the queue grows without bound (absent reneging)."""
+        return self.offered_load / max(self.servers, 1)
+
+
+def erlang_b(servers: int, load: float) -> float:
+    """Blocking probability of M/M/c/c, by the stable recursion on ``servers``."""
+    b = 1.0
+    for k in range(1, servers + 1):
+        b = load * b / (k + load * b)
+    return b
+
+
+def erlang_c(servers: int, load: float) -> float:
+    """Probability that an arrival waits in M/M/c (1.0 when overloaded)."""
+    if servers <= 0 or load >= servers:
+        return 1.0
+    b = erlang_b(servers, load)
+    return b / (1 - load / servers * (1 - b))
+
+
+def mmc(arrival_rate: float, service_mean: float, servers: int, horizon: float = math.inf) -> StageEstimate:
+    """M/M/c; an overloaded station gets the fluid-limit wait over ``horizon`` minutes.
+
+    Starting empty, the backlog grows at ``lambda - c mu``, so an arrival at
+    time ``t`` waits about ``(rho - 1) t``; averaged over the horizon that is
+    ``(rho - 1) horizon / 2``.
+    """
+    load = arrival_rate * service_mean
+    if arrival_rate <= 0:
+        return StageEstimate(servers, 0.0, 0.0, 0.0)
+    p_wait = erlang_c(servers, load)
+    if load >= servers:
+        rho = load / servers if servers > 0 else math.inf
+        return StageEstimate(servers, load, 1.0, (rho - 1) * horizon / 2)
+    return StageEstimate(servers, load, p_wait, p_wait * service_mean / (servers - load))
+
+
+def erlang_a(arrival_rate: float, service_mean: float, servers: int, patience_mean: float) -> StageEstimate:
+    """M/M/c+M (Erlang-A): exponential patience, solved on the truncated birth-death chain.
+
+    With reneging the chain is stable at any load, so this also covers
+    overloaded counters; abandonment is ``theta * E[Lq] / lambda``.
+    """
+    if patience_mean <= 0 or math.isinf(patience_mean):
+        return mmc(arrival_rate, service_mean, servers)
+    if arrival_rate <= 0:
+        return StageEstimate(servers, 0.0, 0.0, 0.0)
+    mu = 1.0 / service_mean
+    theta = 1.0 / patience_mean
+    p = 1.0
+    total = 1.0
+    waiting = 0.0  # sum of p_n for n >= servers
+    queue = 0.0  # sum of (n - servers) p_n
+    if servers == 0:
+        waiting = 1.0
+    n = 0
+    while n < MAX_STATES:
+        n += 1
+        death = min(n, servers) * mu + max(n - servers, 0) * theta
+        p *= arrival_rate / death
+        total += p
+        if n >= servers:
+            waiting += p
+            queue += (n - servers) * p
+        if total > 1e250:  # rescale to avoid overflow on heavily loaded counters
+            p, total, waiting, queue = p / total, 1.0, waiting / total, queue / total
+        if n > servers and death > arrival_rate and p < 1e-15 * total:
+            break
+    mean_queue = queue / total
+    return StageEstimate(
+        servers,
+        arrival_rate * service_mean,
+        waiting / total,
+        mean_queue / arrival_rate,
+        min(theta * mean_queue / arrival_rate, 1.0),
+    )
+
+
+@dataclass
+class AnalyticEstimate:
+    order: StageEstimate
+    prep: StageEstimate
+    pickup: StageEstimate
+    service_time: float  # mean order + prep + pickup time of a served customer
+
+    @property
+    def stages(self) -> List[StageEstimate]:
+        return [self.order, self.prep, self.pickup]
+
+    @property
+    def system_time(self) -> float:
+        return sum(stage.mean_wait for stage in self.stages) + self.service_time
+
+    def summary(self) -> Dict[str, float]:
+        """Estimates under the ``summarize_metrics`` names (utilization is the carried load)."""
+        row = {
+            "abandonment_rate": self.order.abandonment,
+            "avg_order_wait": self.order.mean_wait,
+            "avg_prep_wait": self.prep.mean_wait,
+            "avg_pickup_wait": self.pickup.mean_wait,
+            "avg_system_time": self.system_time,
+        }
+        for name, stage in zip(("order", "prep", "pickup"), self.stages):
+            carried = stage.offered_load * (1 - stage.abandonment)
+            row[f"{name}_utilization"] = min(carried / max(stage.servers, 1), 1.0)
+        return row
+
+
+def estimate(config: SimConfig, customer_types: List[CustomerType]) -> AnalyticEstimate:
+    """Stage-by-stage queueing approximation of one instance.
+
+    Customer types are pooled into one arrival stream with rate-weighted
+    service means and abandonment rates, services are treated as
+    exponential, and each stage gets the throughput of the one before it.
+    ``prep_queue_alpha`` is ignored, so prep waits are optimistic.
+    Overloaded prep and pickup stations use the fluid approximation over
+    ``config.hours``, since they have no reneging to stabilize them. With a
+    ``rate_profile`` the rates are averaged over the horizon, which hides
+    peak-hour congestion.
+    """
+    active = [ct for ct in customer_types if ct.arrival_rate_per_hour > 0]
+    horizon = config.hours * 60.0
+    scale = offered_minutes(config) / horizon if horizon > 0 else 1.0
+    base = sum(ct.arrival_rate_per_hour for ct in active) / 60.0  # per minute
+    rate = scale * base
+
+    def weighted(values) -> float:
+        return sum(ct.arrival_rate_per_hour / 60.0 * v for ct, v in zip(active, values)) / base if base else 0.0
+
+    order_mean = weighted(ct.order_time_mean for ct in active)
+    prep_mean = weighted(ct.prep_time_mean for ct in active)
+    abandon_rate = weighted(1.0 / ct.patience_mean if ct.patience_mean > 0 else 0.0 for ct in active)
+    patience = 1.0 / abandon_rate if abandon_rate > 0 else math.inf
+
+    order = erlang_a(rate, order_mean, config.order_attendants, patience)
+    served = rate * (1 - order.abandonment)
+    prep = mmc(served, prep_mean, config.baristas, horizon)
+    pickup = mmc(served, config.pickup_time_mean, config.pickup_attendants, horizon)
+    return AnalyticEstimate(order, prep, pickup, order_mean + prep_mean + config.pickup_time_mean)
+
+
+def screen(result: AnalyticEstimate, overload: float = 1.2, idle: float = 0.3) -> str:
+    """``"overloaded"``, ``"idle"`` or ``""`` (worth simulating).
+
+    Overloaded: some stage's offered load per server is at least ``overload``
+    (or half the customers renege at the counter). Idle: every stage is
+    below ``idle``, so queues are negligible.
+    """
+    utilizations = [stage.utilization for stage in result.stages]
+    if max(utilizations) >= overload or result.order.abandonment >= 0.5:
+        return "overloaded"
+    if max(utilizations) < idle:
+        return "idle"
+    return ""
@@ -1,9 +1,16 @@
 import argparse
+import functools
+import hashlib
+import math
 import random
 import statistics
-from dataclasses import dataclass
-from typing import Dict, List, Tuple
+from bisect import bisect_left, bisect_right
+from collections import deque
+from dataclasses import dataclass, field, replace
+from heapq import heappop, heappush
+from typing import Callable, Dict, List, Sequence, Tuple, Union
 
+import numpy as np
 import simpy
 
 
@@ -25,7 +32,345 @@ class SimConfig:
     pickup_attendants: int = 1
     prep_queue_alpha: float = 0.10
     pickup_time_mean: float = 0.2  # minutes
-    sample_interval: float = 0.5  # minutes
+    sample_interval: float = 0.0  # minutes; > 0 also records fixed-interval queue samples
+    streaming_metrics: bool = False  # constant-memory accumulators instead of lists
+    engine: str = "simpy"  # "simpy", "native" or "vectorized" (replication batches only)
+    variate_block_size: int = 0  # > 0 pre-generates variates in NumPy blocks of this size
+    common_random_numbers: bool = False  # draw each customer's attributes at arrival from per-type streams
+    warmup_detection: bool = False  # MSER-5 truncation point per run instead of warmup_hours
+    steady_state_precision: float = 0.0  # with warmup_detection: stop once the mean system time is this precise
+    batches: int = 0  # > 0: one long run summarized by batch means over this many post-warm-up batches
+    rate_profile: Tuple[float, ...] = ()  # hourly arrival-rate multipliers; hour k uses entry k mod len
+
+
+REPORTED_QUANTILES = (0.50, 0.90, 0.95, 0.99)
+WARMUP_DETECTION_COLUMNS = ("warmup_minutes", "simulated_minutes")  # extra summary keys with warmup_detection
+
+
+def percentile(values: Sequence[float], q: float) -> float:
+    """Linearly interpolated percentile (same convention as numpy's default)."""
+    if not values:
+        return 0.0
+    ordered = sorted(values)
+    pos = q * (len(ordered) - 1)
+    lo = math.floor(pos)
+    hi = min(lo + 1, len(ordered) - 1)
+    return ordered[lo] + (ordered[hi] - ordered[lo]) * (pos - lo)
+
+
+class P2Quantile:
+    """P-square streaming quantile estimator (Jain & Chlamtac, 1985).
+
+    Keeps five markers whose heights track the minimum, the p/2, p and
+    (1+p)/2 quantiles and the maximum, so memory is constant.
+    """
+
+    def __init__(self, p: float):
+        self.p = p
+        self.heights: List[float] = []
+        self.positions = [1.0, 2.0, 3.0, 4.0, 5.0]
+        self.desired = [1.0, 1.0 + 2 * p, 1.0 + 4 * p, 3.0 + 2 * p, 5.0]
+        self.increments = [0.0, p / 2, p, (1 + p) / 2, 1.0]
+
+    def add(self, x: float) -> None:
+        q = self.heights
+        if len(q) < 5:
+            q.append(x)
+            q.sort()
+            return
+        n = self.positions
+        if x < q[0]:
+            q[0] = x
+            k = 0
+        elif x >= q[4]:
+            q[4] = x
+            k = 3
+        else:
+            k = 0
+            while x >= q[k + 1]:
+                k += 1
+        for i in range(k + 1, 5):
+            n[i] += 1
+        for i in range(5):
+            self.desired[i] += self.increments[i]
+        for i in (1, 2, 3):
+            d = self.desired[i] - n[i]
+            if (d >= 1 and n[i + 1] - n[i] > 1) or (d <= -1 and n[i - 1] - n[i] < -1):
+                step = 1 if d > 0 else -1
+                candidate = self._parabolic(i, step)
+                if q[i - 1] < candidate < q[i + 1]:
+                    q[i] = candidate
+                else:
+                    q[i] = q[i] + step * (q[i + step] - q[i]) / (n[i + step] - n[i])
+                n[i] += step
+
+    def _parabolic(self, i: int, d: int) -> float:
+        q, n = self.heights, self.positions
+        return q[i] + d / (n[i + 1] - n[i - 1]) * (
+            (n[i] - n[i - 1] + d) * (q[i + 1] - q[i]) / (n[i + 1] - n[i])
+            + (n[i + 1] - n[i] - d) * (q[i] - q[i - 1]) / (n[i] - n[i - 1])
+        )
+
+    def value(self) -> float:
+        if len(self.heights) < 5:
+            return percentile(self.heights, self.p)
+        return self.heights[2]
+
+
+class StreamingSeries:
+    """Constant-memory stand-in for a list of observations.
+
+    Supports ``append`` and ``len`` like a list, and keeps a Welford running
+    mean/variance plus P-square estimators for the requested quantiles.
+    """
+
+    def __init__(self, quantiles: Sequence[float] = ()):
+        self.count = 0
+        self.mean = 0.0
+        self._m2 = 0.0
+        self._quantiles = {q: P2Quantile(q) for q in quantiles}
+
+    def append(self, x: float) -> None:
+        self.count += 1
+        delta = x - self.mean
+        self.mean += delta / self.count
+        self._m2 += delta * (x - self.mean)
+        for estimator in self._quantiles.values():
+            estimator.add(x)
+
+    def __len__(self) -> int:
+        return self.count
+
+    @property
+    def variance(self) -> float:
+        return self._m2 / (self.count - 1) if self.count > 1 else 0.0
+
+    def quantile(self, q: float) -> float:
+        if self.count == 0:
+            return 0.0
+        return self._quantiles[q].value()
+
+
+Series = Union[List[float], StreamingSeries]
+
+
+class TimeWeightedStat:
+    """Exact time average of a piecewise-constant signal such as a queue length.
+
+    ``update`` is called whenever the signal changes; the area under the curve
+    is only accumulated from ``start`` (the end of warm-up) onwards.
+    """
+
+    def __init__(self, start: float = 0.0):
+        self.start = start
+        self.value = 0
+        self.last_time = 0.0
+        self.area = 0.0
+
+    def _area_until(self, now: float) -> float:
+        if now <= self.start:
+            return self.area
+        return self.area + self.value * (now - max(self.last_time, self.start))
+
+    def update(self, now: float, value: float) -> None:
+        # Hot path: inlined _area_until
+        if now > self.start:
+            last = self.last_time if self.last_time > self.start else self.start
+            self.area += self.value * (now - last)
+        self.last_time = now
+        self.value = value
+
+    def mean(self, end: float) -> float:
+        if end <= self.start:
+            return 0.0
+        return self._area_until(end) / (end - self.start)
+
+
+class RecordingTimeWeightedStat(TimeWeightedStat):
+    """``TimeWeightedStat`` that also keeps every change of the signal.
+
+    The history lets the average be taken from a start time chosen after the
+    run (``since``) and gives the windowed series warm-up detection needs.
+    """
+
+    def __init__(self, start: float = 0.0):
+        super().__init__(start)
+        self.times: List[float] = [0.0]
+        self.values: List[float] = [0]
+
+    def update(self, now: float, value: float) -> None:
+        super().update(now, value)
+        self.times.append(now)
+        self.values.append(value)
+
+    def since(self, start: float) -> TimeWeightedStat:
+        """Plain statistic accumulating from ``start``, replayed from the history."""
+        return self.between(start, math.inf)
+
+    def between(self, start: float, end: float) -> TimeWeightedStat:
+        """Plain statistic over ``[start, end)`` only; read it with ``mean(end)``."""
+        first = max(bisect_right(self.times, start) - 1, 0)
+        last = bisect_left(self.times, end)
+        stat = TimeWeightedStat(start)
+        for now, value in zip(self.times[first:last], self.values[first:last]):
+            stat.update(now, value)
+        return stat
+
+    def window_means(self, width: float, end: float) -> List[float]:
+        """Time averages over consecutive windows ``[k * width, (k + 1) * width)`` up to ``end``."""
+        n = int(end // width)
+        areas = [0.0] * n
+        limit = n * width
+        times = self.times + [end]
+        for i, value in enumerate(self.values):
+            lo, hi = times[i], min(times[i + 1], limit)
+            k = int(lo // width)
+            while value and lo < hi:
+                edge = min((k + 1) * width, hi)
+                areas[k] += value * (edge - lo)
+                lo = edge
+                k += 1
+        return [area / width for area in areas]
+
+
+def records_history(config: SimConfig) -> bool:
+    """Whether runs keep their full history (warm-up detection or batch means)."""
+    return config.warmup_detection or config.batches > 0
+
+
+def stats_start(config: SimConfig) -> float:
+    """Time from which engines record statistics: the warm-up end, or 0 to keep the whole history."""
+    if config.steady_state_precision > 0 and not config.warmup_detection:
+        raise ValueError("steady_state_precision needs warmup_detection")
+    if not records_history(config):
+        return config.warmup_hours * 60
+    if config.streaming_metrics:
+        raise ValueError("Warm-up detection and batch means need per-customer lists; disable streaming_metrics")
+    return 0.0
+
+
+class _ObservedList(list):
+    def __init__(self, on_change):
+        super().__init__()
+        self._on_change = on_change
+
+    def append(self, item) -> None:
+        super().append(item)
+        self._on_change()
+
+    def remove(self, item) -> None:
+        super().remove(item)
+        self._on_change()
+
+    def pop(self, index: int = -1):
+        item = super().pop(index)
+        self._on_change()
+        return item
+
+
+class MonitoredResource(simpy.Resource):
+    """``simpy.Resource`` that tracks time-weighted queue length and busy servers.
+
+    The queue and user lists notify the statistics on every change, so the
+    averages are exact and need no sampling events.
+    """
+
+    def __init__(
+        self, env: simpy.Environment, capacity: int = 1, stats_start: float = 0.0, stat_class=TimeWeightedStat
+    ):
+        super().__init__(env, capacity)
+        self.queue_stat = stat_class(stats_start)
+        self.busy_stat = stat_class(stats_start)
+        self.put_queue = self.queue = _ObservedList(self._record)
+        self.users = _ObservedList(self._record)
+
+    def _record(self) -> None:
+        now = self._env.now
+        self.queue_stat.update(now, len(self.put_queue))
+        self.busy_stat.update(now, len(self.users))
+
+
+class ImpatientResource:
+    """FIFO multi-server resource for customers who renege after a patience deadline.
+
+    Waiting requests are kept in a FIFO plus a heap keyed by abandonment
+    deadline. No timeout event is scheduled per customer: requests whose
+    deadline has passed are purged lazily whenever the resource is touched,
+    and once more at the end of the run via ``expire``. Purged requests
+    succeed with ``False``; granted requests succeed with ``True``.
+    """
+
+    def __init__(
+        self,
+        env: simpy.Environment,
+        capacity: int = 1,
+        stats_start: float = 0.0,
+        on_abandon=None,
+        stat_class=TimeWeightedStat,
+    ):
+        self._env = env
+        self.capacity = capacity
+        self.count = 0
+        self.waiting = 0
+        self.queue_stat = stat_class(stats_start)
+        self.busy_stat = stat_class(stats_start)
+        self._on_abandon = on_abandon
+        self._fifo = deque()
+        self._deadlines = []
+        self._seq = 0
+
+    @property
+    def queue(self) -> List[simpy.Event]:
+        return [req for req in self._fifo if req.waiting]
+
+    def request(self, patience: float) -> simpy.Event:
+        now = self._env.now
+        self.expire(now)
+        req = self._env.event()
+        if self.count < self.capacity and not self.waiting:
+            req.waiting = False
+            self._grant(req, now)
+            return req
+        req.waiting = True
+        self._seq += 1
+        heappush(self._deadlines, (now + patience, self._seq, req))
+        self._fifo.append(req)
+        self.waiting += 1
+        self.queue_stat.update(now, self.waiting)
+        return req
+
+    def release(self) -> None:
+        now = self._env.now
+        self.expire(now)
+        self.count -= 1
+        self.busy_stat.update(now, self.count)
+        while self._fifo:
+            req = self._fifo.popleft()
+            if req.waiting:
+                req.waiting = False
+                self.waiting -= 1
+                self.queue_stat.update(now, self.waiting)
+                self._grant(req, now)
+                return
+
+    def expire(self, now: float) -> None:
+        """Renege every waiting request whose deadline is before ``now``."""
+        deadlines = self._deadlines
+        while deadlines and deadlines[0][0] < now:
+            deadline, _, req = heappop(deadlines)
+            if not req.waiting:
+                continue
+            req.waiting = False
+            self.waiting -= 1
+            self.queue_stat.update(deadline, self.waiting)
+            if self._on_abandon is not None:
+                self._on_abandon(deadline)
+            req.succeed(False)
+
+    def _grant(self, req: simpy.Event, now: float) -> None:
+        self.count += 1
+        self.busy_stat.update(now, self.count)
+        req.succeed(True)
 
 
 @dataclass
@@ -33,79 +378,417 @@ class Metrics:
     total_customers: int = 0
     completed_customers: int = 0
     abandoned_customers: int = 0
-    order_waits: List[float] = None
-    prep_waits: List[float] = None
-    pickup_waits: List[float] = None
-    system_times: List[float] = None
+    order_waits: Series = None
+    prep_waits: Series = None
+    pickup_waits: Series = None
+    system_times: Series = None
     order_busy_time: float = 0.0
     prep_busy_time: float = 0.0
     pickup_busy_time: float = 0.0
-    order_queue_samples: List[int] = None
-    prep_queue_samples: List[int] = None
-    pickup_queue_samples: List[int] = None
+    order_queue_samples: Series = None
+    prep_queue_samples: Series = None
+    pickup_queue_samples: Series = None
+    streaming: bool = False
+    order_queue_length: TimeWeightedStat = None
+    prep_queue_length: TimeWeightedStat = None
+    pickup_queue_length: TimeWeightedStat = None
+    order_busy_servers: TimeWeightedStat = None
+    prep_busy_servers: TimeWeightedStat = None
+    pickup_busy_servers: TimeWeightedStat = None
+    # Server counts over time; only set when capacity changes mid-run (a forked snapshot)
+    order_servers: TimeWeightedStat = None
+    prep_servers: TimeWeightedStat = None
+    pickup_servers: TimeWeightedStat = None
+    end_time: float = 0.0
+    arrivals: Dict[str, int] = field(default_factory=dict)  # per customer type, whole horizon
+    departures: List[float] = None  # completion times, kept for warm-up detection and batch means
+    arrival_times: List[float] = None
+    abandon_times: List[float] = None
 
     def __post_init__(self):
-        self.order_waits = []
-        self.prep_waits = []
-        self.pickup_waits = []
-        self.system_times = []
-        self.order_queue_samples = []
-        self.prep_queue_samples = []
-        self.pickup_queue_samples = []
+        if self.streaming:
+            waits = lambda: StreamingSeries(REPORTED_QUANTILES)  # noqa: E731
+            samples = StreamingSeries
+        else:
+            waits = samples = list
+        self.order_waits = waits()
+        self.prep_waits = waits()
+        self.pickup_waits = waits()
+        self.system_times = waits()
+        self.order_queue_samples = samples()
+        self.prep_queue_samples = samples()
+        self.pickup_queue_samples = samples()
 
+    def start_history(self) -> None:
+        """Keep event times so summaries can be cut at any time after the run."""
+        self.departures = []
+        self.arrival_times = []
+        self.abandon_times = []
 
-class CafeSimulation:
-    def __init__(self, config: SimConfig, customer_types: List[CustomerType], seed: int = 42):
-        self.config = config
-        self.customer_types = customer_types
+
+class AntitheticRandom(random.Random):
+    """``random.Random`` whose uniforms are ``1 - u`` of the same seed's stream.
+
+    ``expovariate`` and ``triangular`` are inverse transforms of ``random()``,
+    so every draw mirrors the one the plain generator would have made.
+    """
+
+    def random(self) -> float:
+        u = super().random()
+        return 1.0 - u if u else u
+
+
+class RandomStreams:
+    """Independent named random generators derived from one root seed.
+
+    Each stream name (e.g. ``"arrivals.fast"``) gets its own ``random.Random``
+    seeded from a hash of the root seed, the spawn key and the name, in the
+    spirit of numpy's SeedSequence. Streams never share state with the global
+    ``random`` module or with each other, so draws in one stream do not shift
+    the others. With ``antithetic`` every uniform ``u`` becomes ``1 - u``.
+    """
+
+    def __init__(self, seed: int, spawn_key: Tuple[int, ...] = (), antithetic: bool = False):
         self.seed = seed
-        self.env = simpy.Environment()
-        self.metrics = Metrics()
-        self.order_counter = simpy.Resource(self.env, capacity=config.order_attendants)
-        self.prep_area = simpy.Resource(self.env, capacity=config.baristas)
-        self.pickup_counter = simpy.Resource(self.env, capacity=config.pickup_attendants)
-        random.seed(seed)
+        self.spawn_key = tuple(spawn_key)
+        self.antithetic = antithetic
+        self._streams: Dict[str, random.Random] = {}
+
+    def derive_seed(self, name: str) -> int:
+        key = "/".join([str(self.seed), *(str(k) for k in self.spawn_key), name])
+        return int.from_bytes(hashlib.sha256(key.encode("utf-8")).digest()[:8], "big")
+
+    def stream(self, name: str) -> random.Random:
+        rng = self._streams.get(name)
+        if rng is None:
+            rng = (AntitheticRandom if self.antithetic else random.Random)(self.derive_seed(name))
+            self._streams[name] = rng
+        return rng
+
+    def spawn(self, index: int) -> "RandomStreams":
+        """Child streams for e.g. replication ``index``, independent of the parent."""
+        return RandomStreams(self.seed, self.spawn_key + (index,))
+
+    def antithetic_twin(self) -> "RandomStreams":
+        """Fresh streams with the same seeds as these but mirrored uniforms."""
+        return RandomStreams(self.seed, self.spawn_key, not self.antithetic)
+
+    def expovariate(self, name: str, lambd: float) -> float:
+        rng = self._streams.get(name) or self.stream(name)
+        return rng.expovariate(lambd)
+
+    def triangular(self, name: str, low: float, high: float, mode: float) -> float:
+        rng = self._streams.get(name) or self.stream(name)
+        return rng.triangular(low, high, mode)
+
+    def exponential_sampler(self, name: str, lambd: float) -> Callable[[], float]:
+        """Zero-argument callable returning successive Exp(lambd) draws from stream ``name``."""
+        return functools.partial(self.stream(name).expovariate, lambd)
+
+    def triangular_sampler(self, name: str, low: float, high: float, mode: float) -> Callable[[], float]:
+        return functools.partial(self.stream(name).triangular, low, high, mode)
 
-    def expovariate_minutes(self, rate_per_hour: float) -> float:
+
+class BufferedVariates(RandomStreams):
+    """``RandomStreams`` that pre-generates variates in NumPy blocks.
+
+    Each sampler draws a block of uniforms from its stream's
+    ``numpy.random.Generator``, converts it by inverse transform to the
+    requested distribution and hands out the floats one by one, refilling
+    when the block runs out. Hot loops then only pop precomputed values.
+    """
+
+    def __init__(
+        self, seed: int, spawn_key: Tuple[int, ...] = (), block_size: int = 4096, antithetic: bool = False
+    ):
+        super().__init__(seed, spawn_key, antithetic)
+        self.block_size = block_size
+        self._generators: Dict[str, "np.random.Generator"] = {}
+        self._samplers: Dict[Tuple, Callable[[], float]] = {}
+
+    def generator(self, name: str) -> "np.random.Generator":
+        gen = self._generators.get(name)
+        if gen is None:
+            gen = np.random.Generator(np.random.PCG64(self.derive_seed(name)))
+            self._generators[name] = gen
+        return gen
+
+    def spawn(self, index: int) -> "BufferedVariates":
+        return BufferedVariates(self.seed, self.spawn_key + (index,), self.block_size)
+
+    def antithetic_twin(self) -> "BufferedVariates":
+        return BufferedVariates(self.seed, self.spawn_key, self.block_size, not self.antithetic)
+
+    def _uniforms(self, name: str) -> "np.ndarray":
+        u = self.generator(name).random(self.block_size)
+        if self.antithetic:
+            return np.where(u > 0, 1.0 - u, u)
+        return u
+
+    def _values(self, name: str, transform):
+        while True:
+            yield from transform(self._uniforms(name)).tolist()
+
+    def exponential_sampler(self, name: str, lambd: float) -> Callable[[], float]:
+        scale = 1.0 / lambd
+        return functools.partial(next, self._values(name, lambda u: -np.log1p(-u) * scale))
+
+    def triangular_sampler(self, name: str, low: float, high: float, mode: float) -> Callable[[], float]:
+        width = high - low
+        c = (mode - low) / width if width else 0.5
+
+        def transform(u):
+            return low + width * np.where(u < c, np.sqrt(u * c), 1.0 - np.sqrt((1.0 - u) * (1.0 - c)))
+
+        return functools.partial(next, self._values(name, transform))
+
+    def expovariate(self, name: str, lambd: float) -> float:
+        key = (name, "exp", lambd)
+        sampler = self._samplers.get(key)
+        if sampler is None:
+            sampler = self._samplers[key] = self.exponential_sampler(name, lambd)
+        return sampler()
+
+    def triangular(self, name: str, low: float, high: float, mode: float) -> float:
+        key = (name, low, high, mode)
+        sampler = self._samplers.get(key)
+        if sampler is None:
+            sampler = self._samplers[key] = self.triangular_sampler(name, low, high, mode)
+        return sampler()
+
+
+def make_streams(seed: int, block_size: int = 0) -> RandomStreams:
+    """Scalar ``random.Random`` streams, or NumPy-buffered ones when ``block_size`` > 0."""
+    if block_size > 0:
+        return BufferedVariates(seed, block_size=block_size)
+    return RandomStreams(seed)
+
+
+def rate_profile_knots(profile: Sequence[float], end: float) -> Tuple[List[float], List[float]]:
+    """Hour boundaries up to ``end`` minutes and the integral of ``profile`` at each.
+
+    The integral is in minutes at the base arrival rates, so the expected
+    arrivals of a type by a boundary are its rate times that value.
+    """
+    clock, offered = [0.0], [0.0]
+    while clock[-1] < end:
+        hour = len(clock) - 1
+        stop = min(60.0 * (hour + 1), end)
+        offered.append(offered[-1] + profile[hour % len(profile)] * (stop - clock[-1]))
+        clock.append(stop)
+    return clock, offered
+
+
+def offered_minutes(config: SimConfig) -> float:
+    """Horizon length at the base arrival rates (``hours * 60`` without a rate profile)."""
+    horizon = config.hours * 60.0
+    if not config.rate_profile:
+        return horizon
+    return rate_profile_knots(config.rate_profile, horizon)[1][-1]
+
+
+def check_rate_profile(profile: Sequence[float]) -> None:
+    if any(m < 0 for m in profile):
+        raise ValueError("rate_profile multipliers must be >= 0")
+    if profile and not any(m > 0 for m in profile):
+        raise ValueError("rate_profile needs at least one positive multiplier")
+
+
+class ProfiledSampler:
+    """Interarrival times of the non-homogeneous Poisson process with hourly multipliers ``profile``.
+
+    ``draw`` samples interarrival times at the base rate; each one is mapped
+    through the inverse of the cumulative rate (time change), walking the
+    piecewise-constant hours. Unlike thinning nothing is rejected, so a
+    profile of ones consumes and returns exactly the draws of ``draw``.
+    A class rather than a closure so that engine snapshots can copy it.
+    """
+
+    def __init__(self, draw: Callable[[], float], profile: Sequence[float]):
+        self.draw = draw
+        self.profile = tuple(profile)
+        self.now = 0.0
+
+    def __call__(self) -> float:
+        profile, hours = self.profile, len(self.profile)
+        start = t = self.now
+        need = self.draw()
+        while True:
+            hour = int(t // 60.0)
+            multiplier = profile[hour % hours]
+            end = 60.0 * (hour + 1)
+            room = (end - t) * multiplier
+            if need < room:
+                t += need / multiplier
+                break
+            need -= room
+            t = end
+        self.now = t
+        return t - start
+
+
+SERVICE_SPREAD = 0.3  # order and prep times are triangular on mean * (1 -/+ spread)
+PICKUP_SPREAD = 0.5
+
+
+class VariateSampler:
+    """Model distributions on top of ``self.rng``; shared by all simulation engines."""
+
+    rng: RandomStreams
+
+    def expovariate_minutes(self, rate_per_hour: float, stream: str = "arrivals") -> float:
         if rate_per_hour <= 0:
             return float("inf")
         rate_per_min = rate_per_hour / 60.0
-        return random.expovariate(rate_per_min)
+        return self.rng.expovariate(stream, rate_per_min)
 
-    def triangular_mean(self, mean: float, spread: float = 0.3) -> float:
+    def triangular_mean(self, mean: float, spread: float = 0.3, stream: str = "service") -> float:
         low = mean * (1 - spread)
         high = mean * (1 + spread)
-        return random.triangular(low, high, mean)
+        return self.rng.triangular(stream, low, high, mean)
 
     def patience_time(self, mean: float) -> float:
-        return random.expovariate(1.0 / mean)
+        return self.rng.expovariate("patience", 1.0 / mean)
+
+    def init_samplers(self) -> None:
+        """Bind zero-argument per-type samplers used by the engines' hot paths.
+
+        They draw from the same streams with the same parameters as the
+        methods above, so switching between them does not change results.
+        """
+        rng = self.rng
+        check_rate_profile(self.config.rate_profile)
+
+        def triangular(stream: str, mean: float, spread: float) -> Callable[[], float]:
+            return rng.triangular_sampler(stream, mean * (1 - spread), mean * (1 + spread), mean)
+
+        self.draw_interarrival: Dict[str, Callable[[], float]] = {}
+        self.draw_patience: Dict[str, Callable[[], float]] = {}
+        self.draw_order_time: Dict[str, Callable[[], float]] = {}
+        self.draw_prep_time: Dict[str, Callable[[], float]] = {}
+        for ct in self.customer_types:
+            if ct.arrival_rate_per_hour <= 0:
+                continue
+            self.draw_interarrival[ct.name] = rng.exponential_sampler(
+                f"arrivals.{ct.name}", ct.arrival_rate_per_hour / 60.0
+            )
+            if self.config.rate_profile:
+                self.draw_interarrival[ct.name] = ProfiledSampler(
+                    self.draw_interarrival[ct.name], self.config.rate_profile
+                )
+            self.draw_patience[ct.name] = rng.exponential_sampler("patience", 1.0 / ct.patience_mean)
+            self.draw_order_time[ct.name] = triangular("service", ct.order_time_mean, SERVICE_SPREAD)
+            self.draw_prep_time[ct.name] = triangular("service", ct.prep_time_mean, SERVICE_SPREAD)
+        self.draw_pickup_time = triangular("pickup", self.config.pickup_time_mean, PICKUP_SPREAD)
+
+        # Common random numbers: the k-th customer of a type gets the same
+        # patience, order, prep (before congestion) and pickup times whatever
+        # the staffing, because everything is drawn at arrival from per-type
+        # streams instead of in service-start order from shared ones.
+        self.draw_customer: Dict[str, Callable[[], Tuple[float, float, float, float]]] = {}
+        if not self.config.common_random_numbers:
+            return
+        for ct in self.customer_types:
+            if ct.arrival_rate_per_hour <= 0:
+                continue
+            name = ct.name
+            self.draw_patience[name] = rng.exponential_sampler(f"crn.{name}.patience", 1.0 / ct.patience_mean)
+            self.draw_order_time[name] = triangular(f"crn.{name}.order", ct.order_time_mean, SERVICE_SPREAD)
+            self.draw_prep_time[name] = triangular(f"crn.{name}.prep", ct.prep_time_mean, SERVICE_SPREAD)
+            self.draw_customer[name] = _CustomerSampler(
+                self.draw_patience[name],
+                self.draw_order_time[name],
+                self.draw_prep_time[name],
+                triangular(f"crn.{name}.pickup", self.config.pickup_time_mean, PICKUP_SPREAD),
+            )
+
+
+class _CustomerSampler:
+    """Draws ``(patience, order, prep, pickup)`` of one customer; picklable, unlike a closure."""
+
+    __slots__ = ("patience", "order", "prep", "pickup")
+
+    def __init__(self, *samplers: Callable[[], float]):
+        self.patience, self.order, self.prep, self.pickup = samplers
+
+    def __call__(self) -> Tuple[float, float, float, float]:
+        return self.patience(), self.order(), self.prep(), self.pickup()
+
+
+CONVERGENCE_CHECK_MINUTES = 15.0
+
+
+class CafeSimulation(VariateSampler):
+    def __init__(
+        self,
+        config: SimConfig,
+        customer_types: List[CustomerType],
+        seed: int = 42,
+        streams: RandomStreams = None,
+    ):
+        self.config = config
+        self.customer_types = customer_types
+        self.seed = seed
+        self.rng = streams if streams is not None else make_streams(seed, config.variate_block_size)
+        self.env = simpy.Environment()
+        self.metrics = Metrics(streaming=config.streaming_metrics)
+        self.warmup = warmup = stats_start(config)
+        stat_class = TimeWeightedStat
+        if records_history(config):
+            self.metrics.start_history()
+            stat_class = RecordingTimeWeightedStat
+        self.order_counter = ImpatientResource(
+            self.env, config.order_attendants, warmup, self._abandoned, stat_class
+        )
+        self.prep_area = MonitoredResource(self.env, config.baristas, warmup, stat_class)
+        self.pickup_counter = MonitoredResource(self.env, config.pickup_attendants, warmup, stat_class)
+        self.metrics.order_queue_length = self.order_counter.queue_stat
+        self.metrics.prep_queue_length = self.prep_area.queue_stat
+        self.metrics.pickup_queue_length = self.pickup_counter.queue_stat
+        self.metrics.order_busy_servers = self.order_counter.busy_stat
+        self.metrics.prep_busy_servers = self.prep_area.busy_stat
+        self.metrics.pickup_busy_servers = self.pickup_counter.busy_stat
+        self.init_samplers()
+
+    def _abandoned(self, deadline: float) -> None:
+        self.metrics.abandoned_customers += 1
+        if self.metrics.abandon_times is not None:
+            self.metrics.abandon_times.append(deadline)
 
     def arrival_process(self, cust_type: CustomerType):
         if cust_type.arrival_rate_per_hour <= 0:
             return
         i = 0
         while True:
-            interarrival = self.expovariate_minutes(cust_type.arrival_rate_per_hour)
+            interarrival = self.draw_interarrival[cust_type.name]()
             yield self.env.timeout(interarrival)
             i += 1
+            self.metrics.arrivals[cust_type.name] = i
             name = f"{cust_type.name}-{i}"
             self.env.process(self.customer_process(name, cust_type))
 
     def customer_process(self, name: str, cust_type: CustomerType):
         arrival_time = self.env.now
         self.metrics.total_customers += 1
+        if self.metrics.arrival_times is not None:
+            self.metrics.arrival_times.append(arrival_time)
+
+        crn = self.config.common_random_numbers
+        if crn:
+            patience, order_time, prep_base, pickup_time = self.draw_customer[cust_type.name]()
+        else:
+            patience = self.draw_patience[cust_type.name]()
 
         # Order queue with reneging
-        patience = self.patience_time(cust_type.patience_mean)
-        with self.order_counter.request() as req:
-            results = yield req | self.env.timeout(patience)
-            if req not in results:
-                self.metrics.abandoned_customers += 1
-                return
-            order_wait = self.env.now - arrival_time
-            order_time = self.triangular_mean(cust_type.order_time_mean)
-            yield self.env.timeout(order_time)
-            self.metrics.order_busy_time += order_time
+        granted = yield self.order_counter.request(patience)
+        if not granted:
+            return
+        order_wait = self.env.now - arrival_time
+        if not crn:
+            order_time = self.draw_order_time[cust_type.name]()
+        yield self.env.timeout(order_time)
+        self.metrics.order_busy_time += order_time
+        self.order_counter.release()
 
         # Preparation queue (state-dependent time)
         prep_arrival = self.env.now
@@ -113,7 +796,9 @@ class CafeSimulation:
             yield req_prep
             prep_wait = self.env.now - prep_arrival
             queue_factor = 1.0 + (len(self.prep_area.queue) * self.config.prep_queue_alpha)
-            prep_time = self.triangular_mean(cust_type.prep_time_mean) * queue_factor
+            if not crn:
+                prep_base = self.draw_prep_time[cust_type.name]()
+            prep_time = prep_base * queue_factor
             yield self.env.timeout(prep_time)
             self.metrics.prep_busy_time += prep_time
 
@@ -122,12 +807,15 @@ class CafeSimulation:
         with self.pickup_counter.request() as req_pickup:
             yield req_pickup
             pickup_wait = self.env.now - pickup_arrival
-            pickup_time = self.triangular_mean(self.config.pickup_time_mean, spread=0.5)
+            if not crn:
+                pickup_time = self.draw_pickup_time()
             yield self.env.timeout(pickup_time)
             self.metrics.pickup_busy_time += pickup_time
 
         depart_time = self.env.now
-        if depart_time >= self.config.warmup_hours * 60:
+        if depart_time >= self.warmup:
+            if self.metrics.departures is not None:
+                self.metrics.departures.append(depart_time)
             self.metrics.completed_customers += 1
             self.metrics.order_waits.append(order_wait)
             self.metrics.prep_waits.append(prep_wait)
@@ -135,27 +823,130 @@ class CafeSimulation:
             self.metrics.system_times.append(depart_time - arrival_time)
 
     def sampler(self):
+        # Optional fixed-interval snapshots; averages come from the time-weighted stats.
         while True:
             yield self.env.timeout(self.config.sample_interval)
-            if self.env.now >= self.config.warmup_hours * 60:
+            if self.env.now >= self.warmup:
                 self.metrics.order_queue_samples.append(len(self.order_counter.queue))
                 self.metrics.prep_queue_samples.append(len(self.prep_area.queue))
                 self.metrics.pickup_queue_samples.append(len(self.pickup_counter.queue))
 
+    def convergence_monitor(self):
+        """Ends the run at the horizon or at the first check where the steady state has converged."""
+        from steady_state import converged
+
+        horizon = self.config.hours * 60
+        while self.env.now < horizon:
+            yield self.env.timeout(min(CONVERGENCE_CHECK_MINUTES, horizon - self.env.now))
+            if converged(self.metrics, self.env.now, self.config.steady_state_precision):
+                return
+
     def run(self):
         for ct in self.customer_types:
             self.env.process(self.arrival_process(ct))
-        self.env.process(self.sampler())
-        self.env.run(until=self.config.hours * 60)
+        if self.config.sample_interval > 0:
+            self.env.process(self.sampler())
+        if self.config.steady_state_precision > 0:
+            self.env.run(until=self.env.process(self.convergence_monitor()))
+        else:
+            self.env.run(until=self.config.hours * 60)
+        self.order_counter.expire(self.env.now)
+        self.metrics.end_time = self.env.now
         return self.metrics
 
 
+def create_simulation(
+    config: SimConfig,
+    customer_types: List[CustomerType],
+    seed: int = 42,
+    streams: RandomStreams = None,
+):
+    """Build the simulation for ``config.engine``; both engines return ``Metrics`` from ``run``."""
+    if config.engine == "native":
+        from native_engine import NativeCafeSimulation
+
+        return NativeCafeSimulation(config, customer_types, seed=seed, streams=streams)
+    if config.engine == "vectorized":
+        raise ValueError("The vectorized engine runs replication batches; use replications.replicate")
+    if config.engine != "simpy":
+        raise ValueError(f"Unknown engine: {config.engine}")
+    return CafeSimulation(config, customer_types, seed=seed, streams=streams)
+
+
+def canonical_model(
+    config: SimConfig, customer_types: List[CustomerType]
+) -> Tuple[SimConfig, List[CustomerType]]:
+    """Equivalent model with parameters that cannot change any run reset to 0.
+
+    * Types with a zero arrival rate never draw anything, so their order,
+      prep and patience means are irrelevant.
+    * ``prep_queue_alpha`` only scales a prep time when someone is waiting
+      for a barista. A barista is busy for at most ``Pmax`` (largest prep
+      time) while each order attendant finishes at most
+      ``floor(Pmax / Omin) + 1`` orders in that span (``Omin`` = shortest
+      order time), so if ``order_attendants`` times that is within
+      ``baristas`` the prep queue is always empty.
+    * With ``warmup_detection`` the fixed ``warmup_hours`` is never used.
+    * A ``rate_profile`` of ones is the constant base rate.
+
+    Models with the same canonical form give identical results for a seed.
+    """
+    types = [
+        ct if ct.arrival_rate_per_hour > 0 else CustomerType(ct.name, 0.0, 0.0, 0.0, 0.0)
+        for ct in customer_types
+    ]
+    active = [ct for ct in types if ct.arrival_rate_per_hour > 0]
+    alpha_matters = False
+    if active and config.prep_queue_alpha != 0:
+        longest_prep = max(ct.prep_time_mean for ct in active) * (1 + SERVICE_SPREAD)
+        shortest_order = min(ct.order_time_mean for ct in active) * (1 - SERVICE_SPREAD)
+        if shortest_order <= 0:
+            alpha_matters = True
+        else:
+            per_attendant = math.floor(longest_prep / shortest_order) + 1
+            alpha_matters = config.order_attendants * per_attendant > config.baristas
+    if not alpha_matters:
+        config = replace(config, prep_queue_alpha=0.0)
+    if config.warmup_detection:
+        config = replace(config, warmup_hours=0.0)
+    if all(m == 1 for m in config.rate_profile):
+        config = replace(config, rate_profile=())
+    return config, types
+
+
 def summarize_metrics(metrics: Metrics, config: SimConfig) -> Dict[str, float]:
-    def safe_mean(values: List[float]) -> float:
-        return statistics.mean(values) if values else 0.0
+    def safe_mean(values: Series) -> float:
+        if isinstance(values, StreamingSeries):
+            return values.mean
+        return statistics.fmean(values) if values else 0.0
+
+    def quantile(values: Series, q: float) -> float:
+        if isinstance(values, StreamingSeries):
+            return values.quantile(q)
+        return percentile(values, q)
 
-    sim_time = (config.hours - config.warmup_hours) * 60.0
-    return {
+    def utilization(busy: TimeWeightedStat, busy_time: float, capacity: int, servers: TimeWeightedStat) -> float:
+        if servers is not None:
+            return busy.mean(end_time) / max(servers.mean(end_time), 1e-6)
+        if busy is not None:
+            return busy.mean(end_time) / max(capacity, 1)
+        return busy_time / max(sim_time * capacity, 1e-6)
+
+    def queue_mean(stat: TimeWeightedStat, samples: Series) -> float:
+        return stat.mean(end_time) if stat is not None else safe_mean(samples)
+
+    end_time = metrics.end_time or config.hours * 60.0
+    start = config.warmup_hours * 60.0
+    if metrics.departures is not None:
+        from steady_state import batch_means_summary, detect_warmup, truncated
+
+        if config.warmup_detection:
+            start = detect_warmup(metrics, end_time)
+        if config.batches > 0:
+            return batch_means_summary(metrics, config, start, end_time)
+        metrics = truncated(metrics, start)
+    sim_time = end_time - start
+    summary = {
         "completed_customers": metrics.completed_customers,
         "abandoned_customers": metrics.abandoned_customers,
         "abandonment_rate": metrics.abandoned_customers / max(metrics.total_customers, 1),
@@ -163,18 +954,38 @@ def summarize_metrics(metrics: Metrics, config: SimConfig) -> Dict[str, float]:
         "avg_prep_wait": safe_mean(metrics.prep_waits),
         "avg_pickup_wait": safe_mean(metrics.pickup_waits),
         "avg_system_time": safe_mean(metrics.system_times),
-        "order_utilization": metrics.order_busy_time / max(sim_time * config.order_attendants, 1e-6),
-        "prep_utilization": metrics.prep_busy_time / max(sim_time * config.baristas, 1e-6),
-        "pickup_utilization": metrics.pickup_busy_time / max(sim_time * config.pickup_attendants, 1e-6),
-        "avg_order_queue": safe_mean(metrics.order_queue_samples),
-        "avg_prep_queue": safe_mean(metrics.prep_queue_samples),
-        "avg_pickup_queue": safe_mean(metrics.pickup_queue_samples),
+        "order_utilization": utilization(
+            metrics.order_busy_servers, metrics.order_busy_time, config.order_attendants, metrics.order_servers
+        ),
+        "prep_utilization": utilization(
+            metrics.prep_busy_servers, metrics.prep_busy_time, config.baristas, metrics.prep_servers
+        ),
+        "pickup_utilization": utilization(
+            metrics.pickup_busy_servers, metrics.pickup_busy_time, config.pickup_attendants, metrics.pickup_servers
+        ),
+        "avg_order_queue": queue_mean(metrics.order_queue_length, metrics.order_queue_samples),
+        "avg_prep_queue": queue_mean(metrics.prep_queue_length, metrics.prep_queue_samples),
+        "avg_pickup_queue": queue_mean(metrics.pickup_queue_length, metrics.pickup_queue_samples),
     }
+    series = {
+        "order_wait": metrics.order_waits,
+        "prep_wait": metrics.prep_waits,
+        "pickup_wait": metrics.pickup_waits,
+        "system_time": metrics.system_times,
+    }
+    for name, values in series.items():
+        for q in REPORTED_QUANTILES:
+            summary[f"{name}_p{round(q * 100)}"] = quantile(values, q)
+    if metrics.departures is not None:
+        summary.update(zip(WARMUP_DETECTION_COLUMNS, (start, end_time)))
+    return summary
 
 
 def parse_args() -> argparse.Namespace:
     parser = argparse.ArgumentParser(description="Discrete Event Simulation for a small cafe")
-    parser.add_argument("--instance", type=str, default="", help="Path to instance JSON file")
+    parser.add_argument("--instance", type=str, default="",
+                        help="Path to instance JSON file, or instance name with --instance-store")
+    parser.add_argument("--instance-store", type=str, default="", help="SQLite instance store")
     parser.add_argument("--seed", type=int, default=42)
     parser.add_argument("--hours", type=float, default=4.0)
     parser.add_argument("--warmup", type=float, default=0.5)
@@ -182,6 +993,24 @@ def parse_args() -> argparse.Namespace:
     parser.add_argument("--baristas", type=int, default=2)
     parser.add_argument("--pickup-attendants", type=int, default=1)
     parser.add_argument("--prep-queue-alpha", type=float, default=0.10)
+    parser.add_argument("--streaming-metrics", action="store_true",
+                        help="Use constant-memory metric accumulators (P-square percentiles)")
+    parser.add_argument("--engine", choices=["simpy", "native"], default="simpy",
+                        help="Event engine: SimPy processes or the native heap-based engine")
+    parser.add_argument("--variate-block-size", type=int, default=0,
+                        help="Pre-generate random variates in NumPy blocks of this size (0 = off)")
+    parser.add_argument("--crn", action="store_true",
+                        help="Common random numbers: draw each customer's times at arrival from per-type streams")
+    parser.add_argument("--auto-warmup", action="store_true",
+                        help="Detect the warm-up per run (MSER-5) instead of using --warmup")
+    parser.add_argument("--steady-state-precision", type=float, default=0.0,
+                        help="With --auto-warmup: stop early once the mean system time has this relative "
+                             "CI half-width")
+    parser.add_argument("--batches", type=int, default=0,
+                        help="One long run (set --hours) summarized by batch means over this many batches")
+    parser.add_argument("--rate-profile", type=str, default="",
+                        help="Comma-separated hourly multipliers of the arrival rates (hour k of the run uses "
+                             "entry k, cycling), e.g. a whole day with --hours 12")
     parser.add_argument("--arrival-fast", type=float, default=20.0)
     parser.add_argument("--arrival-medium", type=float, default=12.0)
     parser.add_argument("--arrival-slow", type=float, default=6.0)
@@ -199,10 +1028,20 @@ def parse_args() -> argparse.Namespace:
 
 def main() -> None:
     args = parse_args()
-    if args.instance:
+    if args.instance and args.instance_store:
+        from instance_store import InstanceStore
+
+        with InstanceStore(args.instance_store) as store:
+            inst = store.get(args.instance)
+        if inst is None:
+            raise SystemExit(f"Instance {args.instance!r} not found in {args.instance_store}")
+    elif args.instance:
         import json
         with open(args.instance, "r", encoding="utf-8") as f:
             inst = json.load(f)
+    else:
+        inst = None
+    if inst is not None:
         args.hours = inst.get("hours", args.hours)
         args.warmup = inst.get("warmup_hours", args.warmup)
         staff = inst.get("staffing", {})
@@ -210,6 +1049,8 @@ def main() -> None:
         args.baristas = staff.get("baristas", args.baristas)
         args.pickup_attendants = staff.get("pickup_attendants", args.pickup_attendants)
         args.prep_queue_alpha = inst.get("prep_queue_alpha", args.prep_queue_alpha)
+        if inst.get("rate_profile"):
+            args.rate_profile = ",".join(str(m) for m in inst["rate_profile"])
         arrivals = inst.get("arrival_rates_per_hour", {})
         args.arrival_fast = arrivals.get("fast", args.arrival_fast)
         args.arrival_medium = arrivals.get("medium", args.arrival_medium)
@@ -233,13 +1074,21 @@ def main() -> None:
         baristas=args.baristas,
         pickup_attendants=args.pickup_attendants,
         prep_queue_alpha=args.prep_queue_alpha,
+        streaming_metrics=args.streaming_metrics,
+        engine=args.engine,
+        variate_block_size=args.variate_block_size,
+        common_random_numbers=args.crn,
+        warmup_detection=args.auto_warmup,
+        steady_state_precision=args.steady_state_precision,
+        batches=args.batches,
+        rate_profile=tuple(float(m) for m in args.rate_profile.split(",")) if args.rate_profile else (),
     )
     customer_types = [
         CustomerType("fast", args.arrival_fast, args.order_mean_fast, args.prep_mean_fast, args.patience_fast),
         CustomerType("medium", args.arrival_medium, args.order_mean_medium, args.prep_mean_medium, args.patience_medium),
         CustomerType("slow", args.arrival_slow, args.order_mean_slow, args.prep_mean_slow, args.patience_slow),
     ]
-    sim = CafeSimulation(config, customer_types, seed=args.seed)
+    sim = create_simulation(config, customer_types, seed=args.seed)
     metrics = sim.run()
     summary = summarize_metrics(metrics, config)
 
@@ -0,0 +1,106 @@
+import json
+import sqlite3
+from typing import Dict, Iterable, Iterator, List, Optional, Tuple
+
+TYPE_NAMES = ("fast", "medium", "slow")
+
+# Instance dict field -> per-type column prefix
+_PER_TYPE = (
+    ("arrival_rates_per_hour", "rate"),
+    ("order_time_mean", "order_mean"),
+    ("prep_time_mean", "prep_mean"),
+    ("patience_mean", "patience"),
+)
+_STAFFING = ("order_attendants", "baristas", "pickup_attendants")
+
+COLUMNS: List[Tuple[str, str]] = (
+    [("name", "TEXT PRIMARY KEY"), ("source", "TEXT"), ("peak_hour", "INTEGER")]
+    + [(f"{prefix}_{t}", "REAL") for _, prefix in _PER_TYPE for t in TYPE_NAMES]
+    + [(field, "INTEGER") for field in _STAFFING]
+    + [("prep_queue_alpha", "REAL"), ("hours", "REAL"), ("warmup_hours", "REAL")]
+    + [("open_hour", "INTEGER"), ("rate_profile", "TEXT")]  # day instances; the profile is a JSON list
+)
+_NAMES = [name for name, _ in COLUMNS]
+
+
+def _to_row(inst: Dict) -> Tuple:
+    values = [inst["name"], inst.get("source", ""), inst.get("peak_hour")]
+    for field, _ in _PER_TYPE:
+        values.extend(inst.get(field, {}).get(t) for t in TYPE_NAMES)
+    values.extend(inst.get("staffing", {}).get(field) for field in _STAFFING)
+    values.extend([inst.get("prep_queue_alpha"), inst.get("hours"), inst.get("warmup_hours")])
+    profile = inst.get("rate_profile")
+    values.extend([inst.get("open_hour"), json.dumps(profile) if profile else None])
+    return tuple(values)
+
+
+def _from_row(row: Tuple) -> Dict:
+    """Rebuild the instance dict in the same shape as the JSON files."""
+    values = dict(zip(_NAMES, row))
+    inst = {"name": values["name"], "source": values["source"], "peak_hour": values["peak_hour"]}
+    for field, prefix in _PER_TYPE:
+        inst[field] = {t: values[f"{prefix}_{t}"] for t in TYPE_NAMES if values[f"{prefix}_{t}"] is not None}
+    inst["staffing"] = {field: values[field] for field in _STAFFING if values[field] is not None}
+    for field in ("prep_queue_alpha", "hours", "warmup_hours"):
+        if values[field] is not None:
+            inst[field] = values[field]
+    if values["rate_profile"] is not None:
+        inst["open_hour"] = values["open_hour"]
+        inst["rate_profile"] = json.loads(values["rate_profile"])
+    return inst
+
+
+class InstanceStore:
+    """All scenarios in one SQLite table, one typed row per instance.
+
+    Rows come back as the same dicts the per-instance JSON files hold, so
+    ``build_model`` and friends work unchanged. Iteration streams from a
+    cursor and ``get`` looks a scenario up by name through the primary key.
+    """
+
+    def __init__(self, path: str):
+        self.path = path
+        self.conn = sqlite3.connect(path)
+        columns = ", ".join(f"{name} {sqltype}" for name, sqltype in COLUMNS)
+        self.conn.execute(f"CREATE TABLE IF NOT EXISTS instances ({columns})")
+        existing = {row[1] for row in self.conn.execute("PRAGMA table_info(instances)")}
+        for name, sqltype in COLUMNS:
+            if name not in existing:  # stores written before the column existed
+                self.conn.execute(f"ALTER TABLE instances ADD COLUMN {name} {sqltype}")
+
+    def write(self, instances: Iterable[Dict], replace: bool = True) -> int:
+        """Insert ``instances`` (replacing the whole table by default); return the row count written."""
+        placeholders = ", ".join("?" for _ in COLUMNS)
+        with self.conn:
+            if replace:
+                self.conn.execute("DELETE FROM instances")
+            cursor = self.conn.executemany(
+                f"INSERT OR REPLACE INTO instances VALUES ({placeholders})",
+                (_to_row(inst) for inst in instances),
+            )
+        return cursor.rowcount
+
+    def names(self) -> List[str]:
+        return [row[0] for row in self.conn.execute("SELECT name FROM instances ORDER BY name")]
+
+    def get(self, name: str) -> Optional[Dict]:
+        row = self.conn.execute(
+            f"SELECT {', '.join(_NAMES)} FROM instances WHERE name = ?", (name,)
+        ).fetchone()
+        return _from_row(row) if row is not None else None
+
+    def __iter__(self) -> Iterator[Dict]:
+        for row in self.conn.execute(f"SELECT {', '.join(_NAMES)} FROM instances ORDER BY name"):
+            yield _from_row(row)
+
+    def __len__(self) -> int:
+        return self.conn.execute("SELECT COUNT(*) FROM instances").fetchone()[0]
+
+    def close(self) -> None:
+        self.conn.close()
+
+    def __enter__(self) -> "InstanceStore":
+        return self
+
+    def __exit__(self, *exc) -> None:
+        self.close()
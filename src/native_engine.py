@@ -0,0 +1,413 @@
+import pickle
+from collections import deque
+from dataclasses import dataclass, replace
+from heapq import heappop, heappush
+from typing import Dict, List
+
+from cafe_sim import (
+    CONVERGENCE_CHECK_MINUTES,
+    CustomerType,
+    Metrics,
+    RandomStreams,
+    RecordingTimeWeightedStat,
+    SimConfig,
+    TimeWeightedStat,
+    VariateSampler,
+    make_streams,
+    records_history,
+    stats_start,
+)
+
+# Event kinds in the calendar
+ARRIVAL = 0
+ABANDON = 1
+ORDER_DONE = 2
+PREP_DONE = 3
+PICKUP_DONE = 4
+
+# Customer states
+FREE = 0
+WAIT_ORDER = 1
+IN_SYSTEM = 2
+
+
+class NativeCafeSimulation(VariateSampler):
+    """Purpose-built engine for the order -> prep -> pickup tandem queue with reneging.
+
+    Events live in a binary heap of ``(time, seq, kind, ref)`` tuples and
+    customers are integer slots in flat per-customer arrays that are recycled
+    on departure, so there are no generator processes or SimPy event objects.
+    Draws use the same named streams and the same order as ``CafeSimulation``,
+    and ``run`` returns the same ``Metrics`` for ``summarize_metrics``.
+    """
+
+    def __init__(
+        self,
+        config: SimConfig,
+        customer_types: List[CustomerType],
+        seed: int = 42,
+        streams: RandomStreams = None,
+    ):
+        self.config = config
+        self.customer_types = customer_types
+        self.seed = seed
+        self.rng = streams if streams is not None else make_streams(seed, config.variate_block_size)
+        self.metrics = Metrics(streaming=config.streaming_metrics)
+        self.now = 0.0
+        self.events_processed = 0
+        self._calendar = []
+        self._seq = 0
+        self._started = False
+        self._stopped = False  # the steady-state precision was reached before the horizon
+        self._next_check = CONVERGENCE_CHECK_MINUTES
+        self.init_samplers()
+        self._interarrival = [self.draw_interarrival.get(ct.name) for ct in customer_types]
+        self._patience = [self.draw_patience.get(ct.name) for ct in customer_types]
+        self._order_time = [self.draw_order_time.get(ct.name) for ct in customer_types]
+        self._prep_time = [self.draw_prep_time.get(ct.name) for ct in customer_types]
+        self._crn = config.common_random_numbers
+        self._customer = [self.draw_customer.get(ct.name) for ct in customer_types]
+        self._arrivals = [0] * len(customer_types)
+
+        # Per-customer arrays indexed by slot
+        self._state: List[int] = []
+        self._type: List[int] = []
+        self._arrival: List[float] = []
+        self._ticket: List[int] = []
+        self._order_wait: List[float] = []
+        self._prep_wait: List[float] = []
+        self._stage_arrival: List[float] = []
+        self._service: List[float] = []
+        self._drawn: List[tuple] = []  # (order, prep base, pickup) times drawn at arrival in CRN mode
+        self._free_slots: List[int] = []
+
+        # Stations: busy server counts and FIFO queues
+        self._order_busy = 0
+        self._prep_busy = 0
+        self._pickup_busy = 0
+        self._order_queue = deque()  # (slot, ticket); abandoned entries are skipped lazily
+        self._order_waiting = 0
+        self._prep_queue = deque()
+        self._pickup_queue = deque()
+
+        self.warmup = warmup = stats_start(config)
+        m = self.metrics
+        stat_class = TimeWeightedStat
+        if records_history(config):
+            m.start_history()
+            stat_class = RecordingTimeWeightedStat
+        m.order_queue_length = stat_class(warmup)
+        m.prep_queue_length = stat_class(warmup)
+        m.pickup_queue_length = stat_class(warmup)
+        m.order_busy_servers = stat_class(warmup)
+        m.prep_busy_servers = stat_class(warmup)
+        m.pickup_busy_servers = stat_class(warmup)
+
+    def _schedule(self, delay: float, kind: int, ref: int) -> int:
+        self._seq += 1
+        heappush(self._calendar, (self.now + delay, self._seq, kind, ref))
+        return self._seq
+
+    def _new_customer(self, type_index: int) -> int:
+        if self._free_slots:
+            slot = self._free_slots.pop()
+            self._type[slot] = type_index
+            self._arrival[slot] = self.now
+            return slot
+        self._state.append(FREE)
+        self._type.append(type_index)
+        self._arrival.append(self.now)
+        self._ticket.append(0)
+        self._order_wait.append(0.0)
+        self._prep_wait.append(0.0)
+        self._stage_arrival.append(0.0)
+        self._service.append(0.0)
+        self._drawn.append(())
+        return len(self._state) - 1
+
+    def _release_customer(self, slot: int) -> None:
+        self._state[slot] = FREE
+        self._free_slots.append(slot)
+
+    # Order stage (with reneging)
+
+    def _arrive(self, type_index: int) -> None:
+        self._schedule(self._interarrival[type_index](), ARRIVAL, type_index)
+        self.metrics.total_customers += 1
+        if self.metrics.arrival_times is not None:
+            self.metrics.arrival_times.append(self.now)
+        self._arrivals[type_index] += 1
+        slot = self._new_customer(type_index)
+        self._state[slot] = IN_SYSTEM
+        if self._crn:
+            patience, order_time, prep_base, pickup_time = self._customer[type_index]()
+            self._drawn[slot] = (order_time, prep_base, pickup_time)
+        else:
+            patience = self._patience[type_index]()
+        if self._order_busy < self.config.order_attendants and not self._order_waiting:
+            self._start_order(slot)
+            return
+        ticket = self._schedule(patience, ABANDON, slot)
+        self._ticket[slot] = ticket
+        self._state[slot] = WAIT_ORDER
+        self._order_queue.append((slot, ticket))
+        self._order_waiting += 1
+        self.metrics.order_queue_length.update(self.now, self._order_waiting)
+
+    def _abandon(self, slot: int, seq: int) -> None:
+        if self._state[slot] != WAIT_ORDER or self._ticket[slot] != seq:
+            return
+        self.metrics.abandoned_customers += 1
+        if self.metrics.abandon_times is not None:
+            self.metrics.abandon_times.append(self.now)
+        self._order_waiting -= 1
+        self.metrics.order_queue_length.update(self.now, self._order_waiting)
+        self._release_customer(slot)
+
+    def _start_order(self, slot: int) -> None:
+        self._state[slot] = IN_SYSTEM
+        self._order_wait[slot] = self.now - self._arrival[slot]
+        self._order_busy += 1
+        self.metrics.order_busy_servers.update(self.now, self._order_busy)
+        order_time = self._drawn[slot][0] if self._crn else self._order_time[self._type[slot]]()
+        self._service[slot] = order_time
+        self._schedule(order_time, ORDER_DONE, slot)
+
+    def _next_order(self) -> None:
+        queue = self._order_queue
+        while queue:
+            slot, ticket = queue.popleft()
+            if self._state[slot] == WAIT_ORDER and self._ticket[slot] == ticket:
+                self._order_waiting -= 1
+                self.metrics.order_queue_length.update(self.now, self._order_waiting)
+                self._start_order(slot)
+                return
+
+    def _order_done(self, slot: int) -> None:
+        self.metrics.order_busy_time += self._service[slot]
+        self._order_busy -= 1
+        self.metrics.order_busy_servers.update(self.now, self._order_busy)
+        if self._order_busy >= self.config.order_attendants:  # a server removed by a fork leaves
+            self.metrics.order_servers.update(self.now, self._order_busy)
+        if self._order_waiting and self._order_busy < self.config.order_attendants:
+            self._next_order()
+        self._stage_arrival[slot] = self.now
+        if self._prep_busy < self.config.baristas and not self._prep_queue:
+            self._start_prep(slot)
+        else:
+            self._prep_queue.append(slot)
+            self.metrics.prep_queue_length.update(self.now, len(self._prep_queue))
+
+    # Preparation stage (state-dependent service time)
+
+    def _start_prep(self, slot: int) -> None:
+        self._prep_wait[slot] = self.now - self._stage_arrival[slot]
+        self._prep_busy += 1
+        self.metrics.prep_busy_servers.update(self.now, self._prep_busy)
+        queue_factor = 1.0 + (len(self._prep_queue) * self.config.prep_queue_alpha)
+        prep_base = self._drawn[slot][1] if self._crn else self._prep_time[self._type[slot]]()
+        prep_time = prep_base * queue_factor
+        self._service[slot] = prep_time
+        self._schedule(prep_time, PREP_DONE, slot)
+
+    def _prep_done(self, slot: int) -> None:
+        self.metrics.prep_busy_time += self._service[slot]
+        self._prep_busy -= 1
+        self.metrics.prep_busy_servers.update(self.now, self._prep_busy)
+        if self._prep_busy >= self.config.baristas:
+            self.metrics.prep_servers.update(self.now, self._prep_busy)
+        self._stage_arrival[slot] = self.now
+        if self._pickup_busy < self.config.pickup_attendants and not self._pickup_queue:
+            self._start_pickup(slot)
+        else:
+            self._pickup_queue.append(slot)
+            self.metrics.pickup_queue_length.update(self.now, len(self._pickup_queue))
+        if self._prep_queue and self._prep_busy < self.config.baristas:
+            next_slot = self._prep_queue.popleft()
+            self.metrics.prep_queue_length.update(self.now, len(self._prep_queue))
+            self._start_prep(next_slot)
+
+    # Pickup stage
+
+    def _start_pickup(self, slot: int) -> None:
+        self._pickup_busy += 1
+        self.metrics.pickup_busy_servers.update(self.now, self._pickup_busy)
+        pickup_time = self._drawn[slot][2] if self._crn else self.draw_pickup_time()
+        self._service[slot] = pickup_time
+        # Pickup wait is only needed at departure; keep it in the stage-arrival slot.
+        self._stage_arrival[slot] = self.now - self._stage_arrival[slot]
+        self._schedule(pickup_time, PICKUP_DONE, slot)
+
+    def _pickup_done(self, slot: int) -> None:
+        m = self.metrics
+        m.pickup_busy_time += self._service[slot]
+        self._pickup_busy -= 1
+        m.pickup_busy_servers.update(self.now, self._pickup_busy)
+        if self._pickup_busy >= self.config.pickup_attendants:
+            m.pickup_servers.update(self.now, self._pickup_busy)
+        if self.now >= self.warmup:
+            if m.departures is not None:
+                m.departures.append(self.now)
+            m.completed_customers += 1
+            m.order_waits.append(self._order_wait[slot])
+            m.prep_waits.append(self._prep_wait[slot])
+            m.pickup_waits.append(self._stage_arrival[slot])
+            m.system_times.append(self.now - self._arrival[slot])
+        self._release_customer(slot)
+        if self._pickup_queue and self._pickup_busy < self.config.pickup_attendants:
+            next_slot = self._pickup_queue.popleft()
+            m.pickup_queue_length.update(self.now, len(self._pickup_queue))
+            self._start_pickup(next_slot)
+
+    def _start(self) -> None:
+        if self._started:
+            return
+        self._started = True
+        for index, draw in enumerate(self._interarrival):
+            if draw is not None:
+                self._schedule(draw(), ARRIVAL, index)
+
+    def _process(self, until: float) -> None:
+        """Process the events before ``until`` (earlier if the run converges) and move the clock there."""
+        from steady_state import converged
+
+        calendar = self._calendar
+        arrive, abandon = self._arrive, self._abandon
+        order_done, prep_done, pickup_done = self._order_done, self._prep_done, self._pickup_done
+        processed = 0
+        precision = self.config.steady_state_precision
+        next_check = self._next_check if precision > 0 else float("inf")
+        while calendar and calendar[0][0] < until:
+            if calendar[0][0] >= next_check:
+                self.now = next_check
+                if converged(self.metrics, next_check, precision):
+                    until = next_check
+                    self._stopped = True
+                    break
+                next_check += CONVERGENCE_CHECK_MINUTES
+                continue
+            time, seq, kind, ref = heappop(calendar)
+            self.now = time
+            processed += 1
+            if kind == ARRIVAL:
+                arrive(ref)
+            elif kind == ABANDON:
+                abandon(ref, seq)
+            elif kind == ORDER_DONE:
+                order_done(ref)
+            elif kind == PREP_DONE:
+                prep_done(ref)
+            else:
+                pickup_done(ref)
+        self._next_check = next_check
+        self.events_processed += processed
+        self.now = until
+
+    def advance(self, until: float) -> None:
+        """Simulate up to ``until`` minutes (at most the horizon) without ending the run."""
+        self._start()
+        if not self._stopped:
+            self._process(min(until, self.config.hours * 60))
+
+    def run(self) -> Metrics:
+        self._start()
+        if not self._stopped:
+            self._process(self.config.hours * 60)
+        until = self.now
+        self.metrics.end_time = until
+        self.metrics.arrivals = {
+            ct.name: count for ct, count in zip(self.customer_types, self._arrivals) if count
+        }
+        return self.metrics
+
+    def snapshot(self) -> "Snapshot":
+        """Freeze the current state (calendar, queues, customers in service, streams and metrics).
+
+        Needs scalar streams: the NumPy-buffered variates of
+        ``variate_block_size`` live in generators, which cannot be copied.
+        """
+        if self.config.variate_block_size > 0:
+            raise ValueError("Snapshots need variate_block_size=0")
+        return Snapshot(self.now, pickle.dumps(self, pickle.HIGHEST_PROTOCOL))
+
+    def _record_capacity(self, previous: SimConfig) -> None:
+        """Track server counts over time for stations whose capacity differs from ``previous``.
+
+        A removed server stays until its customer is done, so a station has
+        ``max(capacity, busy)`` servers while it drains.
+        """
+        stat_class = RecordingTimeWeightedStat if records_history(self.config) else TimeWeightedStat
+        for field, stat_name, busy_name in CAPACITY_FIELDS:
+            before, after = getattr(previous, field), getattr(self.config, field)
+            if before == after:
+                continue
+            stat = getattr(self.metrics, stat_name)
+            if stat is None:
+                stat = stat_class(self.warmup)
+                stat.update(0.0, before)
+                setattr(self.metrics, stat_name, stat)
+            stat.update(self.now, max(after, getattr(self, busy_name)))
+
+    def _fill_servers(self) -> None:
+        """Start waiting customers on servers added by a capacity change."""
+        while self._order_waiting and self._order_busy < self.config.order_attendants:
+            self._next_order()
+        while self._prep_queue and self._prep_busy < self.config.baristas:
+            slot = self._prep_queue.popleft()
+            self.metrics.prep_queue_length.update(self.now, len(self._prep_queue))
+            self._start_prep(slot)
+        while self._pickup_queue and self._pickup_busy < self.config.pickup_attendants:
+            slot = self._pickup_queue.popleft()
+            self.metrics.pickup_queue_length.update(self.now, len(self._pickup_queue))
+            self._start_pickup(slot)
+
+    def queue_state(self) -> Dict[str, int]:
+        """Customers waiting and in service at each station right now."""
+        return {
+            "order_queue": self._order_waiting,
+            "order_busy": self._order_busy,
+            "prep_queue": len(self._prep_queue),
+            "prep_busy": self._prep_busy,
+            "pickup_queue": len(self._pickup_queue),
+            "pickup_busy": self._pickup_busy,
+        }
+
+
+FORKABLE = ("order_attendants", "baristas", "pickup_attendants", "prep_queue_alpha")
+CAPACITY_FIELDS = (  # (config field, Metrics server-count stat, busy counter)
+    ("order_attendants", "order_servers", "_order_busy"),
+    ("baristas", "prep_servers", "_prep_busy"),
+    ("pickup_attendants", "pickup_servers", "_pickup_busy"),
+)
+
+
+@dataclass
+class Snapshot:
+    """A ``NativeCafeSimulation`` frozen at ``time`` minutes, as pickled bytes.
+
+    Every ``fork`` continues from the same state, including the random
+    streams, so forks see the same future arrivals and (with common random
+    numbers) the same customers. The bytes are cheap to send to worker
+    processes.
+    """
+
+    time: float
+    state: bytes
+
+    def fork(self, **changes) -> NativeCafeSimulation:
+        """Independent copy of the simulation with ``changes`` to the ``FORKABLE`` fields applied now.
+
+        Added servers start on waiting customers immediately; with fewer,
+        customers in service finish and nobody new starts until a server is
+        free under the new capacity. Utilizations are taken over the server
+        count integrated in time, so they cover the whole run.
+        """
+        unknown = set(changes) - set(FORKABLE)
+        if unknown:
+            raise ValueError(f"Cannot change {', '.join(sorted(unknown))} in a fork")
+        sim = pickle.loads(self.state)
+        if changes:
+            previous, sim.config = sim.config, replace(sim.config, **changes)
+            sim._record_capacity(previous)
+            sim._fill_servers()
+        return sim
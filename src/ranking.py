@@ -0,0 +1,99 @@
+from heapq import heappush, heapreplace
+from typing import Callable, Dict, Hashable, Iterable, List, Sequence, Tuple, Union
+
+# Lower is better. Weights emphasize abandonment and system time.
+DEFAULT_WEIGHTS: Dict[str, float] = {
+    "abandonment_rate": 100.0,
+    "avg_system_time": 2.0,
+    "avg_order_wait": 1.0,
+    "avg_prep_wait": 1.0,
+    "avg_pickup_wait": 0.5,
+}
+
+GROUPINGS: Dict[str, Tuple[str, ...]] = {
+    "source": ("source",),
+    "staffing": ("order_attendants", "baristas", "pickup_attendants"),
+    "alpha": ("prep_queue_alpha",),
+}
+
+
+def score(row: Dict, weights: Dict[str, float] = None) -> float:
+    """Weighted sum of the row's metrics; missing or empty values count as 0."""
+    total = 0.0
+    for metric, weight in (weights or DEFAULT_WEIGHTS).items():
+        value = row.get(metric)
+        total += (0.0 if value is None or value == "" else float(value)) * weight
+    return total
+
+
+def parse_weights(text: str) -> Dict[str, float]:
+    """``"metric=weight,..."`` to a weights dict (empty text -> ``DEFAULT_WEIGHTS``)."""
+    if not text:
+        return dict(DEFAULT_WEIGHTS)
+    weights = {}
+    for item in text.split(","):
+        metric, _, weight = item.partition("=")
+        weights[metric.strip()] = float(weight)
+    return weights
+
+
+class TopK:
+    """The ``k`` lowest-scoring rows seen so far, kept in a bounded heap.
+
+    The heap holds ``(-score, -index, row)`` so its root is the current worst
+    entry; a new row only gets in if it beats that one. Ties go to the earlier
+    row, so ``result`` matches ``sorted(rows, key=score)[:k]``.
+    """
+
+    def __init__(self, k: int, weights: Dict[str, float] = None):
+        self.k = k
+        self.weights = weights or DEFAULT_WEIGHTS
+        self._heap: List[Tuple[float, int, Dict]] = []
+        self._seen = 0
+
+    def push(self, row: Dict) -> None:
+        entry = (-score(row, self.weights), -self._seen, row)
+        self._seen += 1
+        if len(self._heap) < self.k:
+            heappush(self._heap, entry)
+        elif self.k > 0 and entry[:2] > self._heap[0][:2]:
+            heapreplace(self._heap, entry)
+
+    def result(self) -> List[Dict]:
+        return [row for _, _, row in sorted(self._heap, key=lambda e: (-e[0], -e[1]))]
+
+
+GroupKey = Union[Sequence[str], Callable[[Dict], Hashable]]
+
+
+def top_k(rows: Iterable[Dict], k: int = 10, weights: Dict[str, float] = None) -> List[Dict]:
+    """Best ``k`` rows of a stream, best first."""
+    best = TopK(k, weights)
+    for row in rows:
+        best.push(row)
+    return best.result()
+
+
+def top_k_by_group(
+    rows: Iterable[Dict], group_by: GroupKey, k: int = 10, weights: Dict[str, float] = None
+) -> Dict[Hashable, List[Dict]]:
+    """Best ``k`` rows per group, groups in order of first appearance.
+
+    ``group_by`` is a sequence of column names (see ``GROUPINGS``) or a
+    function of the row.
+    """
+    if callable(group_by):
+        key = group_by
+    else:
+        columns = tuple(group_by)
+
+        def key(row: Dict) -> Hashable:
+            return tuple(row.get(c) for c in columns)
+
+    groups: Dict[Hashable, TopK] = {}
+    for row in rows:
+        group = key(row)
+        if group not in groups:
+            groups[group] = TopK(k, weights)
+        groups[group].push(row)
+    return {group: best.result() for group, best in groups.items()}
@@ -0,0 +1,413 @@
+import math
+import statistics
+from dataclasses import asdict, dataclass, field
+from typing import Callable, Dict, List, Optional, Sequence, Tuple
+
+from cafe_sim import (
+    CustomerType,
+    RandomStreams,
+    SimConfig,
+    create_simulation,
+    make_streams,
+    offered_minutes,
+    summarize_metrics,
+)
+from result_cache import ResultCache, model_key
+
+
+def t_quantile(p: float, df: int) -> float:
+    """Quantile of Student's t distribution (exact for df <= 2, series expansion above)."""
+    if df < 1:
+        raise ValueError("df must be >= 1")
+    if df == 1:
+        return math.tan(math.pi * (p - 0.5))
+    if df == 2:
+        return (2 * p - 1) / math.sqrt(2 * p * (1 - p))
+    z = statistics.NormalDist().inv_cdf(p)
+    g1 = (z ** 3 + z) / 4
+    g2 = (5 * z ** 5 + 16 * z ** 3 + 3 * z) / 96
+    g3 = (3 * z ** 7 + 19 * z ** 5 + 17 * z ** 3 - 15 * z) / 384
+    g4 = (79 * z ** 9 + 776 * z ** 7 + 1482 * z ** 5 - 1920 * z ** 3 - 945 * z) / 92160
+    return z + g1 / df + g2 / df ** 2 + g3 / df ** 3 + g4 / df ** 4
+
+
+def confidence_interval(values: Sequence[float], confidence: float = 0.95) -> Tuple[float, float, float]:
+    """Return (mean, sample standard deviation, CI half-width)."""
+    n = len(values)
+    if n == 0:
+        return 0.0, 0.0, 0.0
+    mean = statistics.fmean(values)
+    if n == 1:
+        return mean, 0.0, float("inf")
+    std = statistics.stdev(values)
+    half_width = t_quantile(0.5 + confidence / 2, n - 1) * std / math.sqrt(n)
+    return mean, std, half_width
+
+
+def paired_difference(
+    baseline: Sequence[float], alternative: Sequence[float], confidence: float = 0.95
+) -> Tuple[float, float, float]:
+    """CI of ``alternative - baseline`` from paired replications (mean, std, half-width).
+
+    Replication ``i`` of both systems must share random numbers (same seed and
+    index with ``common_random_numbers``), so the pairing cancels shared noise.
+    """
+    return confidence_interval([b - a for a, b in zip(baseline, alternative)], confidence)
+
+
+def unpaired_half_width(
+    baseline: Sequence[float], alternative: Sequence[float], confidence: float = 0.95
+) -> float:
+    """Welch CI half-width for the difference of means of independent samples."""
+    n1, n2 = len(baseline), len(alternative)
+    if n1 < 2 or n2 < 2:
+        return float("inf")
+    v1 = statistics.variance(baseline) / n1
+    v2 = statistics.variance(alternative) / n2
+    if v1 + v2 == 0:
+        return 0.0
+    df = (v1 + v2) ** 2 / (v1 ** 2 / (n1 - 1) + v2 ** 2 / (n2 - 1))
+    return t_quantile(0.5 + confidence / 2, max(int(df), 1)) * math.sqrt(v1 + v2)
+
+
+@dataclass
+class ReplicationPlan:
+    """How many replications to run per instance.
+
+    With ``target_half_width`` or ``relative_precision`` set, replications are
+    added one at a time (starting from ``replications``) until the CI
+    half-width of every metric in ``metrics`` meets the target or
+    ``max_replications`` is reached.
+
+    ``antithetic`` runs replications in pairs, the second of each pair on
+    mirrored uniforms, and treats each pair's average as one observation.
+    ``control_variates`` adjusts the estimates of ``metrics`` by regression on
+    the realized arrival counts per type, whose expectations are known.
+    """
+
+    replications: int = 1
+    max_replications: int = 100
+    target_half_width: float = 0.0
+    relative_precision: float = 0.0
+    metrics: Tuple[str, ...] = ("avg_system_time", "abandonment_rate")
+    confidence: float = 0.95
+    antithetic: bool = False
+    control_variates: bool = False
+
+    @property
+    def sequential(self) -> bool:
+        return self.target_half_width > 0 or self.relative_precision > 0
+
+    @property
+    def reduces_variance(self) -> bool:
+        return self.antithetic or self.control_variates
+
+    def is_precise(self, mean: float, half_width: float) -> bool:
+        if self.target_half_width > 0 and half_width <= self.target_half_width:
+            return True
+        if self.relative_precision > 0 and half_width <= self.relative_precision * abs(mean):
+            return True
+        return False
+
+
+def _solve(matrix: List[List[float]], vector: List[float]) -> Optional[List[float]]:
+    """Solve a small linear system by Gaussian elimination (None if singular)."""
+    n = len(vector)
+    a = [row[:] + [vector[i]] for i, row in enumerate(matrix)]
+    for col in range(n):
+        pivot = max(range(col, n), key=lambda r: abs(a[r][col]))
+        if abs(a[pivot][col]) < 1e-12:
+            return None
+        a[col], a[pivot] = a[pivot], a[col]
+        for r in range(n):
+            if r != col:
+                factor = a[r][col] / a[col][col]
+                for c in range(col, n + 1):
+                    a[r][c] -= factor * a[col][c]
+    return [a[i][n] / a[i][i] for i in range(n)]
+
+
+@dataclass
+class ReplicationResult:
+    """Per-replication summaries and the interval estimates built from them.
+
+    With ``paired`` (antithetic replications), runs ``2i`` and ``2i + 1`` are
+    averaged into one observation. ``controls`` maps control columns of the
+    samples to their known expectations; the metrics in ``adjusted`` are then
+    estimated with the regression (control-variate) estimator.
+    """
+
+    confidence: float
+    samples: Dict[str, List[float]] = field(default_factory=dict)
+    paired: bool = False
+    controls: Dict[str, float] = field(default_factory=dict)
+    adjusted: Tuple[str, ...] = ()
+
+    @property
+    def replications(self) -> int:
+        return len(next(iter(self.samples.values()), []))
+
+    def add(self, summary: Dict[str, float]) -> None:
+        for key, value in summary.items():
+            self.samples.setdefault(key, []).append(float(value))
+
+    def observations(self, metric: str) -> List[float]:
+        values = self.samples[metric]
+        if not self.paired:
+            return values
+        return [(values[i] + values[i + 1]) / 2 for i in range(0, len(values) - 1, 2)]
+
+    def _estimate(self, metric: str) -> Tuple[float, float, float, float]:
+        """(mean, std, CI half-width, variance of the mean) of ``metric``."""
+        y = self.observations(metric)
+        if metric in self.adjusted and self.controls:
+            estimate = self._controlled(y)
+            if estimate is not None:
+                return estimate
+        mean, std, half_width = confidence_interval(y, self.confidence)
+        return mean, std, half_width, std ** 2 / len(y) if y else 0.0
+
+    def _controlled(self, y: List[float]) -> Optional[Tuple[float, float, float, float]]:
+        n = len(y)
+        columns = [(self.observations(name), mu) for name, mu in self.controls.items()]
+        columns = [(c, mu) for c, mu in columns if len(c) == n and n > 1 and statistics.variance(c) > 0]
+        q = len(columns)
+        if q == 0 or n - q - 1 < 1:
+            return None
+        y_mean = statistics.fmean(y)
+        c_means = [statistics.fmean(c) for c, _ in columns]
+        dev = [[c[j] - m for (c, _), m in zip(columns, c_means)] for j in range(n)]
+        y_dev = [v - y_mean for v in y]
+        sxx = [[sum(d[a] * d[b] for d in dev) for b in range(q)] for a in range(q)]
+        sxy = [sum(d[a] * yd for d, yd in zip(dev, y_dev)) for a in range(q)]
+        beta = _solve(sxx, sxy)
+        if beta is None:
+            return None
+        offset = [m - mu for m, (_, mu) in zip(c_means, columns)]
+        mean = y_mean - sum(b * o for b, o in zip(beta, offset))
+        residual = sum((yd - sum(b * x for b, x in zip(beta, d))) ** 2 for d, yd in zip(dev, y_dev))
+        s2 = residual / (n - q - 1)
+        # Var(mean) = s^2 (1/n + d' Sxx^-1 d) with d the controls' offset from their expectations
+        leverage = _solve(sxx, offset)
+        var_mean = s2 * (1.0 / n + sum(o * w for o, w in zip(offset, leverage)))
+        half_width = t_quantile(0.5 + self.confidence / 2, n - q - 1) * math.sqrt(var_mean)
+        return mean, math.sqrt(s2), half_width, var_mean
+
+    def interval(self, metric: str) -> Tuple[float, float, float]:
+        return self._estimate(metric)[:3]
+
+    def variance_reduction(self, metric: str) -> float:
+        """Variance of the plain mean of independent runs over that of the reported estimate.
+
+        That is how many times more independent replications the same
+        precision would have cost.
+        """
+        runs = self.samples[metric]
+        var_mean = self._estimate(metric)[3]
+        if len(runs) < 2 or var_mean <= 0:
+            return float("nan")
+        return statistics.variance(runs) / len(runs) / var_mean
+
+    def as_row(self) -> Dict[str, float]:
+        """Flatten to ``metric``, ``metric_std`` and ``metric_ci_half_width`` columns.
+
+        Control columns are left out; with antithetic pairs or control
+        variates each adjusted metric also gets a ``metric_variance_reduction``.
+        """
+        metrics = [m for m in self.samples if m not in self.controls]
+        estimates = {m: self._estimate(m) for m in metrics}
+        row: Dict[str, float] = {}
+        for metric in metrics:
+            row[metric] = estimates[metric][0]
+        for metric in metrics:
+            _, std, half_width, _ = estimates[metric]
+            row[f"{metric}_std"] = std
+            row[f"{metric}_ci_half_width"] = half_width
+        if self.paired or self.controls:
+            for metric in self.adjusted:
+                if metric in self.samples:
+                    row[f"{metric}_variance_reduction"] = self.variance_reduction(metric)
+        row["replications"] = self.replications
+        return row
+
+
+def row_columns(metrics: Sequence[str], plan: ReplicationPlan) -> List[str]:
+    """Columns ``ReplicationResult.as_row`` produces for summaries with keys ``metrics``."""
+    columns = list(metrics)
+    for metric in metrics:
+        columns += [f"{metric}_std", f"{metric}_ci_half_width"]
+    if plan.reduces_variance:
+        columns += [f"{metric}_variance_reduction" for metric in plan.metrics if metric in metrics]
+    return columns + ["replications"]
+
+
+def expected_arrivals(config: SimConfig, customer_types: List[CustomerType]) -> Dict[str, float]:
+    """Known means of the ``arrivals_<type>`` control columns (Poisson counts over the horizon)."""
+    hours = offered_minutes(config) / 60.0
+    return {
+        f"arrivals_{ct.name}": ct.arrival_rate_per_hour * hours
+        for ct in customer_types
+        if ct.arrival_rate_per_hour > 0
+    }
+
+
+def new_result(config: SimConfig, customer_types: List[CustomerType], plan: ReplicationPlan) -> ReplicationResult:
+    return ReplicationResult(
+        plan.confidence,
+        paired=plan.antithetic,
+        controls=expected_arrivals(config, customer_types) if plan.control_variates else {},
+        adjusted=tuple(plan.metrics) if plan.reduces_variance else (),
+    )
+
+
+def check_metrics(plan: ReplicationPlan, summary_keys: Sequence[str]) -> None:
+    """Raise ``ValueError`` if ``plan.metrics`` names something that is not a summary key.
+
+    Otherwise an unknown name would have no interval, and the precision
+    target would count as met after the first replications.
+    """
+    unknown = [m for m in plan.metrics if m not in summary_keys]
+    if unknown:
+        raise ValueError(f"Unknown precision metric(s): {', '.join(unknown)}; "
+                         f"choose from {', '.join(summary_keys)}")
+
+
+def run_replications(
+    run_one: Callable[[int], Dict[str, float]], plan: ReplicationPlan, result: ReplicationResult = None
+) -> ReplicationResult:
+    """Call ``run_one(index)`` for successive replication indices according to ``plan``.
+
+    Antithetic plans run whole pairs, so counts are rounded up to even.
+    """
+    result = result if result is not None else ReplicationResult(plan.confidence)
+    step = 2 if plan.antithetic else 1
+    n_initial = max(plan.replications, 2 * step) if plan.sequential else plan.replications
+    n_initial += -n_initial % step
+    for index in range(n_initial):
+        result.add(run_one(index))
+    if plan.sequential or plan.reduces_variance:
+        check_metrics(plan, list(result.samples))
+    if not plan.sequential:
+        return result
+    while result.replications < plan.max_replications:
+        intervals = [result.interval(m) for m in plan.metrics if m in result.samples]
+        if all(plan.is_precise(mean, hw) for mean, _, hw in intervals):
+            break
+        for _ in range(step):
+            result.add(run_one(result.replications))
+    return result
+
+
+def replicate(
+    config: SimConfig,
+    customer_types: List[CustomerType],
+    seed: int,
+    plan: ReplicationPlan,
+    cache: ResultCache = None,
+) -> ReplicationResult:
+    """Run ``plan`` for one instance with the engine selected in ``config``.
+
+    The ``"vectorized"`` engine simulates whole batches of replications in
+    lockstep; in sequential mode the batch size doubles until the precision
+    target or ``max_replications`` is reached. With a ``cache``, event-engine
+    replications are cached one by one and lockstep results per plan.
+    """
+    if plan.control_variates and config.steady_state_precision > 0:
+        # The known arrival means assume the full horizon; early-stopped runs see fewer arrivals.
+        raise ValueError("Control variates need full-length runs; disable steady_state_precision")
+    if config.engine != "vectorized":
+        return run_replications(
+            lambda index: cached_replication(
+                config, customer_types, seed, index, cache, plan.antithetic, plan.control_variates
+            ),
+            plan,
+            new_result(config, customer_types, plan),
+        )
+    if plan.antithetic:
+        raise ValueError("Antithetic replications need the simpy or native engine")
+    if cache is None:
+        return _replicate_lockstep(config, customer_types, seed, plan)
+    key = model_key(config, customer_types, seed, {"lockstep": asdict(plan)})
+    samples = cache.get_or_compute(key, lambda: _replicate_lockstep(config, customer_types, seed, plan).samples)
+    result = new_result(config, customer_types, plan)
+    result.samples = samples
+    return result
+
+
+def _replicate_lockstep(
+    config: SimConfig, customer_types: List[CustomerType], seed: int, plan: ReplicationPlan
+) -> ReplicationResult:
+    from vectorized_engine import lockstep_summaries
+
+    result = new_result(config, customer_types, plan)
+    batch = max(plan.replications, 2) if plan.sequential else plan.replications
+    root = RandomStreams(seed)
+    batch_index = 0
+    while True:
+        streams = root if batch_index == 0 else root.spawn(batch_index)
+        for summary in lockstep_summaries(
+            config, customer_types, batch, seed, streams, controls=plan.control_variates
+        ):
+            result.add(summary)
+        if batch_index == 0 and (plan.sequential or plan.reduces_variance):
+            check_metrics(plan, list(result.samples))
+        batch_index += 1
+        if not plan.sequential or result.replications >= plan.max_replications:
+            return result
+        intervals = [result.interval(m) for m in plan.metrics if m in result.samples]
+        if all(plan.is_precise(mean, hw) for mean, _, hw in intervals):
+            return result
+        batch = min(result.replications, plan.max_replications - result.replications)
+
+
+def replication_streams(seed: int, index: int, block_size: int = 0, antithetic: bool = False) -> RandomStreams:
+    """Streams for replication ``index``; replication 0 matches a plain single run.
+
+    With ``antithetic``, replications ``2i`` and ``2i + 1`` share the seeds of
+    plain replication ``i``, the second with mirrored uniforms.
+    """
+    root = make_streams(seed, block_size)
+    if not antithetic:
+        return root if index == 0 else root.spawn(index)
+    pair, mirrored = divmod(index, 2)
+    streams = root if pair == 0 else root.spawn(pair)
+    return streams.antithetic_twin() if mirrored else streams
+
+
+def simulate_replication(
+    config: SimConfig,
+    customer_types: List[CustomerType],
+    seed: int,
+    index: int,
+    antithetic: bool = False,
+    controls: bool = False,
+) -> Dict[str, float]:
+    """One replication's summary; ``controls`` adds the ``arrivals_<type>`` counts."""
+    streams = replication_streams(seed, index, config.variate_block_size, antithetic)
+    sim = create_simulation(config, customer_types, seed=seed, streams=streams)
+    metrics = sim.run()
+    summary = summarize_metrics(metrics, config)
+    if controls:
+        for ct in customer_types:
+            if ct.arrival_rate_per_hour > 0:
+                summary[f"arrivals_{ct.name}"] = metrics.arrivals.get(ct.name, 0)
+    return summary
+
+
+def cached_replication(
+    config: SimConfig,
+    customer_types: List[CustomerType],
+    seed: int,
+    index: int,
+    cache: ResultCache = None,
+    antithetic: bool = False,
+    controls: bool = False,
+) -> Dict[str, float]:
+    """``simulate_replication`` through ``cache`` (if any), keyed by model, seed and index."""
+    def compute() -> Dict[str, float]:
+        return simulate_replication(config, customer_types, seed, index, antithetic, controls)
+
+    if cache is None:
+        return compute()
+    run = {"index": index, "antithetic": antithetic, "controls": controls} if antithetic or controls else index
+    return cache.get_or_compute(model_key(config, customer_types, seed, run), compute)
@@ -0,0 +1,107 @@
+import functools
+import hashlib
+import json
+import os
+from dataclasses import asdict, dataclass
+from pathlib import Path
+from typing import Callable, Dict, List, Optional
+
+from cafe_sim import CustomerType, SimConfig
+
+SRC_DIR = Path(__file__).resolve().parent
+
+
+@functools.lru_cache(maxsize=None)
+def model_version() -> str:
+    """Hash of the simulation sources; any edit under ``src/`` invalidates the cache."""
+    digest = hashlib.sha256()
+    for path in sorted(SRC_DIR.glob("*.py")):
+        digest.update(path.name.encode("utf-8"))
+        digest.update(path.read_bytes())
+    return digest.hexdigest()[:16]
+
+
+def model_key(config: SimConfig, customer_types: List[CustomerType], seed: int, run: object) -> str:
+    """Content address of one run.
+
+    The instance is normalized through the ``SimConfig`` and ``CustomerType``
+    objects actually simulated, so defaults filled in by the loader, JSON key
+    order and labels such as the instance name do not affect the key. ``run``
+    identifies the replication (an index, or a plan description).
+    """
+    payload = {
+        "config": asdict(config),
+        "customer_types": [asdict(ct) for ct in customer_types],
+        "seed": seed,
+        "run": run,
+        "model_version": model_version(),
+    }
+    encoded = json.dumps(payload, sort_keys=True, separators=(",", ":"), default=str)
+    return hashlib.sha256(encoded.encode("utf-8")).hexdigest()
+
+
+@dataclass
+class ResultCache:
+    """Summaries stored as one JSON file per key under ``root``.
+
+    Files are written atomically, so several worker processes can share the
+    same directory. Hits refresh the file's mtime and ``evict`` removes the
+    least recently used files until the directory fits in ``max_bytes``.
+    """
+
+    root: str
+    max_bytes: int = 256 * 1024 * 1024
+
+    def _path(self, key: str) -> Path:
+        return Path(self.root) / key[:2] / f"{key}.json"
+
+    def get(self, key: str) -> Optional[Dict[str, float]]:
+        path = self._path(key)
+        try:
+            with open(path, "r", encoding="utf-8") as f:
+                summary = json.load(f)
+        except (OSError, ValueError):
+            return None
+        try:
+            os.utime(path)
+        except OSError:
+            pass
+        return summary
+
+    def put(self, key: str, summary: Dict[str, float]) -> None:
+        path = self._path(key)
+        path.parent.mkdir(parents=True, exist_ok=True)
+        tmp = path.with_suffix(f".{os.getpid()}.tmp")
+        with open(tmp, "w", encoding="utf-8") as f:
+            json.dump(summary, f)
+        os.replace(tmp, path)
+
+    def get_or_compute(self, key: str, compute: Callable[[], Dict[str, float]]) -> Dict[str, float]:
+        summary = self.get(key)
+        if summary is None:
+            summary = compute()
+            self.put(key, summary)
+        return summary
+
+    def evict(self) -> int:
+        """Delete least recently used entries until the cache fits; return the number removed."""
+        entries = []
+        total = 0
+        for path in Path(self.root).glob("*/*.json"):
+            try:
+                stat = path.stat()
+            except OSError:
+                continue
+            entries.append((stat.st_mtime, stat.st_size, path))
+            total += stat.st_size
+        removed = 0
+        for _, size, path in sorted(entries):
+            if total <= self.max_bytes:
+                break
+            try:
+                path.unlink()
+            except OSError:
+                continue
+            total -= size
+            removed += 1
+        return removed
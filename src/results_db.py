@@ -0,0 +1,197 @@
+import csv
+import os
+import sqlite3
+from typing import Dict, Iterable, Iterator, List, Optional, Sequence
+
+TEXT_COLUMNS = ("instance", "source", "screening")
+INTEGER_COLUMNS = ("peak_hour", "seed", "order_attendants", "baristas", "pickup_attendants", "replications")
+INDEXES = {
+    "source": ("source",),
+    "staffing": ("order_attendants", "baristas", "pickup_attendants"),
+    "alpha": ("prep_queue_alpha",),
+    "seed": ("seed",),
+}
+
+
+def column_type(name: str) -> str:
+    if name in TEXT_COLUMNS:
+        return "TEXT"
+    if name in INTEGER_COLUMNS:
+        return "INTEGER"
+    return "REAL"
+
+
+def _convert(name: str, value):
+    """CSV strings to the column's Python type (empty string -> NULL)."""
+    if value is None or value == "":
+        return None
+    if name in TEXT_COLUMNS:
+        return str(value)
+    if name in INTEGER_COLUMNS:
+        return int(float(value))
+    return float(value)
+
+
+class ResultsDB:
+    """Run summaries in one SQLite ``results`` table with typed, indexed columns.
+
+    Metric columns are REAL and are added on demand, so any set of summary
+    columns (replication ``_std``/``_ci_half_width`` columns, percentiles)
+    can be stored; table order follows the first row that introduced them.
+    """
+
+    def __init__(self, path: str):
+        self.path = path
+        self.conn = sqlite3.connect(path)
+        self.conn.row_factory = sqlite3.Row
+        self._columns = self._table_columns()
+
+    def _table_columns(self) -> List[str]:
+        return [row["name"] for row in self.conn.execute("PRAGMA table_info(results)")]
+
+    @property
+    def columns(self) -> List[str]:
+        return list(self._columns)
+
+    def _ensure_columns(self, names: Sequence[str]) -> None:
+        missing = [name for name in names if name not in self._columns]
+        if not missing:
+            return
+        if not self._columns:
+            defs = ", ".join(f'"{name}" {column_type(name)}' for name in missing)
+            self.conn.execute(f"CREATE TABLE results ({defs})")
+        else:
+            for name in missing:
+                self.conn.execute(f'ALTER TABLE results ADD COLUMN "{name}" {column_type(name)}')
+        self._columns = self._table_columns()
+        # Index whatever is available; CSVs from older runs have no staffing/alpha columns.
+        for index, columns in INDEXES.items():
+            if all(c in self._columns for c in columns):
+                cols = ", ".join(f'"{c}"' for c in columns)
+                self.conn.execute(f"CREATE INDEX IF NOT EXISTS idx_results_{index} ON results ({cols})")
+
+    def insert(self, rows: Iterable[Dict], batch_size: int = 10_000) -> int:
+        """Append summary rows (str or typed values); return the number inserted."""
+        count = 0
+        batch: List[Dict] = []
+        with self.conn:
+            for row in rows:
+                batch.append(row)
+                if len(batch) >= batch_size:
+                    count += self._insert_batch(batch)
+                    batch = []
+            if batch:
+                count += self._insert_batch(batch)
+        return count
+
+    def _insert_batch(self, rows: List[Dict]) -> int:
+        names = list(dict.fromkeys(name for row in rows for name in row))
+        self._ensure_columns(names)
+        cols = ", ".join(f'"{name}"' for name in names)
+        placeholders = ", ".join("?" for _ in names)
+        self.conn.executemany(
+            f"INSERT INTO results ({cols}) VALUES ({placeholders})",
+            ([_convert(name, row.get(name)) for name in names] for row in rows),
+        )
+        return len(rows)
+
+    def load_csv(self, csv_path: str) -> int:
+        """Replace the table contents with the rows of a ``run_batch`` CSV and record where they came from."""
+        with self.conn:
+            self.conn.execute("DROP TABLE IF EXISTS results")
+            self.conn.execute("DROP TABLE IF EXISTS meta")
+        self._columns = []
+        with open(csv_path, newline="", encoding="utf-8") as f:
+            count = self.insert(csv.DictReader(f))
+        with self.conn:
+            self.conn.execute("CREATE TABLE meta (key TEXT PRIMARY KEY, value TEXT)")
+            self.conn.executemany("INSERT INTO meta VALUES (?, ?)", csv_signature(csv_path).items())
+        return count
+
+    def source(self) -> Dict[str, str]:
+        """Signature (``csv_signature``) of the CSV the table was loaded from; empty if unknown."""
+        if not self.conn.execute("SELECT 1 FROM sqlite_master WHERE type = 'table' AND name = 'meta'").fetchone():
+            return {}
+        return {row["key"]: row["value"] for row in self.conn.execute("SELECT key, value FROM meta")}
+
+    def query(self, sql: str, params: Sequence = ()) -> List[Dict]:
+        return [dict(row) for row in self.conn.execute(sql, params)]
+
+    def sources(self) -> List[str]:
+        rows = self.conn.execute("SELECT DISTINCT source FROM results WHERE source IS NOT NULL ORDER BY source")
+        return [row[0] for row in rows]
+
+    def rows(self, source: str = "", columns: Sequence[str] = None, order_by: str = "rowid",
+             limit: Optional[int] = None) -> List[Dict]:
+        """Rows (optionally of one source), in insertion order unless ``order_by`` is given."""
+        cols = ", ".join(f'"{c}"' for c in columns) if columns else ", ".join(f'"{c}"' for c in self._columns)
+        sql = f"SELECT {cols} FROM results"
+        params: List = []
+        if source:
+            sql += " WHERE source = ?"
+            params.append(source)
+        sql += f" ORDER BY {order_by}"
+        if limit is not None:
+            sql += " LIMIT ?"
+            params.append(limit)
+        return self.query(sql, params)
+
+    def iter_rows(self, source: str = "", columns: Sequence[str] = None) -> Iterator[Dict]:
+        """Stream rows (optionally of one source) from a cursor, in insertion order."""
+        cols = ", ".join(f'"{c}"' for c in columns) if columns else ", ".join(f'"{c}"' for c in self._columns)
+        sql = f"SELECT {cols} FROM results"
+        params: List = []
+        if source:
+            sql += " WHERE source = ?"
+            params.append(source)
+        for row in self.conn.execute(sql + " ORDER BY rowid", params):
+            yield dict(row)
+
+    def values(self, metric: str, source: str = "") -> List[float]:
+        sql = f'SELECT "{metric}" FROM results'
+        params: List = []
+        if source:
+            sql += " WHERE source = ?"
+            params.append(source)
+        return [row[0] for row in self.conn.execute(sql + " ORDER BY rowid", params)]
+
+    def aggregates(self, metrics: Sequence[str], group_by: str = "source") -> List[Dict]:
+        """``n`` and the mean of each metric per group, groups in order of first appearance."""
+        means = ", ".join(f'AVG("{m}") AS "{m}"' for m in metrics)
+        sql = (
+            f'SELECT "{group_by}" AS "{group_by}", COUNT(*) AS n, {means} FROM results '
+            f'GROUP BY "{group_by}" ORDER BY MIN(rowid)'
+        )
+        return self.query(sql)
+
+    def close(self) -> None:
+        self.conn.close()
+
+    def __enter__(self) -> "ResultsDB":
+        return self
+
+    def __exit__(self, *exc) -> None:
+        self.close()
+
+
+def csv_signature(csv_path: str) -> Dict[str, str]:
+    """Absolute path, size and modification time (ns) of a CSV, as stored in the ``meta`` table."""
+    stat = os.stat(csv_path)
+    return {
+        "source_path": os.path.abspath(csv_path),
+        "source_size": str(stat.st_size),
+        "source_mtime_ns": str(stat.st_mtime_ns),
+    }
+
+
+def open_results(db_path: str, csv_path: str = "") -> ResultsDB:
+    """Open ``db_path``, rebuilding it from ``csv_path`` unless it was loaded from that exact file.
+
+    The DB records the path, size and mtime of its CSV, so another CSV (even
+    an older one) or a rewritten one triggers a rebuild.
+    """
+    db = ResultsDB(db_path)
+    if csv_path and os.path.exists(csv_path):
+        if not db.columns or db.source() != csv_signature(csv_path):
+            db.load_csv(csv_path)
+    return db
@@ -0,0 +1,80 @@
+import statistics
+from dataclasses import dataclass
+from typing import Callable, Dict, List, Optional, Tuple
+
+
+def kn_eta(k: int, alpha: float, n0: int) -> float:
+    """Kim-Nelson constant with the Bonferroni split of ``alpha`` over ``k - 1`` comparisons."""
+    return 0.5 * ((2 * alpha / (k - 1)) ** (-2 / (n0 - 1)) - 1)
+
+
+@dataclass
+class Selection:
+    best: int
+    means: List[float]
+    replications: List[int]
+    eliminated_at: List[Optional[int]]  # stage (replications per survivor) at elimination; None if kept
+
+    @property
+    def total_replications(self) -> int:
+        return sum(self.replications)
+
+
+def kn_select(
+    sample: Callable[[int, int], float],
+    k: int,
+    delta: float,
+    alpha: float = 0.05,
+    n0: int = 10,
+    max_replications: int = 100,
+) -> Selection:
+    """Pick the system with the smallest mean by Kim-Nelson sequential elimination.
+
+    ``sample(i, r)`` returns observation ``r`` of system ``i``; observations
+    with the same ``r`` may share random numbers, which only tightens the
+    pairwise variances. Every system gets ``n0`` observations, then survivors
+    get one more per stage and system ``i`` is dropped as soon as its mean
+    exceeds another survivor's by more than the shrinking KN tolerance.
+    With probability at least ``1 - alpha`` the selected system is within
+    ``delta`` of the best. If several systems survive ``max_replications``,
+    the one with the smallest sample mean is returned.
+    """
+    if n0 < 2:
+        raise ValueError("n0 must be >= 2")
+    if delta <= 0:
+        raise ValueError("delta must be > 0")
+    observations = [[sample(i, r) for r in range(n0)] for i in range(k)]
+    eliminated_at: List[Optional[int]] = [None] * k
+    alive = list(range(k))
+    if k > 1:
+        h2 = 2 * kn_eta(k, alpha, n0) * (n0 - 1)
+        s2: Dict[Tuple[int, int], float] = {}
+        for i in range(k):
+            for l in range(i + 1, k):
+                diffs = [a - b for a, b in zip(observations[i], observations[l])]
+                s2[i, l] = s2[l, i] = statistics.variance(diffs)
+
+        r = n0
+        while True:
+            means = {i: statistics.fmean(observations[i]) for i in alive}
+            dropped = set()
+            for i in alive:
+                for l in alive:
+                    if l == i:
+                        continue
+                    tolerance = max(0.0, delta / (2 * r) * (h2 * s2[i, l] / delta ** 2 - r))
+                    if means[i] > means[l] + tolerance:
+                        dropped.add(i)
+                        break
+            for i in dropped:
+                eliminated_at[i] = r
+            alive = [i for i in alive if i not in dropped]
+            if len(alive) <= 1 or r >= max_replications:
+                break
+            for i in alive:
+                observations[i].append(sample(i, r))
+            r += 1
+
+    means = [statistics.fmean(obs) for obs in observations]
+    best = min(alive, key=lambda i: means[i])
+    return Selection(best, means, [len(obs) for obs in observations], eliminated_at)
@@ -0,0 +1,178 @@
+import copy
+import math
+import statistics
+from bisect import bisect_left
+from dataclasses import replace
+from typing import Dict, List, Sequence
+
+from cafe_sim import WARMUP_DETECTION_COLUMNS, SimConfig, summarize_metrics
+from replications import ReplicationPlan, ReplicationResult, row_columns, t_quantile
+
+MSER_BATCH = 5
+QUEUE_WINDOW = 1.0  # minutes; queue lengths enter MSER as 1-minute time averages
+MIN_QUEUE = 0.05  # queues shorter than this on average carry no warm-up signal, only rare blips
+CONVERGENCE_BATCHES = 10
+QUEUE_STATS = ("order_queue_length", "prep_queue_length", "pickup_queue_length")
+TIME_WEIGHTED_STATS = QUEUE_STATS + ("order_busy_servers", "prep_busy_servers", "pickup_busy_servers")
+CAPACITY_STATS = ("order_servers", "prep_servers", "pickup_servers")  # None unless capacity changed mid-run
+CUSTOMER_LISTS = ("order_waits", "prep_waits", "pickup_waits", "system_times")
+MIN_BATCHES = 10
+MAX_LAG1 = 0.2  # batch means with a larger lag-1 autocorrelation are merged pairwise
+LAG1_METRICS = ("avg_system_time", "abandonment_rate")
+BATCH_COLUMNS = ("batches", "batch_minutes", "lag1_autocorrelation")
+
+
+def mser(values: Sequence[float], batch_size: int = MSER_BATCH) -> int:
+    """Number of leading observations the MSER-``batch_size`` rule deletes.
+
+    The series is averaged in batches of ``batch_size`` and the truncation
+    point ``d`` (at most half the batches) minimizes the standard error
+    statistic ``sum((Z_j - mean_d)^2 for j > d) / (m - d)^2``.
+    """
+    m = len(values) // batch_size
+    if m < 2:
+        return 0
+    z = [statistics.fmean(values[j * batch_size:(j + 1) * batch_size]) for j in range(m)]
+    suffix_sum = [0.0] * (m + 1)
+    suffix_sq = [0.0] * (m + 1)
+    for j in range(m - 1, -1, -1):
+        suffix_sum[j] = suffix_sum[j + 1] + z[j]
+        suffix_sq[j] = suffix_sq[j + 1] + z[j] * z[j]
+    best_d, best = 0, math.inf
+    for d in range(m // 2 + 1):
+        n = m - d
+        sse = suffix_sq[d] - suffix_sum[d] ** 2 / n
+        score = sse / n ** 2
+        if score < best:
+            best_d, best = d, score
+    return best_d * batch_size
+
+
+def detect_warmup(metrics, end_time: float) -> float:
+    """Truncation time (minutes) from MSER-5 on system times and queue lengths.
+
+    ``metrics`` must come from a run with ``warmup_detection`` (departure
+    times and queue histories from time 0). Each series proposes a point; the
+    latest one is used so that every series is past its transient. Queues
+    that are almost always empty are skipped: MSER would just cut after
+    their last blip.
+    """
+    points = [0.0]
+    deleted = mser(metrics.system_times)
+    if deleted:
+        points.append(metrics.departures[deleted - 1])
+    for name in QUEUE_STATS:
+        means = getattr(metrics, name).window_means(QUEUE_WINDOW, end_time)
+        if means and statistics.fmean(means) >= MIN_QUEUE:
+            points.append(mser(means) * QUEUE_WINDOW)
+    return min(max(points), end_time)
+
+
+def truncated(metrics, start: float):
+    """Copy of ``metrics`` with customer lists and time averages restricted to ``[start, end)``."""
+    keep = [i for i, t in enumerate(metrics.departures) if t >= start]
+    out = copy.copy(metrics)
+    for name in CUSTOMER_LISTS + ("departures",):
+        values = getattr(metrics, name)
+        setattr(out, name, [values[i] for i in keep])
+    out.completed_customers = len(keep)
+    for name in TIME_WEIGHTED_STATS + CAPACITY_STATS:
+        stat = getattr(metrics, name)
+        if stat is not None:
+            setattr(out, name, stat.since(start))
+    return out
+
+
+def batch_means(values: Sequence[float], batches: int) -> List[float]:
+    """Means of ``batches`` consecutive equal-size batches (the remainder at the start is dropped)."""
+    size = len(values) // batches
+    if size == 0:
+        return []
+    offset = len(values) - size * batches
+    return [statistics.fmean(values[offset + j * size:offset + (j + 1) * size]) for j in range(batches)]
+
+
+def converged(metrics, now: float, precision: float, confidence: float = 0.95) -> bool:
+    """Whether the post-warm-up mean system time is known to ``precision`` (relative CI half-width).
+
+    Uses ``CONVERGENCE_BATCHES`` batch means of the system times after the
+    currently detected truncation point, each of at least ``MSER_BATCH``
+    customers.
+    """
+    start = detect_warmup(metrics, now)
+    values = [s for t, s in zip(metrics.departures, metrics.system_times) if t >= start]
+    if len(values) < CONVERGENCE_BATCHES * MSER_BATCH:
+        return False
+    means = batch_means(values, CONVERGENCE_BATCHES)
+    mean = statistics.fmean(means)
+    half_width = t_quantile(0.5 + confidence / 2, len(means) - 1) * statistics.stdev(means) / math.sqrt(len(means))
+    return half_width <= precision * abs(mean)
+
+
+def windowed(metrics, start: float, end: float):
+    """Copy of ``metrics`` with only what happened in ``[start, end)``, summarized like a plain run."""
+    lo, hi = bisect_left(metrics.departures, start), bisect_left(metrics.departures, end)
+    out = copy.copy(metrics)
+    for name in CUSTOMER_LISTS:
+        setattr(out, name, getattr(metrics, name)[lo:hi])
+    out.completed_customers = hi - lo
+    out.total_customers = bisect_left(metrics.arrival_times, end) - bisect_left(metrics.arrival_times, start)
+    out.abandoned_customers = bisect_left(metrics.abandon_times, end) - bisect_left(metrics.abandon_times, start)
+    for name in TIME_WEIGHTED_STATS + CAPACITY_STATS:
+        stat = getattr(metrics, name)
+        if stat is not None:
+            setattr(out, name, stat.between(start, end))
+    out.departures = out.arrival_times = out.abandon_times = None
+    out.end_time = end
+    return out
+
+
+def lag1_autocorrelation(values: Sequence[float]) -> float:
+    n = len(values)
+    if n < 3:
+        return 0.0
+    mean = statistics.fmean(values)
+    denominator = sum((v - mean) ** 2 for v in values)
+    if denominator == 0:
+        return 0.0
+    return sum((values[i] - mean) * (values[i + 1] - mean) for i in range(n - 1)) / denominator
+
+
+def batch_columns(metrics: Sequence[str]) -> List[str]:
+    """Columns of ``batch_means_summary`` for summaries with keys ``metrics``."""
+    return row_columns(metrics, ReplicationPlan())[:-1] + list(WARMUP_DETECTION_COLUMNS) + list(BATCH_COLUMNS)
+
+
+def batch_means_summary(metrics, config: SimConfig, start: float, end: float) -> Dict[str, float]:
+    """Summarize one long run by the means of ``config.batches`` equal-time batches after ``start``.
+
+    Each batch is summarized like a separate run and the batch means give
+    ``_std`` and ``_ci_half_width`` columns as replications would. While
+    the lag-1 autocorrelation of the batch means (of ``LAG1_METRICS``)
+    exceeds ``MAX_LAG1`` (or some batch has no completed customer), adjacent
+    batches are merged, down to ``MIN_BATCHES``; the reported
+    autocorrelation tells whether the batches ended up independent enough.
+    """
+    metrics.abandon_times.sort()  # deadlines can be recorded slightly out of order
+    batches = config.batches
+    while True:
+        width = (end - start) / batches
+        summaries = []
+        for j in range(batches):
+            lo = start + j * width
+            window = replace(config, batches=0, warmup_detection=False, warmup_hours=lo / 60.0)
+            summaries.append(summarize_metrics(windowed(metrics, lo, lo + width), window))
+        lag1 = max(lag1_autocorrelation([s[m] for s in summaries]) for m in LAG1_METRICS)
+        empty = any(s["completed_customers"] == 0 for s in summaries)
+        if (lag1 <= MAX_LAG1 and not empty) or batches < 2 * MIN_BATCHES:
+            break
+        batches //= 2
+
+    result = ReplicationResult(ReplicationPlan().confidence)
+    for summary in summaries:
+        result.add(summary)
+    row = result.as_row()
+    del row["replications"]
+    row.update(zip(WARMUP_DETECTION_COLUMNS, (start, end)))
+    row.update(zip(BATCH_COLUMNS, (batches, width, lag1)))
+    return row
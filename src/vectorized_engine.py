@@ -0,0 +1,311 @@
+import math
+import warnings
+from typing import Dict, List, Tuple
+
+import numpy as np
+
+from cafe_sim import (
+    PICKUP_SPREAD,
+    REPORTED_QUANTILES,
+    SERVICE_SPREAD,
+    CustomerType,
+    RandomStreams,
+    SimConfig,
+    check_rate_profile,
+    offered_minutes,
+    rate_profile_knots,
+)
+
+
+def _generator(streams: RandomStreams, name: str) -> "np.random.Generator":
+    return np.random.Generator(np.random.PCG64(streams.derive_seed(name)))
+
+
+def _triangular(gen: "np.random.Generator", means: "np.ndarray", spread: float) -> "np.ndarray":
+    return gen.triangular(means * (1 - spread), means, means * (1 + spread))
+
+
+def _fifo_stage(arrivals: "np.ndarray", service: "np.ndarray", servers, patience=None, alpha=0.0):
+    """Kiefer-Wolfowitz recursion for a FIFO multi-server stage, one step per customer.
+
+    ``arrivals`` must be sorted along axis 1 (``inf`` marks absent customers).
+    Customers whose wait would exceed ``patience`` renege and never occupy a
+    server. With ``alpha`` > 0 the service time is scaled by
+    ``1 + alpha * q`` where ``q`` is the number of later customers already
+    waiting when service starts. ``servers`` and ``alpha`` may also be given
+    per row. Returns (start, end, served) arrays.
+    """
+    reps, n = arrivals.shape
+    rows = np.arange(reps)
+    servers = np.broadcast_to(servers, (reps,))
+    alpha = np.broadcast_to(alpha, (reps,))
+    # Rows with fewer servers than the widest one never free the missing ones.
+    free_at = np.where(np.arange(servers.max()) < servers[:, None], 0.0, np.inf)
+    start = np.full((reps, n), np.inf)
+    end = np.full((reps, n), np.inf)
+    served = np.zeros((reps, n), dtype=bool)
+
+    queue_dependent = bool((alpha > 0).any())
+    if queue_dependent:
+        # Row-offset copy of the sorted arrivals so one searchsorted covers every replication.
+        finite = np.where(np.isfinite(arrivals), arrivals, 0.0)
+        span = float(finite.max()) * 4 + 1.0
+        capped = np.minimum(arrivals, span / 2)
+        flat = (capped + rows[:, None] * span).ravel()
+
+    for k in range(n):
+        a = arrivals[:, k]
+        present = np.isfinite(a)
+        if not present.any():
+            break
+        server = free_at.argmin(axis=1)
+        begin = np.maximum(a, free_at[rows, server])
+        ok = present if patience is None else present & (begin - a <= patience[:, k])
+        duration = service[:, k]
+        if queue_dependent:
+            probe = np.minimum(begin, span / 2) + rows * span
+            arrived = np.searchsorted(flat, probe, side="right") - rows * n
+            queue = np.maximum(arrived - (k + 1), 0)
+            duration = duration * (1.0 + alpha * queue)
+        finish = begin + duration
+        free_at[rows[ok], server[ok]] = finish[ok]
+        start[:, k] = np.where(ok, begin, np.inf)
+        end[:, k] = np.where(ok, finish, np.inf)
+        served[:, k] = ok
+    return start, end, served
+
+
+def _window_overlap(lo: "np.ndarray", hi: "np.ndarray", window_start: float, window_end: float) -> "np.ndarray":
+    lo = np.where(np.isfinite(lo), lo, window_end)
+    hi = np.where(np.isfinite(hi), hi, window_end)
+    return np.clip(np.minimum(hi, window_end) - np.maximum(lo, window_start), 0.0, None)
+
+
+def simulate_lockstep(
+    config: SimConfig,
+    customer_types: List[CustomerType],
+    replications: int,
+    seed: int = 42,
+    streams: RandomStreams = None,
+    controls: bool = False,
+) -> Dict[str, "np.ndarray"]:
+    """Simulate ``replications`` independent runs of one instance together.
+
+    Each stage is advanced customer by customer with NumPy operations over the
+    replication axis. Returns one array per ``summarize_metrics`` key, with
+    one entry per replication; ``controls`` adds the ``arrivals_<type>`` counts.
+    """
+    return simulate_stores([(config, customer_types)], replications, seed, streams, controls)[0]
+
+
+def simulate_stores(
+    stores: List[Tuple[SimConfig, List[CustomerType]]],
+    replications: int,
+    seed: int = 42,
+    streams: RandomStreams = None,
+    controls: bool = False,
+) -> List[Dict[str, "np.ndarray"]]:
+    """Simulate ``replications`` runs of several independent stores together.
+
+    Each store is a ``(config, customer_types)`` pair with its own staffing,
+    horizon and demand. The stores become extra rows along the replication
+    axis, so one set of draws and one pass per stage serve all of them; the
+    per-customer loop is paid once instead of once per store. Returns one
+    ``simulate_lockstep`` result per store. A single store gives exactly the
+    ``simulate_lockstep`` result; stacked stores share the random streams, so
+    they agree with separate runs statistically but not seed by seed.
+    """
+    for config, _ in stores:
+        if config.warmup_detection or config.batches > 0:
+            raise ValueError("Warm-up detection and batch means need an event engine (simpy or native)")
+        check_rate_profile(config.rate_profile)
+    with np.errstate(invalid="ignore"):  # inf - inf for customers that never reach a stage
+        return _simulate_stores(stores, replications, seed, streams, controls)
+
+
+def _simulate_stores(stores, replications, seed, streams, controls=False):
+    streams = streams if streams is not None else RandomStreams(seed)
+    reps = replications
+    store_of_row = np.repeat(np.arange(len(stores)), reps)
+    rows = len(store_of_row)
+
+    def per_row(values) -> "np.ndarray":
+        """One value per store, as a column with one entry per row."""
+        return np.asarray(values, dtype=float)[store_of_row][:, None]
+
+    configs = [config for config, _ in stores]
+    horizon = per_row([config.hours * 60.0 for config in configs])
+    warmup = per_row([config.warmup_hours * 60.0 for config in configs])
+    window = np.maximum(horizon - warmup, 1e-6)
+
+    actives = [[ct for ct in types if ct.arrival_rate_per_hour > 0] for _, types in stores]
+    width = max(max(len(active) for active in actives), 1)
+    rates = np.zeros((len(stores), width))
+    for s, active in enumerate(actives):
+        rates[s, : len(active)] = [ct.arrival_rate_per_hour / 60.0 for ct in active]
+    total_rates = rates.sum(axis=1)
+    offered = np.array([offered_minutes(config) for config in configs])
+    n = 1
+    for total_rate, minutes in zip(total_rates, offered):
+        if total_rate > 0:
+            expected = total_rate * minutes
+            n = max(n, int(math.ceil(expected + 6 * math.sqrt(expected) + 10)))
+
+    # Superposed Poisson arrivals, extended until every replication passes the
+    # horizon; with a rate profile they are generated at the base rates and
+    # time-changed through the cumulative rate afterwards. Kinds follow each
+    # store's mix through its cumulative distribution (as ``Generator.choice``).
+    arrival_gen = _generator(streams, "lockstep.arrivals")
+    arriving = total_rates[store_of_row] > 0
+    if arriving.any():
+        scale = per_row(1.0 / np.where(total_rates > 0, total_rates, 1.0))
+        offered_rows = offered[store_of_row]
+        arrivals = np.cumsum(arrival_gen.exponential(scale, (rows, n)), axis=1)
+        while (arriving & (arrivals[:, -1] < offered_rows)).any():
+            more = arrival_gen.exponential(scale, (rows, n))
+            arrivals = np.hstack([arrivals, arrivals[:, -1:] + np.cumsum(more, axis=1)])
+        uniforms = arrival_gen.random(arrivals.shape)
+        cdf = np.full((len(stores), width), np.inf)
+        for s, active in enumerate(actives):
+            if active:
+                store_cdf = (rates[s, : len(active)] / total_rates[s]).cumsum()
+                cdf[s, : len(active)] = store_cdf / store_cdf[-1]
+        kinds = np.zeros(arrivals.shape, dtype=int)
+        for j in range(width):
+            kinds += cdf[store_of_row, j][:, None] <= uniforms
+        arrivals = np.where(arriving[:, None], arrivals, np.inf)
+        for s, config in enumerate(configs):
+            if config.rate_profile:
+                clock, cumulative = rate_profile_knots(config.rate_profile, config.hours * 60.0)
+                block = arrivals[s * reps : (s + 1) * reps]
+                block[:] = np.where(block < offered[s], np.interp(block, cumulative, clock), np.inf)
+    else:
+        arrivals = np.full((rows, n), np.inf)
+        kinds = np.zeros((rows, n), dtype=int)
+    arrivals = np.where(arrivals < horizon, arrivals, np.inf)
+    present = np.isfinite(arrivals)
+    n = arrivals.shape[1]
+
+    def per_type(attr: str) -> "np.ndarray":
+        values = np.ones((len(stores), width))  # placeholders only a store without arrivals uses
+        for s, active in enumerate(actives):
+            values[s, : len(active)] = [getattr(ct, attr) for ct in active]
+        return np.take_along_axis(values[store_of_row], kinds, axis=1)
+
+    def servers(field: str) -> "np.ndarray":
+        return np.array([getattr(config, field) for config in configs])[store_of_row]
+
+    patience = _generator(streams, "lockstep.patience").exponential(np.maximum(per_type("patience_mean"), 1e-12))
+    service_gen = _generator(streams, "lockstep.service")
+    order_time = _triangular(service_gen, per_type("order_time_mean"), SERVICE_SPREAD)
+    prep_base = _triangular(service_gen, per_type("prep_time_mean"), SERVICE_SPREAD)
+    pickup_time = _triangular(
+        _generator(streams, "lockstep.pickup"),
+        np.broadcast_to(per_row([config.pickup_time_mean for config in configs]), (rows, n)),
+        PICKUP_SPREAD,
+    )
+
+    # Order stage (arrival order is already FIFO order)
+    order_start, order_end, order_served = _fifo_stage(
+        arrivals, order_time, servers("order_attendants"), patience=patience
+    )
+    order_end = np.where(order_end < horizon, order_end, np.inf)
+
+    # Preparation stage, in order of completed orders
+    prep_order = np.argsort(order_end, axis=1, kind="stable")
+    prep_arrivals = np.take_along_axis(order_end, prep_order, axis=1)
+    prep_start, prep_end, _ = _fifo_stage(
+        prep_arrivals,
+        np.take_along_axis(prep_base, prep_order, axis=1),
+        servers("baristas"),
+        alpha=per_row([config.prep_queue_alpha for config in configs])[:, 0],
+    )
+    prep_end = np.where(prep_end < horizon, prep_end, np.inf)
+
+    # Pickup stage, in order of finished preparations
+    pickup_order = np.argsort(prep_end, axis=1, kind="stable")
+    pickup_arrivals = np.take_along_axis(prep_end, pickup_order, axis=1)
+    customer_of_pickup = np.take_along_axis(prep_order, pickup_order, axis=1)
+    pickup_start, pickup_end, _ = _fifo_stage(
+        pickup_arrivals, np.take_along_axis(pickup_time, customer_of_pickup, axis=1), servers("pickup_attendants")
+    )
+
+    def to_customer(values: "np.ndarray", index: "np.ndarray") -> "np.ndarray":
+        out = np.full_like(values, np.inf)
+        np.put_along_axis(out, index, values, axis=1)
+        return out
+
+    prep_start_c = to_customer(prep_start, prep_order)
+    prep_arrival_c = to_customer(prep_arrivals, prep_order)
+    pickup_start_c = to_customer(pickup_start, customer_of_pickup)
+    pickup_arrival_c = to_customer(pickup_arrivals, customer_of_pickup)
+    departure = to_customer(pickup_end, customer_of_pickup)
+
+    completed = (departure >= warmup) & (departure < horizon)
+    abandoned = present & ~order_served & (arrivals + patience < horizon)
+    n_completed = completed.sum(axis=1)
+    total = present.sum(axis=1)
+
+    series = {
+        "order_wait": order_start - arrivals,
+        "prep_wait": prep_start_c - prep_arrival_c,
+        "pickup_wait": pickup_start_c - pickup_arrival_c,
+        "system_time": departure - arrivals,
+    }
+    summary: Dict[str, "np.ndarray"] = {
+        "completed_customers": n_completed,
+        "abandoned_customers": abandoned.sum(axis=1),
+        "abandonment_rate": abandoned.sum(axis=1) / np.maximum(total, 1),
+    }
+    for name, values in series.items():
+        masked = np.where(completed, values, 0.0)
+        summary[f"avg_{name}"] = masked.sum(axis=1) / np.maximum(n_completed, 1)
+
+    busy = {
+        "order": _window_overlap(order_start, order_end, warmup, horizon),
+        "prep": _window_overlap(prep_start, prep_end, warmup, horizon),
+        "pickup": _window_overlap(pickup_start, pickup_end, warmup, horizon),
+    }
+    capacity = {"order": "order_attendants", "prep": "baristas", "pickup": "pickup_attendants"}
+    for stage, field in capacity.items():
+        summary[f"{stage}_utilization"] = busy[stage].sum(axis=1) / (window[:, 0] * np.maximum(servers(field), 1))
+
+    order_leave = np.where(order_served, order_start, arrivals + patience)
+    summary["avg_order_queue"] = _window_overlap(arrivals, order_leave, warmup, horizon).sum(axis=1) / window[:, 0]
+    summary["avg_prep_queue"] = (
+        _window_overlap(prep_arrivals, prep_start, warmup, horizon).sum(axis=1) / window[:, 0]
+    )
+    summary["avg_pickup_queue"] = (
+        _window_overlap(pickup_arrivals, pickup_start, warmup, horizon).sum(axis=1) / window[:, 0]
+    )
+
+    with warnings.catch_warnings():
+        warnings.simplefilter("ignore", RuntimeWarning)  # all-NaN rows when nothing completed
+        for name, values in series.items():
+            masked = np.where(completed, values, np.nan)
+            levels = np.nanpercentile(masked, [q * 100 for q in REPORTED_QUANTILES], axis=1)
+            for q, level in zip(REPORTED_QUANTILES, levels):
+                summary[f"{name}_p{round(q * 100)}"] = np.nan_to_num(level, nan=0.0)
+
+    results = []
+    for s, active in enumerate(actives):
+        block = slice(s * reps, (s + 1) * reps)
+        result = {key: values[block] for key, values in summary.items()}
+        if controls:
+            for j, ct in enumerate(active):
+                result[f"arrivals_{ct.name}"] = (present[block] & (kinds[block] == j)).sum(axis=1)
+        results.append(result)
+    return results
+
+
+def lockstep_summaries(
+    config: SimConfig,
+    customer_types: List[CustomerType],
+    replications: int,
+    seed: int = 42,
+    streams: RandomStreams = None,
+    controls: bool = False,
+) -> List[Dict[str, float]]:
+    """Same as ``simulate_lockstep`` but as one summary dict per replication."""
+    arrays = simulate_lockstep(config, customer_types, replications, seed, streams, controls)
+    return [{key: float(values[i]) for key, values in arrays.items()} for i in range(replications)]
@@ -0,0 +1,49 @@
+import math
+
+import pytest
+
+from analytic import erlang_a, erlang_b, erlang_c, estimate, mmc, screen
+from cafe_sim import CustomerType, SimConfig
+
+TYPES = [
+    CustomerType("fast", 20.0, 0.8, 1.0, 3.0),
+    CustomerType("medium", 12.0, 1.2, 2.5, 6.0),
+    CustomerType("slow", 6.0, 1.8, 4.0, 10.0),
+]
+
+
+def test_erlang_b_and_c_known_values():
+    assert erlang_b(1, 1.0) == pytest.approx(0.5)
+    assert erlang_b(2, 1.0) == pytest.approx(0.2)
+    assert erlang_c(1, 0.5) == pytest.approx(0.5)  # M/M/1: P(wait) = rho
+    assert erlang_c(2, 1.0) == pytest.approx(1 / 3)
+    assert erlang_c(10, 8.0) == pytest.approx(0.4092, abs=1e-4)
+    assert erlang_c(2, 2.5) == 1.0
+
+
+def test_mmc_mean_wait():
+    assert mmc(0.5, 1.0, 1).mean_wait == pytest.approx(1.0)  # M/M/1: rho / (mu - lambda)
+    assert mmc(1.0, 1.0, 2).mean_wait == pytest.approx(1 / 3)
+    assert mmc(2.0, 1.0, 1, horizon=60.0).mean_wait == pytest.approx(30.0)  # fluid backlog
+
+
+def test_erlang_a_with_patience_equal_to_service_is_an_infinite_server_queue():
+    # With theta = mu every customer leaves at rate mu, so the count is Poisson(lambda / mu).
+    stage = erlang_a(1.0, 1.0, 1, 1.0)
+    assert stage.wait_probability == pytest.approx(1 - math.exp(-1))
+    assert stage.mean_wait == pytest.approx(math.exp(-1))  # E[Lq] / lambda
+    assert stage.abandonment == pytest.approx(math.exp(-1))
+
+
+def test_erlang_a_approaches_erlang_c_for_patient_customers():
+    stage = erlang_a(1.0, 1.0, 2, 1e6)
+    assert stage.wait_probability == pytest.approx(erlang_c(2, 1.0), rel=1e-4)
+    assert stage.mean_wait == pytest.approx(mmc(1.0, 1.0, 2).mean_wait, rel=1e-4)
+    overloaded = erlang_a(3.0, 1.0, 1, 2.0)
+    assert 0.5 < overloaded.abandonment < 1.0
+
+
+def test_screen():
+    assert screen(estimate(SimConfig(), TYPES)) == ""
+    assert screen(estimate(SimConfig(baristas=1), [CustomerType("fast", 120.0, 0.2, 4.0, 3.0)])) == "overloaded"
+    assert screen(estimate(SimConfig(baristas=4), [CustomerType("fast", 5.0, 0.8, 1.0, 3.0)])) == "idle"
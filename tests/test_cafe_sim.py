@@ -0,0 +1,139 @@
+import random
+import re
+import statistics
+from dataclasses import replace
+
+import pytest
+import simpy
+
+from cafe_sim import (
+    REPORTED_QUANTILES,
+    BufferedVariates,
+    CustomerType,
+    ImpatientResource,
+    RandomStreams,
+    RecordingTimeWeightedStat,
+    SimConfig,
+    StreamingSeries,
+    TimeWeightedStat,
+    create_simulation,
+    percentile,
+    summarize_metrics,
+)
+
+TYPES = [
+    CustomerType("fast", 20.0, 0.8, 1.0, 3.0),
+    CustomerType("medium", 12.0, 1.2, 2.5, 6.0),
+    CustomerType("slow", 6.0, 1.8, 4.0, 10.0),
+]
+
+
+def run(config: SimConfig, seed: int = 42, streams: RandomStreams = None):
+    return summarize_metrics(create_simulation(config, TYPES, seed, streams).run(), config)
+
+
+def test_runs_ignore_the_global_random_state():
+    config = SimConfig(hours=2.0)
+    random.seed(1)
+    first = run(config)
+    random.seed(2)
+    assert run(config) == first
+    assert run(config, seed=43) != first
+
+
+def test_named_streams_are_independent():
+    streams = RandomStreams(7)
+    expected = RandomStreams(7).stream("service").random()
+    for _ in range(100):
+        streams.stream("arrivals.fast").random()
+    assert streams.stream("service").random() == expected
+    assert streams.spawn(0).derive_seed("service") != streams.spawn(1).derive_seed("service")
+
+
+def test_p2_quantiles_track_exact_percentiles():
+    rng = random.Random(3)
+    values = [rng.expovariate(1.0) for _ in range(20000)]
+    series = StreamingSeries(REPORTED_QUANTILES)
+    for x in values:
+        series.append(x)
+    assert len(series) == len(values)
+    assert series.mean == pytest.approx(statistics.fmean(values))
+    assert series.variance == pytest.approx(statistics.variance(values))
+    for q in REPORTED_QUANTILES:
+        assert series.quantile(q) == pytest.approx(percentile(values, q), rel=0.03)
+
+
+def test_streaming_metrics_match_list_metrics():
+    exact = run(SimConfig(hours=3.0))
+    streaming = run(SimConfig(hours=3.0, streaming_metrics=True))
+    assert streaming.keys() == exact.keys()
+    for key, value in exact.items():
+        if not re.search(r"_p\d+$", key):  # quantiles are P-square estimates
+            assert streaming[key] == pytest.approx(value), key
+
+
+def test_time_weighted_stat_counts_area_after_warmup():
+    stat = TimeWeightedStat(start=2.0)
+    stat.update(1.0, 3)
+    stat.update(4.0, 1)
+    assert stat.mean(6.0) == pytest.approx((3 * 2 + 1 * 2) / 4)
+    assert TimeWeightedStat(start=2.0).mean(2.0) == 0.0
+
+
+def test_recording_stat_replays_windows():
+    stat = RecordingTimeWeightedStat()
+    stat.update(1.0, 3)
+    stat.update(4.0, 1)
+    assert stat.between(0.0, 4.0).mean(4.0) == pytest.approx(9 / 4)
+    assert stat.since(2.0).mean(6.0) == pytest.approx(2.0)
+    assert stat.window_means(2.0, 6.0) == pytest.approx([1.5, 3.0, 1.0])
+
+
+def test_event_driven_queue_mean_matches_fine_sampling():
+    config = SimConfig(hours=3.0, sample_interval=0.05)
+    metrics = create_simulation(config, TYPES).run()
+    sampled = statistics.fmean(metrics.prep_queue_samples)
+    assert summarize_metrics(metrics, config)["avg_prep_queue"] == pytest.approx(sampled, rel=0.05)
+
+
+def test_impatient_resource_reneges_at_the_deadline():
+    env = simpy.Environment()
+    abandoned = []
+    counter = ImpatientResource(env, capacity=1, on_abandon=abandoned.append)
+    outcome = {}
+
+    def customer(name, arrival, patience, service):
+        yield env.timeout(arrival)
+        granted = yield counter.request(patience)
+        outcome[name] = (granted, env.now)
+        if granted:
+            yield env.timeout(service)
+            counter.release()
+
+    for args in [("a", 0, 1, 10), ("b", 1, 2, 1), ("c", 2, 20, 1), ("d", 3, 8, 1)]:
+        env.process(customer(*args))
+    env.run()
+    counter.expire(env.now)
+
+    assert outcome["a"] == (True, 0)
+    assert outcome["c"] == (True, 10)  # b reneged at 3, so c is next
+    assert outcome["d"] == (True, 11)  # a wait of exactly the patience is still served
+    assert outcome["b"] == (False, 10)  # purged lazily when the counter is next touched...
+    assert abandoned == [3]  # ...but counted at its deadline
+    assert counter.queue_stat.mean(12) == pytest.approx((1 + 2 + 2 * 7 + 1) / 12)
+
+
+def test_buffered_variates_follow_their_distributions():
+    streams = BufferedVariates(5, block_size=1000)
+    exponential = [streams.expovariate("arrivals", 0.5) for _ in range(20000)]
+    triangular = [streams.triangular("service", 1.0, 4.0, 2.0) for _ in range(20000)]
+    assert statistics.fmean(exponential) == pytest.approx(2.0, rel=0.03)
+    assert 1.0 <= min(triangular) and max(triangular) <= 4.0
+    assert statistics.fmean(triangular) == pytest.approx(7.0 / 3, rel=0.01)
+
+
+def test_buffered_runs_are_reproducible_across_engines():
+    config = SimConfig(hours=2.0, variate_block_size=7)
+    buffered = run(config)
+    assert run(config) == buffered
+    assert run(replace(config, engine="native")) == buffered
@@ -0,0 +1,35 @@
+from compare_staffing import compare
+from replications import ReplicationPlan
+
+INSTANCE = {
+    "arrival_rates_per_hour": {"fast": 30.0, "medium": 15.0, "slow": 6.0},
+    "staffing": {"order_attendants": 1, "baristas": 2, "pickup_attendants": 1},
+    "hours": 2.0,
+}
+ALTERNATIVES = [{}, {"staffing": {"order_attendants": 1, "baristas": 3, "pickup_attendants": 1}}]
+METRICS = ["avg_system_time", "abandonment_rate"]
+
+
+def run(crn: bool):
+    rows = compare(INSTANCE, ALTERNATIVES, ReplicationPlan(replications=20), 42, METRICS,
+                   {"engine": "native", "common_random_numbers": crn})
+    return {row["metric"]: row for row in rows}
+
+
+def test_common_random_numbers_pair_customers_across_alternatives():
+    crn, plain = run(True), run(False)
+    assert crn["avg_system_time"]["alternative"] == "o1-b3-p1-a0.1"
+    # Baristas act downstream of the order counter, so with CRN the same customers renege in every pair.
+    assert crn["abandonment_rate"]["std_difference"] == 0.0
+    assert plain["abandonment_rate"]["std_difference"] > 0.0
+    system = crn["avg_system_time"]
+    assert system["mean_difference"] < 0 and system["significant"]  # a third barista helps
+    assert system["variance_reduction"] > 4
+    assert system["ci_half_width"] < plain["avg_system_time"]["ci_half_width"]
+
+
+def test_partial_staffing_alternatives_keep_the_other_roles():
+    inst = {**INSTANCE, "staffing": {"order_attendants": 2, "baristas": 2, "pickup_attendants": 2}}
+    rows = compare(inst, [{}, {"staffing": {"baristas": 3}}], ReplicationPlan(replications=2), 42,
+                   ["avg_system_time"], {"engine": "native"})
+    assert [(row["baseline"], row["alternative"]) for row in rows] == [("o2-b2-p2-a0.1", "o2-b3-p2-a0.1")]
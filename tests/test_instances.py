@@ -0,0 +1,52 @@
+import json
+import math
+
+from build_instances import DEFAULT_AXES, iter_scenarios, iter_sweep
+from instance_store import InstanceStore
+from run_batch import iter_instances
+
+SOURCE = {
+    "source": "test_source",
+    "peak_hour": 9,
+    "total_rate_per_hour": 30.0,
+    "mix": {"fast": 0.5, "medium": 0.3, "slow": 0.2},
+    "open_hour": 7,
+    "rate_profile": [0.5, 1.0, 0.25],
+}
+AXES = {"scales": [1.0], "patience_options": [{"fast": 3.0, "medium": 6.0, "slow": 10.0}]}
+
+
+def test_store_and_json_directory_give_the_same_labels_and_instances(tmp_path):
+    instances = list(iter_scenarios(SOURCE, "test", AXES)) + list(iter_scenarios(SOURCE, "test", AXES, day=True))
+    for inst in instances:
+        (tmp_path / f"{inst['name']}.json").write_text(json.dumps(inst), encoding="utf-8")
+    store_path = str(tmp_path / "instances.sqlite")
+    with InstanceStore(store_path) as store:
+        assert store.write(instances) == len(instances)
+
+    from_dir = list(iter_instances(str(tmp_path)))
+    from_store = list(iter_instances(store_path=store_path))
+    assert [label for label, _ in from_dir] == [label for label, _ in from_store]
+    assert from_dir[0][0] == "test_001"
+    for (_, a), (_, b) in zip(from_dir, from_store):
+        assert a == b
+
+
+def test_day_scenarios_carry_the_rate_profile():
+    day = next(iter_scenarios(SOURCE, "test", AXES, day=True))
+    assert day["name"] == "test_day_001"
+    assert day["hours"] == 3.0 and day["warmup_hours"] == 0.0
+    assert day["open_hour"] == 7 and day["rate_profile"] == [0.5, 1.0, 0.25]
+
+
+def test_sweep_crosses_extra_axes_lazily():
+    spec = {"sources": [SOURCE], "axes": {**AXES, "hours": [2.0, 6.0], "prep_time_mean": [{"slow": 5.0}]}}
+    sweep = iter_sweep(spec)
+    first = next(sweep)
+    assert first["name"] == "test_source_001"
+    assert first["hours"] == 2.0
+    assert first["prep_time_mean"] == {"fast": 1.0, "medium": 2.5, "slow": 5.0}
+    rest = list(sweep)
+    axis_sizes = [len(DEFAULT_AXES["staff_options"]), len(DEFAULT_AXES["prep_alpha_options"]), 2]
+    assert len(rest) + 1 == math.prod(axis_sizes)
+    assert rest[0]["hours"] == 6.0  # extra axes vary fastest
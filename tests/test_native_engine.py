@@ -0,0 +1,27 @@
+from dataclasses import replace
+
+import pytest
+
+from cafe_sim import CustomerType, SimConfig, create_simulation, summarize_metrics
+
+TYPES = [
+    CustomerType("fast", 30.0, 0.8, 1.0, 3.0),
+    CustomerType("medium", 15.0, 1.2, 2.5, 6.0),
+    CustomerType("slow", 6.0, 1.8, 4.0, 10.0),
+]
+
+
+@pytest.mark.parametrize("config", [
+    SimConfig(),
+    SimConfig(common_random_numbers=True, baristas=3),
+    SimConfig(streaming_metrics=True, prep_queue_alpha=0.0),
+    SimConfig(hours=3.0, warmup_hours=0.0, rate_profile=(0.5, 1.5, 1.0)),
+    SimConfig(warmup_detection=True),
+    SimConfig(hours=6.0, batches=10),
+], ids=["default", "crn", "streaming", "rate-profile", "auto-warmup", "batch-means"])
+def test_native_engine_matches_simpy_seed_for_seed(config):
+    for seed in (1, 2, 3):
+        simpy_config, native_config = config, replace(config, engine="native")
+        expected = summarize_metrics(create_simulation(simpy_config, TYPES, seed).run(), simpy_config)
+        actual = summarize_metrics(create_simulation(native_config, TYPES, seed).run(), native_config)
+        assert actual == expected
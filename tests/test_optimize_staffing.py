@@ -0,0 +1,21 @@
+import pytest
+
+from optimize_staffing import parse_range, parse_staff_cost, staffing_cost, staffing_grid
+
+
+def test_parse_staff_cost():
+    assert parse_staff_cost("baristas=5, order_attendants=2.5") == {"baristas": 5.0, "order_attendants": 2.5}
+    assert parse_staff_cost("") == {}
+    assert staffing_cost({"order_attendants": 2, "baristas": 3, "pickup_attendants": 1}, {}) == 0.0
+
+
+def test_parse_staff_cost_rejects_unknown_roles():
+    with pytest.raises(ValueError, match="abandonment_rate"):
+        parse_staff_cost("abandonment_rate=100")
+
+
+def test_staffing_grid():
+    grid = staffing_grid({"order_attendants": parse_range("1-2"), "baristas": parse_range("2,4"),
+                          "pickup_attendants": [1]})
+    assert len(grid) == 4
+    assert grid[0] == {"order_attendants": 1, "baristas": 2, "pickup_attendants": 1}
@@ -0,0 +1,36 @@
+import random
+
+from ranking import DEFAULT_WEIGHTS, GROUPINGS, score, top_k, top_k_by_group
+
+
+def make_rows(n, seed=0):
+    rng = random.Random(seed)
+    return [
+        {
+            "instance": f"i{i}",
+            "source": rng.choice(["a", "b", "c"]),
+            "abandonment_rate": rng.choice([0.0, 0.05, 0.1]),  # many ties
+            "avg_system_time": rng.choice([3.0, 4.0]),
+        }
+        for i in range(n)
+    ]
+
+
+def test_top_k_matches_a_full_sort():
+    rows = make_rows(500)
+    for k in (0, 1, 10, 600):
+        assert top_k(iter(rows), k) == sorted(rows, key=score)[:k]
+
+
+def test_top_k_by_group_matches_a_sort_per_group():
+    rows = make_rows(300, seed=1)
+    weights = {"avg_system_time": 1.0}
+    groups = top_k_by_group(rows, GROUPINGS["source"], 5, weights)
+    assert list(groups) == list(dict.fromkeys((row["source"],) for row in rows))
+    for (source,), best in groups.items():
+        members = [row for row in rows if row["source"] == source]
+        assert best == sorted(members, key=lambda row: score(row, weights))[:5]
+
+
+def test_score_treats_missing_values_as_zero():
+    assert score({"abandonment_rate": "", "avg_system_time": "2"}) == 2 * DEFAULT_WEIGHTS["avg_system_time"]
@@ -0,0 +1,72 @@
+import random
+import statistics
+from collections import Counter
+
+import pytest
+
+from build_instances import hourly_profile
+from cafe_sim import (
+    CustomerType,
+    ProfiledSampler,
+    SimConfig,
+    check_rate_profile,
+    create_simulation,
+    offered_minutes,
+    rate_profile_knots,
+)
+from replications import expected_arrivals, replication_streams
+
+TYPES = [CustomerType("fast", 30.0, 0.8, 1.0, 3.0), CustomerType("slow", 6.0, 1.8, 4.0, 10.0)]
+
+
+def test_knots_integrate_the_profile():
+    assert rate_profile_knots((0.5, 2.0), 150.0) == ([0.0, 60.0, 120.0, 150.0], [0.0, 30.0, 150.0, 165.0])
+    assert offered_minutes(SimConfig(hours=2.5, rate_profile=(0.5, 2.0))) == 165.0
+    assert offered_minutes(SimConfig(hours=2.5)) == 150.0
+
+
+def test_profile_of_ones_returns_the_base_draws():
+    base, profiled = random.Random(1), random.Random(1)
+    sampler = ProfiledSampler(lambda: profiled.expovariate(0.5), (1.0, 1.0))
+    for _ in range(200):
+        assert sampler() == pytest.approx(base.expovariate(0.5))
+
+
+def test_hourly_arrival_counts_follow_the_profile():
+    profile = (0.5, 0.0, 2.0)  # the cafe is closed in the second hour
+    counts = Counter()
+    rng = random.Random(2)
+    runs = 300
+    for _ in range(runs):
+        sampler = ProfiledSampler(lambda: rng.expovariate(1.0), profile)
+        t = sampler()
+        while t < 180.0:
+            counts[int(t // 60)] += 1
+            t += sampler()
+    for hour, multiplier in enumerate(profile):
+        assert counts[hour] / runs == pytest.approx(60.0 * multiplier, rel=0.03, abs=0.01)
+
+
+def test_simulated_arrivals_match_their_expectation():
+    config = SimConfig(hours=3.0, warmup_hours=0.0, engine="native", rate_profile=(0.5, 1.5, 1.0))
+    totals = {ct.name: [] for ct in TYPES}
+    for index in range(100):
+        sim = create_simulation(config, TYPES, 1, replication_streams(1, index))
+        sim.run()
+        for name in totals:
+            totals[name].append(sim.metrics.arrivals[name])
+    for key, expected in expected_arrivals(config, TYPES).items():
+        assert statistics.fmean(totals[key.removeprefix("arrivals_")]) == pytest.approx(expected, rel=0.05)
+
+
+def test_check_rate_profile():
+    with pytest.raises(ValueError):
+        check_rate_profile((1.0, -0.5))
+    with pytest.raises(ValueError):
+        check_rate_profile((0.0, 0.0))
+    check_rate_profile(())
+
+
+def test_hourly_profile_from_sales_counts():
+    assert hourly_profile(Counter({7: 5, 9: 10})) == (7, [0.5, 0.0, 1.0])
+    assert hourly_profile(Counter()) == (9, [1.0])
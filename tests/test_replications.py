@@ -0,0 +1,96 @@
+import math
+import random
+import statistics
+
+import pytest
+
+from cafe_sim import CustomerType, Metrics, RandomStreams, SimConfig, summarize_metrics
+from replications import (
+    ReplicationPlan,
+    ReplicationResult,
+    confidence_interval,
+    replicate,
+    row_columns,
+    run_replications,
+    t_quantile,
+)
+
+TYPES = [
+    CustomerType("fast", 20.0, 0.8, 1.0, 3.0),
+    CustomerType("medium", 12.0, 1.2, 2.5, 6.0),
+    CustomerType("slow", 6.0, 1.8, 4.0, 10.0),
+]
+
+
+def test_unknown_precision_metric_is_rejected():
+    plan = ReplicationPlan(replications=2, target_half_width=0.1, metrics=("avg_sytem_time",))
+    with pytest.raises(ValueError, match="avg_sytem_time"):
+        run_replications(lambda index: {"avg_system_time": float(index)}, plan)
+
+
+def test_sequential_stopping_runs_until_precise():
+    plan = ReplicationPlan(replications=2, max_replications=30, target_half_width=1e-9,
+                           metrics=("avg_system_time",))
+    result = run_replications(lambda index: {"avg_system_time": float(index % 3)}, plan)
+    assert result.replications == 30
+
+
+def test_replicate_checks_metrics_for_the_vectorized_engine():
+    config = SimConfig(hours=1.0, warmup_hours=0.0, engine="vectorized")
+    plan = ReplicationPlan(replications=4, relative_precision=0.5, metrics=("nope",))
+    with pytest.raises(ValueError, match="nope"):
+        replicate(config, TYPES, 1, plan)
+
+
+@pytest.mark.parametrize("df, expected", [(1, 12.7062), (2, 4.3027), (4, 2.7764), (10, 2.2281), (30, 2.0423)])
+def test_t_quantile_matches_tables(df, expected):
+    assert t_quantile(0.975, df) == pytest.approx(expected, rel=1e-3)
+
+
+def test_confidence_interval_uses_the_t_quantile():
+    mean, std, half_width = confidence_interval([1.0, 2.0, 3.0, 4.0, 5.0])
+    assert (mean, std) == (3.0, pytest.approx(math.sqrt(2.5)))
+    assert half_width == pytest.approx(t_quantile(0.975, 4) * math.sqrt(2.5) / math.sqrt(5))
+
+
+def test_control_variate_estimator_is_the_regression_estimator():
+    rng = random.Random(4)
+    x = [rng.gauss(10.0, 2.0) for _ in range(30)]
+    y = [3.0 * v + rng.gauss(0.0, 0.1) for v in x]
+    result = ReplicationResult(0.95, controls={"x": 10.0}, adjusted=("y",))
+    for xv, yv in zip(x, y):
+        result.add({"x": xv, "y": yv})
+    x_mean, y_mean = statistics.fmean(x), statistics.fmean(y)
+    beta = sum((a - x_mean) * (b - y_mean) for a, b in zip(x, y)) / sum((a - x_mean) ** 2 for a in x)
+    mean, _, half_width = result.interval("y")
+    assert mean == pytest.approx(y_mean - beta * (x_mean - 10.0))
+    assert abs(mean - 30.0) < half_width
+    assert result.variance_reduction("y") > 100
+    assert "x" not in result.as_row()
+
+
+def test_antithetic_streams_mirror_uniforms():
+    streams = RandomStreams(3)
+    twin = streams.antithetic_twin()
+    for _ in range(5):
+        assert twin.stream("service").random() == pytest.approx(1.0 - streams.stream("service").random())
+
+
+@pytest.mark.parametrize("plan", [
+    ReplicationPlan(replications=20, antithetic=True),
+    ReplicationPlan(replications=20, control_variates=True),
+], ids=["antithetic", "control-variates"])
+def test_variance_reduction_on_a_busy_cafe(plan):
+    config = SimConfig(hours=2.0, engine="native")
+    types = [CustomerType("fast", 30.0, 0.8, 1.0, 3.0)] + TYPES[1:]
+    result = replicate(config, types, 42, plan)
+    row = result.as_row()
+    assert list(row) == row_columns(list(summarize_metrics(Metrics(), config)), plan)
+    assert row["replications"] == 20
+    assert row["avg_system_time_variance_reduction"] > 1.5
+
+
+def test_control_variates_reject_early_stopping_runs():
+    config = SimConfig(hours=8.0, engine="native", warmup_detection=True, steady_state_precision=0.1)
+    with pytest.raises(ValueError, match="steady_state_precision"):
+        replicate(config, TYPES, 1, ReplicationPlan(replications=4, control_variates=True))
@@ -0,0 +1,38 @@
+import os
+
+from cafe_sim import CustomerType, SimConfig
+from replications import cached_replication
+from result_cache import ResultCache, model_key
+
+TYPES = [CustomerType("fast", 20.0, 0.8, 1.0, 3.0), CustomerType("slow", 6.0, 1.8, 4.0, 10.0)]
+
+
+def test_cached_replication_is_read_back(tmp_path):
+    cache = ResultCache(str(tmp_path))
+    config = SimConfig(hours=1.0)
+    first = cached_replication(config, TYPES, 42, 0, cache)
+    assert len(list(tmp_path.glob("*/*.json"))) == 1
+    assert cached_replication(config, TYPES, 42, 0, cache) == first
+    cached_replication(config, TYPES, 42, 1, cache)
+    assert len(list(tmp_path.glob("*/*.json"))) == 2
+
+
+def test_model_key_depends_on_the_simulated_model_only():
+    config = SimConfig(hours=1.0)
+    key = model_key(config, TYPES, 42, 0)
+    assert model_key(SimConfig(hours=1.0), list(TYPES), 42, 0) == key
+    assert model_key(SimConfig(hours=1.0, baristas=3), TYPES, 42, 0) != key
+    assert model_key(config, TYPES, 43, 0) != key
+    assert model_key(config, TYPES, 42, 1) != key
+
+
+def test_evict_removes_least_recently_used_entries(tmp_path):
+    cache = ResultCache(str(tmp_path))
+    keys = [prefix * 32 for prefix in ("aa", "bb", "cc")]
+    for i, key in enumerate(keys):
+        cache.put(key, {"value": float(i)})
+        os.utime(cache._path(key), (1000 + i, 1000 + i))  # "cc" is the most recently used
+    cache.max_bytes = cache._path(keys[2]).stat().st_size
+    assert cache.evict() == 2
+    assert cache.get(keys[2]) == {"value": 2.0}
+    assert cache.get(keys[0]) is None and cache.get(keys[1]) is None
@@ -0,0 +1,45 @@
+import csv
+import os
+
+from results_db import open_results
+
+
+def write_csv(path, rows):
+    with open(path, "w", newline="", encoding="utf-8") as f:
+        writer = csv.DictWriter(f, fieldnames=list(rows[0]))
+        writer.writeheader()
+        writer.writerows(rows)
+
+
+def instances(db):
+    return [row["instance"] for row in db.rows(columns=["instance"])]
+
+
+def test_open_results_rebuilds_for_another_older_csv(tmp_path):
+    db_path = str(tmp_path / "results.sqlite")
+    first, second = str(tmp_path / "a.csv"), str(tmp_path / "b.csv")
+    write_csv(first, [{"instance": "a", "source": "s", "avg_system_time": 1.0}])
+    write_csv(second, [{"instance": "b", "source": "s", "avg_system_time": 2.0}])
+    os.utime(second, (1_000_000, 1_000_000))  # older than the DB built below
+
+    with open_results(db_path, first) as db:
+        assert instances(db) == ["a"]
+    with open_results(db_path, second) as db:
+        assert instances(db) == ["b"]
+
+
+def test_open_results_rebuilds_when_the_csv_changes(tmp_path):
+    db_path = str(tmp_path / "results.sqlite")
+    path = str(tmp_path / "metrics.csv")
+    write_csv(path, [{"instance": "a", "source": "s", "avg_system_time": 1.0}])
+    with open_results(db_path, path) as db:
+        assert instances(db) == ["a"]
+    with open_results(db_path, path) as db:  # unchanged: reused as is
+        assert instances(db) == ["a"]
+
+    stat = os.stat(path)
+    write_csv(path, [{"instance": "a", "source": "s", "avg_system_time": 1.0},
+                     {"instance": "c", "source": "s", "avg_system_time": 3.0}])
+    os.utime(path, ns=(stat.st_atime_ns, stat.st_mtime_ns))  # same mtime, different size
+    with open_results(db_path, path) as db:
+        assert instances(db) == ["a", "c"]
@@ -0,0 +1,123 @@
+import json
+import subprocess
+import sys
+
+import run_batch
+from cafe_sim import CustomerType, SimConfig, canonical_model, create_simulation, summarize_metrics
+from replications import ReplicationPlan
+from run_batch import ROOT_DIR, RunOptions, canonical_key, iter_rows
+
+SCRIPT = ROOT_DIR / "scripts" / "run_batch.py"
+
+
+def instance(name, baristas=2, alpha=0.1, slow_rate=6.0, slow_prep=4.0):
+    return {
+        "name": name,
+        "source": "test",
+        "hours": 1.0,
+        "staffing": {"order_attendants": 1, "baristas": baristas, "pickup_attendants": 1},
+        "prep_queue_alpha": alpha,
+        "arrival_rates_per_hour": {"fast": 20.0, "medium": 12.0, "slow": slow_rate},
+        "prep_time_mean": {"fast": 1.0, "medium": 2.5, "slow": slow_prep},
+    }
+
+
+def test_canonical_model_drops_parameters_that_cannot_matter():
+    types = [CustomerType("fast", 20.0, 0.8, 1.0, 3.0), CustomerType("slow", 0.0, 1.8, 4.0, 10.0)]
+    config, canonical_types = canonical_model(SimConfig(baristas=10, prep_queue_alpha=0.3), types)
+    assert config.prep_queue_alpha == 0.0  # ten baristas never let a prep queue form
+    assert canonical_types[1] == CustomerType("slow", 0.0, 0.0, 0.0, 0.0)
+    assert canonical_model(SimConfig(prep_queue_alpha=0.3), types)[0].prep_queue_alpha == 0.3
+
+    runs = [summarize_metrics(create_simulation(c, types, 7).run(), c)
+            for c in (SimConfig(baristas=10, prep_queue_alpha=0.3), SimConfig(baristas=10))]
+    assert runs[0] == runs[1]
+
+
+def test_equivalent_instances_are_simulated_once(monkeypatch):
+    calls = []
+    run_task = run_batch._run_task
+    monkeypatch.setattr(run_batch, "_run_task", lambda task: calls.append(task[0]) or run_task(task))
+    instances = [
+        ("a", instance("a")),
+        ("b", instance("b", baristas=3)),
+        ("a2", instance("a2")),
+        ("c", instance("c", slow_rate=0.0)),
+        ("c2", instance("c2", slow_rate=0.0, slow_prep=9.0)),  # slow customers never arrive
+        ("b2", instance("b2", baristas=3)),
+    ]
+    assert canonical_key(instances[3][1]) == canonical_key(instances[4][1])
+    for window in (run_batch.DEDUP_WINDOW, 1):
+        calls.clear()
+        rows = list(iter_rows(iter(instances), 42, RunOptions(), window=window))
+        assert [row["instance"] for row in rows] == [label for label, _ in instances]
+        by_label = {row["instance"]: row for row in rows}
+        assert {k: v for k, v in by_label["a2"].items() if k != "instance"} == \
+            {k: v for k, v in by_label["a"].items() if k != "instance"}
+        assert by_label["c2"]["avg_system_time"] == by_label["c"]["avg_system_time"]
+        # with a window of one class, a class that reappears after another is simulated again
+        assert calls == (["a", "b", "c"] if window > 1 else ["a", "b", "a2", "c", "b2"])
+
+
+def run_batch_cli(*args):
+    return subprocess.run([sys.executable, str(SCRIPT), "--no-cache", *args],
+                          capture_output=True, text=True)
+
+
+def test_resume_completes_an_interrupted_run_byte_for_byte(tmp_path):
+    instances_dir = tmp_path / "instances"
+    instances_dir.mkdir()
+    for i, baristas in enumerate([1, 2, 3, 4]):
+        inst = instance(f"inst_{i}", baristas=baristas)
+        (instances_dir / f"{inst['name']}.json").write_text(json.dumps(inst), encoding="utf-8")
+    full, partial = tmp_path / "full.csv", tmp_path / "partial.csv"
+    assert run_batch_cli("--instances-dir", str(instances_dir), "--output", str(full)).returncode == 0
+
+    data = full.read_bytes()
+    lines = data.splitlines(keepends=True)
+    partial.write_bytes(b"".join(lines[:3]) + lines[3][:10])  # two rows and a torn third
+    (tmp_path / "partial.csv.manifest.json").write_bytes((tmp_path / "full.csv.manifest.json").read_bytes())
+    result = run_batch_cli("--instances-dir", str(instances_dir), "--output", str(partial), "--resume")
+    assert result.returncode == 0
+    assert "2 from a previous run" in result.stdout
+    assert partial.read_bytes() == data
+
+    result = run_batch_cli("--instances-dir", str(instances_dir), "--output", str(partial), "--resume",
+                           "--seed", "7")
+    assert result.returncode != 0 and "different settings" in result.stderr
+
+
+def test_worker_processes_keep_the_serial_order_and_results():
+    instances = [(f"i{b}", instance(f"i{b}", baristas=b)) for b in (1, 2, 3, 4, 5)]
+    serial = list(iter_rows(iter(instances), 42, RunOptions(), workers=1))
+    assert list(iter_rows(iter(instances), 42, RunOptions(), workers=2)) == serial
+
+
+def test_control_variates_are_rejected_with_steady_state_precision(tmp_path):
+    result = run_batch_cli("--output", str(tmp_path / "out.csv"), "--replications", "4", "--control-variates",
+                           "--auto-warmup", "--steady-state-precision", "0.1")
+    assert result.returncode == 2 and "--control-variates" in result.stderr
+    assert not (tmp_path / "out.csv").exists()
+
+
+def test_capped_scenarios_never_get_more_replications_than_the_plan():
+    overloaded = {**instance("busy", baristas=1), "arrival_rates_per_hour": {"fast": 120.0, "medium": 60.0}}
+
+    def replications(plan, screened):
+        options = RunOptions(plan, {"engine": "native"}, prescreen="cap", screened_replications=screened)
+        row = run_batch.run_instance("busy", overloaded, 42, options)
+        assert row["screening"] == "capped:overloaded"
+        return row["replications"]
+
+    assert replications(ReplicationPlan(replications=5), 10) == 5
+    assert replications(ReplicationPlan(replications=5), 3) == 3
+    assert replications(ReplicationPlan(replications=6, antithetic=True), 3) == 4  # whole pairs
+    assert replications(ReplicationPlan(replications=2, target_half_width=1e-9, max_replications=50), 10) == 2
+
+
+def test_available_cpus_follows_the_affinity_mask(monkeypatch):
+    monkeypatch.setattr(run_batch.os, "sched_getaffinity", lambda pid: {0, 2}, raising=False)
+    assert run_batch.available_cpus() == 2
+    monkeypatch.delattr(run_batch.os, "sched_getaffinity")
+    monkeypatch.setattr(run_batch.os, "cpu_count", lambda: None)
+    assert run_batch.available_cpus() == 1
@@ -0,0 +1,39 @@
+import random
+
+import pytest
+
+from selection import kn_eta, kn_select
+
+
+def normal_systems(means, seed, sd=1.0):
+    rng = random.Random(seed)
+    return lambda i, r: rng.gauss(means[i], sd)
+
+
+def test_kn_eta():
+    assert kn_eta(2, 0.05, 10) == pytest.approx(0.5 * (10 ** (2 / 9) - 1))
+
+
+def test_clearly_worse_systems_are_dropped_early():
+    selection = kn_select(normal_systems([5.0, 3.0, 3.6, 8.0], seed=1), 4, delta=0.5)
+    assert selection.best == 1
+    assert selection.eliminated_at[1] is None
+    assert selection.eliminated_at[3] == 10  # dropped right after the first stage
+    assert selection.replications[3] == 10
+    assert selection.total_replications < 4 * 100
+
+
+def test_probability_of_correct_selection_with_an_indifference_zone_gap():
+    delta, runs = 0.5, 200
+    correct = sum(
+        kn_select(normal_systems([0.0, delta, delta, delta], seed), 4, delta, alpha=0.05).best == 0
+        for seed in range(runs)
+    )
+    assert correct / runs >= 0.93  # >= 0.95 in expectation; allow for sampling error
+
+
+def test_kn_select_validates_its_arguments():
+    with pytest.raises(ValueError):
+        kn_select(lambda i, r: 0.0, 2, delta=0.0)
+    with pytest.raises(ValueError):
+        kn_select(lambda i, r: 0.0, 2, delta=1.0, n0=1)
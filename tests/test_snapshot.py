@@ -0,0 +1,81 @@
+import pytest
+
+from cafe_sim import CustomerType, SimConfig, summarize_metrics
+from native_engine import NativeCafeSimulation
+
+BUSY = [
+    CustomerType("fast", 40.0, 0.8, 1.0, 3.0),
+    CustomerType("medium", 20.0, 1.2, 2.5, 6.0),
+    CustomerType("slow", 8.0, 1.8, 4.0, 10.0),
+]
+
+
+def busy_snapshot(config: SimConfig, at: float = 90.0):
+    sim = NativeCafeSimulation(config, BUSY, seed=5)
+    sim.advance(at)
+    return sim.snapshot()
+
+
+def test_unchanged_fork_matches_plain_run():
+    config = SimConfig(engine="native", common_random_numbers=True)
+    plain = summarize_metrics(NativeCafeSimulation(config, BUSY, seed=5).run(), config)
+    snapshot = busy_snapshot(config)
+    assert summarize_metrics(snapshot.fork().run(), config) == plain
+    assert summarize_metrics(snapshot.fork().run(), config) == plain
+
+
+def test_fork_to_fewer_servers_never_exceeds_new_capacity():
+    config = SimConfig(engine="native", order_attendants=3, baristas=3, pickup_attendants=2)
+    snapshot = busy_snapshot(config)
+    sim = snapshot.fork(baristas=1, order_attendants=1, pickup_attendants=1)
+    before = sim.queue_state()
+    assert before["prep_busy"] == 3 and before["prep_queue"] > 0
+
+    limits = {"order_busy": 1, "prep_busy": 1, "pickup_busy": 1}
+    previous = dict(before)
+    reached = {key: before[key] <= limit for key, limit in limits.items()}
+    t = snapshot.time
+    while t < config.hours * 60 - 1:
+        t += 0.25
+        sim.advance(t)
+        state = sim.queue_state()
+        for key, limit in limits.items():
+            if reached[key]:
+                assert state[key] <= limit
+            else:
+                # customers in service finish; nobody new starts above the new capacity
+                assert state[key] <= previous[key]
+                reached[key] = state[key] <= limit
+        previous = state
+    assert all(reached.values())
+
+
+def test_fork_to_more_servers_starts_waiting_customers():
+    config = SimConfig(engine="native", order_attendants=2, baristas=2)
+    snapshot = busy_snapshot(config)
+    before = snapshot.fork().queue_state()
+    after = snapshot.fork(baristas=4).queue_state()
+    assert before["prep_queue"] >= 2
+    assert after["prep_busy"] == 4
+    assert after["prep_queue"] == before["prep_queue"] - 2
+
+
+def test_utilization_after_a_fork_uses_the_server_count_over_time():
+    config = SimConfig(engine="native", order_attendants=3, baristas=3, pickup_attendants=2)
+    sim = busy_snapshot(config).fork(baristas=1)
+    metrics = sim.run()
+    summary = summarize_metrics(metrics, sim.config)
+    warmup, fork, end = config.warmup_hours * 60, 90.0, config.hours * 60
+    step = (3 * (fork - warmup) + 1 * (end - fork)) / (end - warmup)
+    mean_servers = metrics.prep_servers.mean(end)  # removed baristas finish their customers first
+    assert step < mean_servers < 3
+    assert summary["prep_utilization"] == pytest.approx(metrics.prep_busy_servers.mean(end) / mean_servers)
+    assert summary["prep_utilization"] <= 1.0
+    assert metrics.order_servers is None and metrics.pickup_servers is None  # unchanged stations
+
+
+def test_forks_that_change_staffing_still_support_warmup_detection():
+    config = SimConfig(engine="native", baristas=3, warmup_detection=True)
+    sim = busy_snapshot(config).fork(baristas=1)
+    summary = summarize_metrics(sim.run(), sim.config)
+    assert 0.0 <= summary["prep_utilization"] <= 1.0
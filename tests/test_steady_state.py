@@ -0,0 +1,61 @@
+import random
+from dataclasses import replace
+
+from cafe_sim import CustomerType, SimConfig, create_simulation, summarize_metrics
+from replications import ReplicationPlan, replicate
+from steady_state import batch_columns, batch_means, lag1_autocorrelation, mser
+
+TYPES = [
+    CustomerType("fast", 30.0, 0.8, 1.0, 3.0),
+    CustomerType("medium", 15.0, 1.2, 2.5, 6.0),
+    CustomerType("slow", 6.0, 1.8, 4.0, 10.0),
+]
+
+
+def run(config: SimConfig, seed: int = 1):
+    return summarize_metrics(create_simulation(config, TYPES, seed).run(), config)
+
+
+def test_mser_deletes_the_transient():
+    rng = random.Random(1)
+    transient = [20.0 - 15.0 * i / 100 + rng.gauss(0, 1) for i in range(100)]
+    steady = [5.0 + rng.gauss(0, 1) for _ in range(900)]
+    deleted = mser(transient + steady)
+    assert 60 <= deleted <= 150 and deleted % 5 == 0
+    assert mser(steady) <= 50
+    assert mser([1.0] * 9) == 0  # fewer than two batches
+
+
+def test_auto_warmup_reports_its_truncation_point():
+    config = SimConfig(hours=8.0, engine="native", warmup_detection=True)
+    summary = run(config)
+    assert 0.0 <= summary["warmup_minutes"] <= 8 * 60 / 2
+    assert summary["simulated_minutes"] == 8 * 60
+
+
+def test_steady_state_precision_ends_the_run_early():
+    loose = run(SimConfig(hours=48.0, engine="native", warmup_detection=True, steady_state_precision=0.1))
+    tight = run(SimConfig(hours=48.0, engine="native", warmup_detection=True, steady_state_precision=0.05))
+    assert loose["simulated_minutes"] < tight["simulated_minutes"] < 48 * 60
+
+
+def test_batch_means_drop_the_remainder_at_the_start():
+    assert batch_means(list(range(12)), 5) == [2.5, 4.5, 6.5, 8.5, 10.5]
+    assert batch_means([1.0, 2.0], 5) == []
+
+
+def test_lag1_autocorrelation():
+    assert lag1_autocorrelation([1.0, -1.0] * 20) < -0.9
+    assert lag1_autocorrelation(list(range(40))) > 0.9
+    assert lag1_autocorrelation([2.0] * 10) == 0.0
+
+
+def test_batch_means_run_agrees_with_replications():
+    config = SimConfig(hours=24.0, engine="native", batches=20)
+    summary = run(config)
+    assert list(summary) == batch_columns(list(run(SimConfig(hours=1.0))))
+    assert 10 <= summary["batches"] <= 20
+    assert summary["batch_minutes"] == (24 * 60 - summary["warmup_minutes"]) / summary["batches"]
+    replications = replicate(replace(config, batches=0), TYPES, 2, ReplicationPlan(replications=10)).as_row()
+    difference = abs(summary["avg_system_time"] - replications["avg_system_time"])
+    assert difference < summary["avg_system_time_ci_half_width"] + replications["avg_system_time_ci_half_width"]
@@ -0,0 +1,72 @@
+import statistics
+from dataclasses import replace
+
+import numpy as np
+import pytest
+
+from cafe_sim import CustomerType, Metrics, SimConfig, summarize_metrics
+from replications import confidence_interval, simulate_replication
+from vectorized_engine import _fifo_stage, lockstep_summaries, simulate_lockstep, simulate_stores
+
+TYPES = [
+    CustomerType("fast", 30.0, 0.8, 1.0, 3.0),
+    CustomerType("medium", 15.0, 1.2, 2.5, 6.0),
+    CustomerType("slow", 6.0, 1.8, 4.0, 10.0),
+]
+
+
+def test_fifo_stage_serves_in_order_and_reneges():
+    arrivals = np.array([[0.0, 1.0, 2.0, np.inf]])
+    service = np.array([[2.0, 2.0, 2.0, 2.0]])
+    start, end, served = _fifo_stage(arrivals, service, 1, patience=np.array([[1.0, 1.0, 0.5, 1.0]]))
+    assert start[0, :2].tolist() == [0.0, 2.0]
+    assert end[0, :2].tolist() == [2.0, 4.0]
+    assert served[0].tolist() == [True, True, False, False]
+
+
+def test_fifo_stage_takes_servers_per_row():
+    arrivals = np.array([[0.0, 0.0, 0.0], [0.0, 0.0, 0.0]])
+    start, _, _ = _fifo_stage(arrivals, np.ones((2, 3)), np.array([1, 3]))
+    assert start.tolist() == [[0.0, 1.0, 2.0], [0.0, 0.0, 0.0]]
+
+
+def test_lockstep_summaries_have_the_event_engine_columns():
+    config = SimConfig(hours=2.0)
+    summaries = lockstep_summaries(config, TYPES, 3)
+    assert len(summaries) == 3
+    assert list(summaries[0]) == list(summarize_metrics(Metrics(), config))
+
+
+@pytest.mark.parametrize("config", [
+    SimConfig(hours=2.0),
+    SimConfig(hours=3.0, warmup_hours=0.0, rate_profile=(0.5, 1.5, 1.0)),
+], ids=["default", "rate-profile"])
+def test_lockstep_engine_agrees_with_the_event_engine(config):
+    lockstep = lockstep_summaries(config, TYPES, 200, seed=1)
+    native_config = replace(config, engine="native")
+    native = [simulate_replication(native_config, TYPES, 1, i) for i in range(200)]
+    for metric in ("avg_system_time", "abandonment_rate", "prep_utilization", "avg_order_queue"):
+        a = [s[metric] for s in lockstep]
+        b = [s[metric] for s in native]
+        _, _, half_a = confidence_interval(a)
+        _, _, half_b = confidence_interval(b)
+        assert abs(statistics.fmean(a) - statistics.fmean(b)) < 1.5 * (half_a + half_b), metric
+
+
+def test_stacked_stores_agree_with_separate_lockstep_runs():
+    stores = [
+        (SimConfig(hours=2.0, baristas=1), TYPES[:2]),
+        (SimConfig(hours=3.0, warmup_hours=0.0, baristas=3, prep_queue_alpha=0.2, rate_profile=(0.5, 1.5, 1.0)),
+         TYPES),
+        (SimConfig(hours=2.0), [CustomerType("none", 0.0, 1.0, 1.0, 1.0)]),
+    ]
+    stacked = simulate_stores(stores, 200, seed=1, controls=True)
+    assert stacked[2]["completed_customers"].sum() == 0
+    for (config, types), together in zip(stores[:2], stacked):
+        alone = simulate_lockstep(config, types, 200, seed=2, controls=True)
+        assert together.keys() == alone.keys()  # each store keeps its own arrival controls
+        for metric in ("avg_system_time", "abandonment_rate", "prep_utilization", "avg_order_queue"):
+            _, _, half_a = confidence_interval(together[metric].tolist())
+            _, _, half_b = confidence_interval(alone[metric].tolist())
+            assert abs(together[metric].mean() - alone[metric].mean()) < 1.5 * (half_a + half_b), metric
+
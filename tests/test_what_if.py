@@ -0,0 +1,33 @@
+import pytest
+
+from cafe_sim import CustomerType, SimConfig
+from replications import simulate_replication
+from what_if import alternative_label, parse_alternative, parse_time, what_if
+
+TYPES = [
+    CustomerType("fast", 40.0, 0.8, 1.0, 3.0),
+    CustomerType("medium", 20.0, 1.2, 2.5, 6.0),
+    CustomerType("slow", 8.0, 1.8, 4.0, 10.0),
+]
+
+
+def test_parse_alternative():
+    changes = parse_alternative("baristas=3, prep_queue_alpha=0.05")
+    assert changes == {"baristas": 3, "prep_queue_alpha": 0.05}
+    assert alternative_label(changes) == "baristas=3,prep_queue_alpha=0.05"
+    assert alternative_label({}) == "as-is"
+    with pytest.raises(ValueError, match="hours"):
+        parse_alternative("hours=2")
+
+
+def test_parse_time():
+    assert parse_time("10:15", 9) == 75.0
+    assert parse_time("45", 9) == 45.0
+
+
+def test_as_is_forks_reproduce_plain_replications():
+    config = SimConfig(hours=2.0, engine="native", common_random_numbers=True)
+    summaries, states = what_if(config, TYPES, [{}, {"baristas": 3}], at=60.0, replications=3, seed=9)
+    assert summaries[0] == [simulate_replication(config, TYPES, 9, i) for i in range(3)]
+    assert len(summaries[1]) == len(states) == 3
+    assert sum(s["avg_prep_wait"] for s in summaries[1]) < sum(s["avg_prep_wait"] for s in summaries[0])